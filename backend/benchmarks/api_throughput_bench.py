@@ -0,0 +1,113 @@
+"""Measure API request throughput as the number of uvicorn worker processes grows
+
+Usage:
+    python benchmarks/api_throughput_bench.py [--workers 1,2,4] [--seconds 10]
+        [--clients 4] [--concurrency 16] [--path /api/validate-schedule?...]
+        [--mongo-url mongodb://localhost:27017] [--header "Authorization: Bearer ..."]
+
+For each worker count the server is started with STREAM_WORKER_MODE=off
+against a throwaway database, loaded from several client processes for a
+fixed time, and stopped. The report includes requests/s, latency percentiles
+and scaling efficiency relative to one worker (1.0 = linear).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_PATH = "/api/validate-schedule?date=2030-01-01&time=06:55"
+
+
+def load_client(url: str, headers: dict, concurrency: int, seconds: float) -> list:
+    """One client process: `concurrency` threads issuing requests back to back; returns latencies"""
+    deadline = time.time() + seconds
+
+    def loop():
+        session = requests.Session()
+        latencies = []
+        while time.time() < deadline:
+            start = time.perf_counter()
+            response = session.get(url, headers=headers)
+            if response.status_code < 500:
+                latencies.append(time.perf_counter() - start)
+        return latencies
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = [pool.submit(loop) for _ in range(concurrency)]
+        return [latency for result in results for latency in result.result()]
+
+
+def wait_ready(base: str, timeout: float = 60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base}/api/health", timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError("Server did not become ready")
+
+
+def run(workers: int, args, headers: dict) -> dict:
+    env = dict(os.environ, MONGO_URL=args.mongo_url, DB_NAME=args.db_name, STREAM_WORKER_MODE="off")
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'server:app', '--port', str(args.port),
+         '--workers', str(workers), '--log-level', 'warning'],
+        cwd=BACKEND_DIR, env=env
+    )
+    base = f"http://127.0.0.1:{args.port}"
+    try:
+        wait_ready(base)
+        with multiprocessing.Pool(args.clients) as pool:
+            results = pool.starmap(load_client, [(base + args.path, headers, args.concurrency, args.seconds)] * args.clients)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    latencies = sorted(latency for result in results for latency in result)
+    if not latencies:
+        return {"workers": workers, "requests": 0}
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "rps": round(len(latencies) / args.seconds, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--path', default=DEFAULT_PATH)
+    parser.add_argument('--header', action='append', default=[])
+    parser.add_argument('--port', type=int, default=18001)
+    parser.add_argument('--mongo-url', default=os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    args = parser.parse_args()
+    args.db_name = f"bench_api_{uuid.uuid4().hex[:8]}"
+    headers = dict(h.split(': ', 1) for h in args.header)
+
+    results = [run(int(n), args, headers) for n in args.workers.split(',')]
+    baseline = results[0].get("rps") or 0
+    for result in results:
+        if baseline and result.get("rps"):
+            result["scaling_efficiency"] = round(result["rps"] / (baseline * result["workers"] / results[0]["workers"]), 2)
+
+    json.dump({"cpu_count": os.cpu_count(), "path": args.path, "results": results}, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Run several stream worker processes against one MongoDB and show how jobs spread
+
+Usage:
+    python benchmarks/cluster_workers_bench.py [--mongo-url mongodb://localhost:27017]
+        [--workers 3] [--capacity 4] [--jobs 24] [--job-seconds 5] [--kill-after 4]
+
+Each worker is a separate OS process running StreamWorker with a runner that
+sleeps instead of encoding. With --kill-after one worker is SIGKILLed mid-run;
+its jobs are taken over by the others once their leases expire. A throwaway
+database is used and dropped at the end.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from stream_jobs import StreamWorker, enqueue_job, ensure_indexes  # noqa: E402
+
+LEASE_SECONDS = 3
+
+
+async def run_child(args):
+    db = AsyncIOMotorClient(args.mongo_url)[args.db_name]
+
+    async def fake_stream(job):
+        await asyncio.sleep(job["payload"]["seconds"])
+
+    worker = StreamWorker(db, {"bench": fake_stream}, worker_id=args.worker_id, capacity=args.capacity,
+                          lease_seconds=LEASE_SECONDS, poll_interval=0.2)
+    await worker.start()
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    await stop.wait()
+    await worker.stop()
+
+
+async def run_parent(args):
+    client = AsyncIOMotorClient(args.mongo_url)
+    db_name = f"bench_cluster_{uuid.uuid4().hex[:8]}"
+    db = client[db_name]
+    await ensure_indexes(db)
+
+    children = []
+    for i in range(args.workers):
+        children.append(subprocess.Popen([
+            sys.executable, os.path.abspath(__file__), '--child',
+            '--mongo-url', args.mongo_url, '--db-name', db_name,
+            '--worker-id', f"bench-worker-{i}", '--capacity', str(args.capacity)
+        ]))
+
+    started = time.time()
+    now = datetime.now(timezone.utc)
+    for i in range(args.jobs):
+        await enqueue_job(db, f"bench-{i}", "bench", now, {"seconds": args.job_seconds})
+
+    killed = None
+    try:
+        while True:
+            await asyncio.sleep(0.5)
+            if args.kill_after and not killed and time.time() - started >= args.kill_after:
+                killed = "bench-worker-0"
+                children[0].send_signal(signal.SIGKILL)
+            done = await db.stream_jobs.count_documents({"status": {"$in": ["completed", "failed"]}})
+            if done >= args.jobs or time.time() - started > args.timeout:
+                break
+        elapsed = time.time() - started
+
+        jobs = await db.stream_jobs.find({}, {"_id": 0}).to_list(None)
+        report = {
+            "workers": args.workers,
+            "capacity_per_worker": args.capacity,
+            "jobs": args.jobs,
+            "job_seconds": args.job_seconds,
+            "killed_worker": killed,
+            "elapsed_seconds": round(elapsed, 2),
+            "ideal_seconds": args.job_seconds * -(-args.jobs // (args.workers * args.capacity)),
+            "status": dict(Counter(job["status"] for job in jobs)),
+            "completed_by_worker": dict(Counter(job["worker_id"] for job in jobs if job["status"] == "completed")),
+            "taken_over": sum(1 for job in jobs if job["attempts"] > 1),
+        }
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    finally:
+        for child in children:
+            if child.poll() is None:
+                child.send_signal(signal.SIGTERM)
+        for child in children:
+            child.wait(timeout=30)
+        await client.drop_database(db_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mongo-url', default=os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--capacity', type=int, default=4)
+    parser.add_argument('--jobs', type=int, default=24)
+    parser.add_argument('--job-seconds', type=float, default=5)
+    parser.add_argument('--kill-after', type=float, default=0)
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--db-name', help=argparse.SUPPRESS)
+    parser.add_argument('--worker-id', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    asyncio.run(run_child(args) if args.child else run_parent(args))
+
+
+if __name__ == '__main__':
+    main()
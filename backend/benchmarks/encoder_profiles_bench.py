@@ -0,0 +1,100 @@
+"""Benchmark encoder profiles: CPU-seconds per minute of output on sample clips
+
+Usage:
+    python benchmarks/encoder_profiles_bench.py [clip ...] [--seconds 30] [--profiles low-cpu,balanced]
+
+Without clips, two synthetic samples are generated with FFmpeg (a static slide
+and a high-motion test pattern). Results are printed as JSON.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from encoder_profiles import DEFAULT_ENCODER_PROFILES, analyze_source, encoder_args, select_profile_name  # noqa: E402
+
+SAMPLE_SOURCES = {
+    "static_slide": "color=c=navy:size=1280x720:rate=30,drawtext=text='Slide':fontcolor=white:fontsize=64:x=100:y=100",
+    "high_motion": "testsrc2=size=1920x1080:rate=60",
+}
+
+
+def generate_samples(directory: str, seconds: int) -> list:
+    """Render synthetic H.264/AAC sample clips"""
+    clips = []
+    for name, source in SAMPLE_SOURCES.items():
+        path = os.path.join(directory, f"{name}.mp4")
+        subprocess.run(
+            ['ffmpeg', '-y', '-v', 'error',
+             '-f', 'lavfi', '-i', source,
+             '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=44100',
+             '-t', str(seconds), '-c:v', 'libx264', '-preset', 'veryfast', '-g', '60',
+             '-c:a', 'aac', '-shortest', path],
+            check=True
+        )
+        clips.append(path)
+    return clips
+
+
+def children_cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_profile(clip: str, profile: dict, analysis: dict, seconds: int) -> dict:
+    """Encode `seconds` of a clip as fast as possible and measure child CPU time"""
+    cmd = ['ffmpeg', '-y', '-v', 'error', '-i', clip, '-t', str(seconds),
+           *encoder_args(profile, analysis), os.devnull]
+
+    cpu_before = children_cpu_seconds()
+    wall_start = time.perf_counter()
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    wall = time.perf_counter() - wall_start
+    cpu = children_cpu_seconds() - cpu_before
+
+    output_seconds = min(seconds, analysis.get("duration") or seconds)
+    return {
+        "ok": result.returncode == 0,
+        "error": result.stderr.strip()[-300:] if result.returncode else None,
+        "output_seconds": output_seconds,
+        "cpu_seconds": round(cpu, 3),
+        "wall_seconds": round(wall, 3),
+        "cpu_seconds_per_output_minute": round(cpu / output_seconds * 60, 3) if output_seconds else None,
+        "realtime_factor": round(output_seconds / wall, 2) if wall else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('clips', nargs='*')
+    parser.add_argument('--seconds', type=int, default=30)
+    parser.add_argument('--profiles', default=','.join(DEFAULT_ENCODER_PROFILES))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        clips = args.clips or generate_samples(tmp, args.seconds)
+        report = {"seconds": args.seconds, "clips": []}
+        for clip in clips:
+            analysis = analyze_source(clip) or {}
+            entry = {
+                "clip": os.path.basename(clip),
+                "analysis": analysis,
+                "auto_profile": select_profile_name(analysis),
+                "profiles": {},
+            }
+            for name in args.profiles.split(','):
+                entry["profiles"][name] = run_profile(clip, DEFAULT_ENCODER_PROFILES[name], analysis, args.seconds)
+            report["clips"].append(entry)
+
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
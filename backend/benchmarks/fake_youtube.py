@@ -0,0 +1,216 @@
+"""Local stand-in for the parts of the YouTube Data API v3 the scheduler calls
+
+Usage:
+    python benchmarks/fake_youtube.py [--port 18090] [--latency-ms 50] [--error-rate 0]
+        [--videos 25] [--rtmp-base rtmp://127.0.0.1:19350/live2] [--ingest-ms 3000] [--transition-ms 1500]
+
+Point the API at it with YOUTUBE_API_ENDPOINT=http://127.0.0.1:18090/. It keeps
+broadcasts and streams in memory and covers liveBroadcasts (insert, list,
+bind, transition, delete), liveStreams (insert, list), channels.list,
+playlistItems.list and videos.list. --latency-ms delays every response and
+--error-rate answers that fraction of calls with 503 backendError.
+The fake cannot see RTMP ingest, so a stream reports `active` --ingest-ms
+after it is first listed; transitions pass through testStarting /
+liveStarting for --transition-ms and enforce YouTube's ordering rules.
+GET /_stats returns call counts per method.
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+
+def create_app(latency_ms: float = 0, error_rate: float = 0, video_count: int = 25,
+               rtmp_base: str = "rtmp://127.0.0.1:19350/live2", ingest_ms: float = 3000,
+               transition_ms: float = 1500) -> FastAPI:
+    app = FastAPI()
+    broadcasts = {}
+    streams = {}
+    # stream id -> monotonic time it turns active; broadcast id -> (target lifecycle, time it is reached)
+    activations = {}
+    pending_transitions = {}
+    calls = Counter()
+    videos = [{
+        "id": f"fakevideo{i:03d}",
+        "title": f"Benchmark video {i}",
+        "description": "Generated by fake_youtube.py",
+        "publishedAt": "2024-01-01T00:00:00Z",
+        "duration": "PT10M",
+    } for i in range(video_count)]
+
+    def new_id() -> str:
+        return uuid.uuid4().hex[:11]
+
+    def error(code: int, reason: str, message: str) -> JSONResponse:
+        return JSONResponse(status_code=code, content={"error": {
+            "code": code, "message": message, "errors": [{"reason": reason, "message": message}]
+        }})
+
+    @app.middleware("http")
+    async def simulate(request: Request, call_next):
+        if request.url.path.startswith("/youtube/v3/"):
+            calls[f"{request.method} {request.url.path[len('/youtube/v3/'):]}"] += 1
+            if latency_ms:
+                await asyncio.sleep(latency_ms / 1000)
+            if error_rate and random.random() < error_rate:
+                return error(503, "backendError", "Simulated backend error")
+        return await call_next(request)
+
+    @app.get("/_stats")
+    async def stats():
+        return {"calls": dict(calls), "broadcasts": len(broadcasts), "streams": len(streams)}
+
+    @app.post("/youtube/v3/liveBroadcasts")
+    async def insert_broadcast(request: Request):
+        body = await request.json()
+        broadcast = {
+            "kind": "youtube#liveBroadcast",
+            "id": new_id(),
+            "snippet": {**body.get("snippet", {}), "publishedAt": datetime.now(timezone.utc).isoformat()},
+            "status": {**body.get("status", {}), "lifeCycleStatus": "created", "recordingStatus": "notRecording"},
+            "contentDetails": body.get("contentDetails", {}),
+        }
+        broadcasts[broadcast["id"]] = broadcast
+        return broadcast
+
+    def settle(broadcast_id: str):
+        target, at = pending_transitions.get(broadcast_id, (None, 0))
+        if target and time.monotonic() >= at:
+            broadcasts[broadcast_id]["status"]["lifeCycleStatus"] = target
+            del pending_transitions[broadcast_id]
+
+    @app.get("/youtube/v3/liveBroadcasts")
+    async def list_broadcasts(id: str = "", maxResults: int = 5):
+        for broadcast_id in id.split(","):
+            if broadcast_id in broadcasts:
+                settle(broadcast_id)
+        items = [broadcasts[i] for i in id.split(",") if i in broadcasts][:maxResults]
+        return {"kind": "youtube#liveBroadcastListResponse", "items": items,
+                "pageInfo": {"totalResults": len(items), "resultsPerPage": maxResults}}
+
+    @app.post("/youtube/v3/liveBroadcasts/bind")
+    async def bind_broadcast(id: str, streamId: str = None):
+        if id not in broadcasts:
+            return error(404, "liveBroadcastNotFound", "Broadcast not found")
+        broadcasts[id]["contentDetails"]["boundStreamId"] = streamId
+        broadcasts[id]["status"]["lifeCycleStatus"] = "ready"
+        return broadcasts[id]
+
+    @app.post("/youtube/v3/liveBroadcasts/transition")
+    async def transition_broadcast(id: str, broadcastStatus: str):
+        if id not in broadcasts:
+            return error(404, "liveBroadcastNotFound", "Broadcast not found")
+        settle(id)
+        broadcast = broadcasts[id]
+        lifecycle = broadcast["status"]["lifeCycleStatus"]
+        if lifecycle == broadcastStatus:
+            return error(403, "redundantTransition", f"Broadcast is already {lifecycle}")
+        stream_id = broadcast["contentDetails"].get("boundStreamId")
+        monitored = broadcast["contentDetails"].get("monitorStream", {}).get("enableMonitorStream", True)
+        allowed = {
+            "testing": lifecycle == "ready",
+            "live": lifecycle == "testing" or (lifecycle == "ready" and not monitored),
+            "complete": lifecycle in ("testing", "live"),
+        }
+        if not allowed.get(broadcastStatus):
+            return error(403, "invalidTransition", f"Cannot transition from {lifecycle} to {broadcastStatus}")
+        if broadcastStatus != "complete" and streams.get(stream_id, {}).get("status", {}).get("streamStatus") != "active":
+            return error(403, "errorStreamInactive", "The bound stream is not active")
+        if broadcastStatus in ("testing", "live"):
+            broadcast["status"]["lifeCycleStatus"] = "testStarting" if broadcastStatus == "testing" else "liveStarting"
+            pending_transitions[id] = (broadcastStatus, time.monotonic() + transition_ms / 1000)
+        else:
+            broadcast["status"]["lifeCycleStatus"] = broadcastStatus
+        if broadcastStatus == "live":
+            broadcasts[id]["snippet"]["actualStartTime"] = datetime.now(timezone.utc).isoformat()
+        elif broadcastStatus == "complete":
+            broadcasts[id]["snippet"]["actualEndTime"] = datetime.now(timezone.utc).isoformat()
+        return broadcasts[id]
+
+    @app.delete("/youtube/v3/liveBroadcasts")
+    async def delete_broadcast(id: str):
+        if broadcasts.pop(id, None) is None:
+            return error(404, "liveBroadcastNotFound", "Broadcast not found")
+        return Response(status_code=204)
+
+    @app.post("/youtube/v3/liveStreams")
+    async def insert_stream(request: Request):
+        body = await request.json()
+        stream = {
+            "kind": "youtube#liveStream",
+            "id": new_id(),
+            "snippet": body.get("snippet", {}),
+            "cdn": {**body.get("cdn", {}), "ingestionInfo": {
+                "streamName": f"bench-{uuid.uuid4().hex[:16]}",
+                "ingestionAddress": rtmp_base,
+            }},
+            "status": {"streamStatus": "inactive", "healthStatus": {"status": "noData"}},
+        }
+        streams[stream["id"]] = stream
+        return stream
+
+    @app.get("/youtube/v3/liveStreams")
+    async def list_streams(id: str = "", maxResults: int = 5):
+        items = [streams[i] for i in id.split(",") if i in streams][:maxResults]
+        now = time.monotonic()
+        for stream in items:
+            if now >= activations.setdefault(stream["id"], now + ingest_ms / 1000):
+                stream["status"] = {"streamStatus": "active", "healthStatus": {"status": "good"}}
+        return {"kind": "youtube#liveStreamListResponse", "items": items}
+
+    @app.get("/youtube/v3/channels")
+    async def list_channels():
+        return {"items": [{
+            "id": "UCbenchmarkchannel",
+            "snippet": {"title": "Benchmark channel"},
+            "contentDetails": {"relatedPlaylists": {"uploads": "UUbenchmarkchannel"}},
+        }]}
+
+    @app.get("/youtube/v3/playlistItems")
+    async def list_playlist_items(maxResults: int = 5):
+        return {"items": [{
+            "snippet": {
+                "title": video["title"],
+                "description": video["description"],
+                "publishedAt": video["publishedAt"],
+                "thumbnails": {"medium": {"url": f"https://i.ytimg.com/vi/{video['id']}/mqdefault.jpg"}},
+                "resourceId": {"kind": "youtube#video", "videoId": video["id"]},
+            }
+        } for video in videos[:maxResults]]}
+
+    @app.get("/youtube/v3/videos")
+    async def list_videos(id: str = ""):
+        wanted = set(id.split(","))
+        return {"items": [{
+            "id": video["id"],
+            "snippet": {"title": video["title"], "description": video["description"]},
+            "contentDetails": {"duration": video["duration"]},
+        } for video in videos if video["id"] in wanted]}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=18090)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--videos', type=int, default=25)
+    parser.add_argument('--rtmp-base', default="rtmp://127.0.0.1:19350/live2")
+    parser.add_argument('--ingest-ms', type=float, default=3000, help="delay before a listed stream reports active")
+    parser.add_argument('--transition-ms', type=float, default=1500, help="time spent in testStarting / liveStarting")
+    args = parser.parse_args()
+    app = create_app(args.latency_ms, args.error_rate, args.videos, args.rtmp_base, args.ingest_ms,
+                     args.transition_ms)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Replay recorded yt-dlp info dicts through format selection and time it
+
+Usage:
+    python benchmarks/format_selection_bench.py [info.json ...] [--iterations 2000]
+    python benchmarks/format_selection_bench.py --record VIDEO_ID --out info.json
+
+Without files a synthetic info dict shaped like a YouTube extraction
+(HLS, DASH video-only, DASH audio-only and muxed formats) is used.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from format_selection import select_stream_format  # noqa: E402
+
+
+def synthetic_info(seed: int = 7) -> dict:
+    rng = random.Random(seed)
+    expire = int(time.time()) + 6 * 3600
+    formats = []
+    for i, height in enumerate([144, 240, 360, 480, 720, 1080, 1440, 2160] * 4):
+        base = f"https://rr1---sn-test.googlevideo.com/videoplayback?expire={expire}&itag={100 + i}"
+        formats.append({"format_id": f"hls-{i}", "protocol": "m3u8_native", "ext": "mp4", "height": height,
+                        "vcodec": "avc1.4d401f", "acodec": "mp4a.40.2", "url": f"{base}&manifest.m3u8"})
+        formats.append({"format_id": f"dash-v{i}", "protocol": "https", "ext": rng.choice(["mp4", "webm"]),
+                        "height": height, "vcodec": rng.choice(["avc1.64001f", "vp9", "av01.0.05M.08"]),
+                        "acodec": "none", "tbr": height * 2.5, "url": base})
+        formats.append({"format_id": f"dash-a{i}", "protocol": "https", "ext": "m4a", "height": None,
+                        "vcodec": "none", "acodec": "mp4a.40.2", "tbr": 128, "url": base})
+    formats.append({"format_id": "18", "protocol": "https", "ext": "mp4", "height": 360,
+                    "vcodec": "avc1.42001E", "acodec": "mp4a.40.2", "tbr": 500,
+                    "url": f"https://rr1---sn-test.googlevideo.com/videoplayback?expire={expire}&itag=18"})
+    return {"id": "synthetic", "formats": formats}
+
+
+def record(video_id: str, out: str):
+    import yt_dlp
+    with yt_dlp.YoutubeDL({'quiet': True, 'skip_download': True}) as ydl:
+        info = ydl.extract_info(f'https://www.youtube.com/watch?v={video_id}', download=False)
+    with open(out, 'w') as f:
+        json.dump(ydl.sanitize_info(info), f)
+    print(f"Recorded {len(info.get('formats') or [])} formats to {out}")
+
+
+def bench(name: str, info: dict, iterations: int) -> dict:
+    timings = []
+    result = None
+    for _ in range(iterations):
+        start = time.perf_counter_ns()
+        result = select_stream_format(info)
+        timings.append(time.perf_counter_ns() - start)
+    timings.sort()
+    return {
+        "info": name,
+        "formats": len(info.get("formats") or []),
+        "selected": result[1],
+        "iterations": iterations,
+        "mean_us": round(statistics.mean(timings) / 1000, 2),
+        "p50_us": round(timings[len(timings) // 2] / 1000, 2),
+        "p99_us": round(timings[int(len(timings) * 0.99) - 1] / 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('files', nargs='*')
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--record')
+    parser.add_argument('--out', default='info.json')
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record, args.out)
+        return
+
+    samples = [(os.path.basename(path), json.load(open(path))) for path in args.files]
+    if not samples:
+        samples = [("synthetic", synthetic_info())]
+
+    report = {"results": [bench(name, info, args.iterations) for name, info in samples]}
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Import-time budget for server.py, measured with `python -X importtime`
+
+Usage:
+    python benchmarks/import_time_bench.py [--runs 5] [--budget-ms 1500] [--top 10]
+
+Imports server in fresh interpreters (no MongoDB connection is made at
+import) and prints JSON with the median total, the slowest top-level
+imports, and any deferred dependency (lazy_imports.py) that was loaded
+eagerly. Exits with status 1 when the median is over --budget-ms or a
+deferred dependency was imported at startup, so it can gate CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Must stay behind lazy_module() in server.py
+DEFERRED_MODULES = [
+    "yt_dlp",
+    "googleapiclient.discovery",
+    "googleapiclient.http",
+    "google.oauth2.credentials",
+    "google.auth.transport.requests",
+    "google_auth_oauthlib.flow",
+]
+
+
+def parse_importtime(stderr: str) -> list:
+    """(module, self µs, cumulative µs, depth) rows from -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(own), int(cumulative), depth))
+    return rows
+
+
+def measure_once() -> list:
+    env = {**os.environ, "MONGO_URL": "mongodb://127.0.0.1:1", "DB_NAME": "import_time_bench"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    return parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=1500, help="Fail when the median import of server is slower")
+    parser.add_argument('--top', type=int, default=10, help="Slowest top-level imports to list")
+    args = parser.parse_args()
+
+    totals = []
+    for _ in range(args.runs):
+        rows = measure_once()
+        totals.append(next(cumulative for name, _, cumulative, _ in rows if name == "server") / 1000)
+    median_ms = statistics.median(totals)
+
+    # Top-level imports of the last run: direct children of server and of the interpreter
+    imported = {name for name, _, _, _ in rows}
+    top_level = sorted(((cumulative / 1000, name) for name, _, cumulative, depth in rows if depth <= 1 and name != "server"),
+                       reverse=True)[:args.top]
+    eager = [name for name in DEFERRED_MODULES if name in imported]
+
+    report = {
+        "runs": args.runs,
+        "server_import_ms": {"median": round(median_ms, 1), "min": round(min(totals), 1), "max": round(max(totals), 1)},
+        "budget_ms": args.budget_ms,
+        "slowest_imports_ms": {name: round(ms, 1) for ms, name in top_level},
+        "eagerly_imported_deferred_modules": eager,
+        "within_budget": median_ms <= args.budget_ms and not eager,
+    }
+    sys.stdout.write(json.dumps(report, indent=2) + '\n')
+    sys.exit(0 if report["within_budget"] else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,496 @@
+"""Load and latency benchmark of the API and of stream start-ups, against local stand-ins
+
+Usage:
+    python benchmarks/service_bench.py [--mongo-url mongodb://localhost:27017 | --mongod mongod]
+        [--requests 200] [--clients 2] [--concurrency 8] [--phases broadcasts,schedule,...]
+        [--streams 1,4] [--stream-seconds 20] [--upload-mb 16] [--youtube-latency-ms 50]
+        [--cold-starts 3] [--output results.json]
+
+Nothing leaves the machine: YouTube is benchmarks/fake_youtube.py, stream
+sinks are FFmpeg RTMP listeners on localhost, and MongoDB is a throwaway
+mongod (or a throwaway database on --mongo-url). The API runs inside this
+process so event-loop lag and CPU time are measured on the server's own loop;
+load comes from separate client processes.
+
+HTTP phases: broadcasts (GET /api/broadcasts), videos (GET /api/youtube/videos),
+validate (GET /api/validate-schedule), capacity (GET /api/schedule/capacity),
+schedule (POST /api/schedule/broadcast), bulk (POST /api/schedule/bulk, 10
+slots each) and upload (POST /api/upload-video). Then, for each --streams
+value, that many streams are started at once into their own RTMP sinks.
+Cold start is measured separately: a fresh uvicorn process is spawned
+--cold-starts times and timed to its first healthy /api/health response and
+to its first YouTube-backed response (GET /api/youtube/videos).
+The report is one JSON document: throughput, p50/p99 latency, loop lag and
+CPU per request or per stream, cold start times, plus YouTube API calls made.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+HTTP_PHASES = ["broadcasts", "videos", "validate", "capacity", "schedule", "bulk", "upload"]
+BENCH_TOKEN = "bench-access-token"
+LAG_PROBE_INTERVAL = 0.02
+CLK_TCK = os.sysconf('SC_CLK_TCK')
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentiles(values: list, scale: float = 1000) -> dict:
+    if not values:
+        return {"p50_ms": None, "p99_ms": None, "max_ms": None}
+    values = sorted(values)
+    return {
+        "p50_ms": round(values[len(values) // 2] * scale, 2),
+        "p99_ms": round(values[min(len(values) - 1, int(len(values) * 0.99))] * scale, 2),
+        "max_ms": round(values[-1] * scale, 2),
+    }
+
+
+def wait_http(url: str, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url, timeout=1).status_code < 500:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def measure_cold_start(port: int, timeout: float) -> dict:
+    """Seconds from spawning a fresh API process to its first healthy and first YouTube-backed responses"""
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'server:app', '--host', '127.0.0.1', '--port', str(port),
+         '--log-level', 'warning'],
+        cwd=BACKEND_DIR, env={**os.environ, "STREAM_WORKER_MODE": "off"}
+    )
+    try:
+        deadline = started + timeout
+        while True:
+            try:
+                if requests.get(f"{base}/api/health", timeout=1).status_code == 200:
+                    break
+            except requests.RequestException:
+                pass
+            if time.perf_counter() > deadline:
+                raise RuntimeError(f"API did not become healthy within {timeout}s")
+            time.sleep(0.01)
+        healthy = time.perf_counter() - started
+        response = requests.get(f"{base}/api/youtube/videos", headers={"Authorization": f"Bearer {BENCH_TOKEN}"},
+                                timeout=timeout)
+        return {
+            "first_healthy_s": round(healthy, 3),
+            "first_youtube_response_s": round(time.perf_counter() - started, 3),
+            "youtube_status": response.status_code,
+        }
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def build_request(phase: str, i: int, upload: bytes):
+    """(method, path, requests kwargs) for the i-th request of a phase; airtimes never collide"""
+    day = datetime.now(timezone.utc).date() + timedelta(days=2 + i // 18)
+    if phase == "broadcasts":
+        return "GET", "/api/broadcasts", {}
+    if phase == "videos":
+        return "GET", "/api/youtube/videos", {}
+    if phase == "validate":
+        return "GET", f"/api/validate-schedule?date={day.isoformat()}&time=06:55", {}
+    if phase == "capacity":
+        return "GET", "/api/schedule/capacity", {}
+    if phase == "schedule":
+        return "POST", "/api/schedule/broadcast", {"json": {
+            "video_id": f"fakevideo{i % 25:03d}",
+            "video_title": "Benchmark video",
+            "selected_date": f"{day.isoformat()}T00:00:00+05:30",
+            "custom_times": [f"{5 + i % 18:02d}:10"],
+        }}
+    if phase == "bulk":
+        return "POST", "/api/schedule/bulk", {"json": {"entries": [{
+            "source": "youtube_video",
+            "video_id": f"bulkvideo{i}",
+            "video_title": "Benchmark bulk video",
+            "dates": [(day + timedelta(days=offset)).isoformat() for offset in (0, 1)],
+        }]}}
+    if phase == "upload":
+        return "POST", "/api/upload-video", {"files": {"file": (f"bench-{i}.mp4", upload, "video/mp4")}}
+    raise ValueError(f"Unknown phase {phase}")
+
+
+def load_client(base: str, phase: str, indices: list, concurrency: int, upload_mb: float) -> list:
+    """One client process: `concurrency` threads working through `indices`; returns (latency, ok) pairs"""
+    upload = os.urandom(int(upload_mb * 1024 * 1024)) if phase == "upload" else b""
+    pending = iter(indices)
+    lock = threading.Lock()
+
+    def loop():
+        session = requests.Session()
+        session.headers["Authorization"] = f"Bearer {BENCH_TOKEN}"
+        results = []
+        while True:
+            with lock:
+                i = next(pending, None)
+            if i is None:
+                return results
+            method, path, kwargs = build_request(phase, i, upload)
+            start = time.perf_counter()
+            try:
+                response = session.request(method, base + path, timeout=300, **kwargs)
+                response.content  # NDJSON responses stream until the last line
+                ok = response.status_code < 400
+            except requests.RequestException:
+                ok = False
+            results.append((time.perf_counter() - start, ok))
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        futures = [pool.submit(loop) for _ in range(concurrency)]
+        return [result for future in futures for result in future.result()]
+
+
+class LoopLagProbe:
+    """Samples how late a short sleep wakes up on the running loop"""
+
+    def __init__(self):
+        self.samples = []
+        self.task = None
+
+    def start(self):
+        async def probe():
+            while True:
+                started = time.perf_counter()
+                await asyncio.sleep(LAG_PROBE_INTERVAL)
+                self.samples.append(max(0.0, time.perf_counter() - started - LAG_PROBE_INTERVAL))
+        self.task = asyncio.create_task(probe())
+
+    def mark(self) -> int:
+        return len(self.samples)
+
+    def since(self, mark: int) -> dict:
+        return percentiles(self.samples[mark:])
+
+
+def cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def process_cpu_seconds(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / CLK_TCK
+    except (OSError, IndexError, ValueError):
+        return 0.0
+
+
+def process_rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+async def run_http_phase(pool, base: str, phase: str, args, probe: LoopLagProbe) -> dict:
+    indices = list(range(args.requests))
+    shards = [(base, phase, indices[c::args.clients], args.concurrency, args.upload_mb) for c in range(args.clients)]
+    mark, cpu_before, started = probe.mark(), cpu_seconds(), time.perf_counter()
+    # The pool blocks, and the API shares this loop, so wait for it off-loop
+    results = await asyncio.get_running_loop().run_in_executor(None, pool.starmap, load_client, shards)
+    elapsed = time.perf_counter() - started
+    cpu = cpu_seconds() - cpu_before
+
+    samples = [sample for shard in results for sample in shard]
+    ok = [latency for latency, success in samples if success]
+    result = {
+        "phase": phase,
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "elapsed_seconds": round(elapsed, 2),
+        "rps": round(len(ok) / elapsed, 1) if elapsed else None,
+        **percentiles(ok),
+        "loop_lag": probe.since(mark),
+        "cpu_ms_per_request": round(cpu * 1000 / len(samples), 2) if samples else None,
+    }
+    if phase == "upload":
+        result["upload_mb_per_second"] = round(len(ok) * args.upload_mb / elapsed, 1) if elapsed else None
+    return result
+
+
+async def start_sink(port: int, key: str):
+    """FFmpeg RTMP listener discarding what it receives; reports progress on stdout"""
+    return await asyncio.create_subprocess_exec(
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostats',
+        '-progress', 'pipe:1', '-stats_period', '0.1',
+        '-listen', '1', '-i', f"rtmp://127.0.0.1:{port}/live2/{key}",
+        '-c', 'copy', '-f', 'null', '-',
+        stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+    )
+
+
+async def drain_sink(sink, first_frame: asyncio.Event):
+    """Read the sink's progress for as long as it runs, flagging the first received video frame"""
+    async for raw in sink.stdout:
+        key, _, value = raw.decode(errors='replace').strip().partition('=')
+        if key == 'frame' and value.isdigit() and int(value) > 0:
+            first_frame.set()
+
+
+async def run_stream_phase(server, count: int, source_file: str, args, probe: LoopLagProbe) -> dict:
+    from stream_pipeline import StreamSource
+
+    profile = await server.get_encoder_profile(None)
+    ports = [free_port() for _ in range(count)]
+    keys = [f"bench-{uuid.uuid4().hex[:8]}" for _ in range(count)]
+    sinks = [await start_sink(port, key) for port, key in zip(ports, keys)]
+    await asyncio.sleep(1)  # let the listeners bind
+
+    mark = probe.mark()
+    started = time.perf_counter()
+
+    async def start(port: int, key: str, sink):
+        live = asyncio.Event()
+        drains.append(asyncio.create_task(drain_sink(sink, live)))
+        spawned = time.perf_counter()
+        handle = await server.start_pipeline(
+            key, StreamSource.file(source_file, loop=True), [f"rtmp://127.0.0.1:{port}/live2/{key}"],
+            method="benchmark", profile=profile
+        )
+        spawn_seconds = time.perf_counter() - spawned
+        try:
+            await asyncio.wait_for(live.wait(), args.startup_timeout)
+        except asyncio.TimeoutError:
+            return handle, spawn_seconds, None
+        return handle, spawn_seconds, time.perf_counter() - spawned
+
+    drains = []
+
+    results = await asyncio.gather(*(start(port, key, sink) for port, key, sink in zip(ports, keys, sinks)))
+    startup_lag = probe.since(mark)
+    handles = [handle for handle, _, _ in results]
+    startups = [seconds for _, _, seconds in results if seconds is not None]
+
+    # Steady state: encoder CPU and memory while every stream runs
+    mark = probe.mark()
+    cpu_before = {handle.pid: process_cpu_seconds(handle.pid) for handle in handles}
+    server_cpu_before = cpu_seconds()
+    await asyncio.sleep(args.stream_seconds)
+    encoder_cpu = sum(process_cpu_seconds(handle.pid) - cpu_before[handle.pid] for handle in handles)
+    server_cpu = cpu_seconds() - server_cpu_before
+    rss = [process_rss_mb(handle.pid) for handle in handles if handle.running]
+    steady_lag = probe.since(mark)
+    running = sum(1 for handle in handles if handle.running)
+    speeds = [handle.metrics.get("speed") for handle in handles if handle.metrics.get("speed")]
+
+    for handle in handles:
+        await server.supervisor.stop(handle.key)
+    for sink in sinks:
+        if sink.returncode is None:
+            sink.terminate()
+        await sink.wait()
+    await asyncio.gather(*drains, return_exceptions=True)
+
+    return {
+        "streams": count,
+        "started": len(startups),
+        "running_at_end": running,
+        "startup_seconds": {k.replace("_ms", "_s"): v for k, v in percentiles(startups, scale=1).items()},
+        "spawn_ms": percentiles([spawn for _, spawn, _ in results]),
+        "wall_seconds_to_all_live": round(time.perf_counter() - started - args.stream_seconds, 2),
+        "startup_loop_lag": startup_lag,
+        "steady_loop_lag": steady_lag,
+        "encoder_cpu_percent_per_stream": round(encoder_cpu * 100 / args.stream_seconds / count, 1),
+        "server_cpu_percent": round(server_cpu * 100 / args.stream_seconds, 1),
+        "encoder_rss_mb_per_stream": round(sum(rss) / len(rss), 1) if rss else None,
+        "min_speed": min(speeds) if speeds else None,
+    }
+
+
+def make_source(path: str, seconds: int):
+    subprocess.run([
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', 'testsrc2=size=1280x720:rate=30',
+        '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=44100',
+        '-t', str(seconds), '-c:v', 'libx264', '-preset', 'veryfast', '-g', '60',
+        '-c:a', 'aac', '-b:a', '128k', '-movflags', '+faststart', path
+    ], check=True)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+async def bench(args, workdir: str, mongo_url: str) -> dict:
+    db_name = f"bench_service_{uuid.uuid4().hex[:8]}"
+    youtube_port, api_port = free_port(), free_port()
+    os.environ.update({
+        "MONGO_URL": mongo_url,
+        "DB_NAME": db_name,
+        "YOUTUBE_API_ENDPOINT": f"http://127.0.0.1:{youtube_port}/",
+        "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        "SOURCE_CACHE_DIR": os.path.join(workdir, "source-cache"),
+        "STREAM_WORKER_MODE": "off",
+        # Capacity is not what the HTTP phases measure; keep it from rejecting slots
+        "STREAM_WORKER_CAPACITY": "1000",
+        "UPLOAD_QUOTA_PER_USER_GB": "0",
+    })
+    fake_youtube = subprocess.Popen([
+        sys.executable, os.path.join(BACKEND_DIR, 'benchmarks', 'fake_youtube.py'),
+        '--port', str(youtube_port), '--latency-ms', str(args.youtube_latency_ms)
+    ])
+
+    import uvicorn
+    import server
+
+    api = uvicorn.Server(uvicorn.Config(server.app, host="127.0.0.1", port=api_port, log_level="warning"))
+    api_task = asyncio.create_task(api.serve())
+    probe = LoopLagProbe()
+    report = {}
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, wait_http, f"http://127.0.0.1:{youtube_port}/_stats")
+        while not api.started:
+            await asyncio.sleep(0.1)
+        await server.db.users.insert_one({
+            "id": "bench-user", "email": "bench@example.com", "name": "Benchmark",
+            "channel_id": "UCbenchmarkchannel", "channel_name": "Benchmark channel",
+            "access_token": BENCH_TOKEN, "refresh_token": "bench-refresh-token",
+            "created_at": datetime.now(timezone.utc)
+        })
+
+        if args.cold_starts:
+            runs = [await asyncio.to_thread(measure_cold_start, free_port(), args.startup_timeout)
+                    for _ in range(args.cold_starts)]
+            report["cold_start"] = {
+                "runs": runs,
+                "first_healthy_median_s": sorted(run["first_healthy_s"] for run in runs)[len(runs) // 2],
+                "first_youtube_response_median_s": sorted(run["first_youtube_response_s"] for run in runs)[len(runs) // 2],
+            }
+
+        probe.start()
+        mark = probe.mark()
+        await asyncio.sleep(2)
+        report["idle_loop_lag"] = probe.since(mark)
+
+        base = f"http://127.0.0.1:{api_port}"
+        phases = []
+        with multiprocessing.get_context("spawn").Pool(args.clients) as pool:
+            for phase in args.phases.split(','):
+                phases.append(await run_http_phase(pool, base, phase, args, probe))
+        report["http"] = phases
+        report["youtube_api_calls"] = requests.get(f"http://127.0.0.1:{youtube_port}/_stats").json()["calls"]
+
+        stream_counts = [int(n) for n in args.streams.split(',') if n.strip() and int(n) > 0]
+        if stream_counts and not shutil.which('ffmpeg'):
+            report["streams"] = {"skipped": "ffmpeg not found"}
+        elif stream_counts:
+            source_file = os.path.join(workdir, "bench-source.mp4")
+            await asyncio.to_thread(make_source, source_file, 10)
+            report["streams"] = [await run_stream_phase(server, n, source_file, args, probe) for n in stream_counts]
+    finally:
+        if probe.task:
+            probe.task.cancel()
+        await server.client.drop_database(db_name)
+        api.should_exit = True
+        await api_task
+        fake_youtube.terminate()
+        fake_youtube.wait(timeout=10)
+    return report
+
+
+def start_mongod(binary: str, workdir: str) -> tuple:
+    port = free_port()
+    dbpath = os.path.join(workdir, "mongo")
+    os.makedirs(dbpath)
+    process = subprocess.Popen([
+        binary, '--dbpath', dbpath, '--port', str(port), '--bind_ip', '127.0.0.1',
+        '--logpath', os.path.join(workdir, "mongod.log")
+    ])
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process, f"mongodb://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("mongod did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mongo-url', help="Use a throwaway database here instead of starting mongod")
+    parser.add_argument('--mongod', default='mongod', help="mongod binary for the throwaway server")
+    parser.add_argument('--phases', default=','.join(HTTP_PHASES))
+    parser.add_argument('--requests', type=int, default=200, help="Requests per HTTP phase")
+    parser.add_argument('--clients', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=8, help="Threads per client process")
+    parser.add_argument('--upload-mb', type=float, default=16)
+    parser.add_argument('--youtube-latency-ms', type=float, default=50)
+    parser.add_argument('--streams', default='1,4', help="Concurrent stream start-ups to measure; 0 to skip")
+    parser.add_argument('--stream-seconds', type=float, default=20)
+    parser.add_argument('--startup-timeout', type=float, default=30)
+    parser.add_argument('--cold-starts', type=int, default=3, help="Fresh API processes to time to first response; 0 to skip")
+    parser.add_argument('--output', help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="service-bench-")
+    mongod = None
+    try:
+        mongo_url = args.mongo_url
+        if not mongo_url:
+            mongod, mongo_url = start_mongod(args.mongod, workdir)
+        report = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "cpu_count": os.cpu_count(),
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "mongo_url")},
+            **asyncio.run(bench(args, workdir, mongo_url)),
+        }
+    finally:
+        if mongod:
+            mongod.terminate()
+            mongod.wait(timeout=30)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    sys.stdout.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
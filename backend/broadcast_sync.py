@@ -0,0 +1,188 @@
+"""Keep scheduled_broadcasts in step with YouTube using batched liveBroadcasts.list calls
+
+Broadcasts are polled on their own adaptive schedule (`next_sync_at`): often
+around airtime and while live, rarely when airtime is far away, never again
+once complete. Due broadcasts are grouped per user and looked up 50 IDs per
+API call, and the results are written back with one bulk write per batch, so
+the dashboard reads fresh status straight from MongoDB.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+BATCH_SIZE = 50  # liveBroadcasts.list / liveStreams.list accept up to 50 IDs
+TERMINAL_LIFECYCLES = {"complete", "revoked", "deleted"}
+ACTIVE_LIFECYCLES = {"testStarting", "testing", "liveStarting", "live"}
+ERROR_BACKOFF_SECONDS = 300
+# Stream health is only fetched for batches this close to (or past) airtime
+HEALTH_WINDOW_SECONDS = 900
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def next_sync_delay(lifecycle: Optional[str], scheduled_time: Optional[datetime], now: datetime) -> Optional[float]:
+    """Seconds until a broadcast should be polled again; None once it can no longer change"""
+    if lifecycle in TERMINAL_LIFECYCLES:
+        return None
+    if lifecycle in ACTIVE_LIFECYCLES:
+        return 30
+    if not scheduled_time:
+        return 900
+    until_airtime = (scheduled_time - now).total_seconds()
+    if until_airtime <= 600:
+        return 30  # about to go live, or late
+    if until_airtime <= 3600:
+        return 120
+    if until_airtime <= 86400:
+        return 900
+    return 3600
+
+
+def summarize_broadcast(item: Dict[str, Any]) -> Dict[str, Any]:
+    status = item.get("status", {})
+    snippet = item.get("snippet", {})
+    return {
+        "lifecycle_status": status.get("lifeCycleStatus"),
+        "privacy_status": status.get("privacyStatus"),
+        "recording_status": status.get("recordingStatus"),
+        "actual_start_time": snippet.get("actualStartTime"),
+        "actual_end_time": snippet.get("actualEndTime"),
+    }
+
+
+def summarize_stream(item: Dict[str, Any]) -> Dict[str, Any]:
+    status = item.get("status", {})
+    health = status.get("healthStatus", {})
+    return {
+        "stream_status": status.get("streamStatus"),
+        "status": health.get("status"),
+        "last_update": health.get("lastUpdateTimeSeconds"),
+        "issues": [issue.get("type") for issue in health.get("configurationIssues", [])],
+    }
+
+
+def chunked(items: List[Any], size: int) -> List[List[Any]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+class BroadcastReconciler:
+    """Polls YouTube for due broadcasts; `youtube_for_user(user_id)` returns an API client or None
+
+    `on_change(broadcast, changes)` is awaited for broadcasts whose lifecycle or
+    stream health changed, e.g. to push the update to dashboards.
+    """
+
+    def __init__(self, db, youtube_for_user: Callable[[str], Awaitable[Any]],
+                 on_change: Optional[Callable[[Dict[str, Any], Dict[str, Any]], Awaitable[Any]]] = None):
+        self.db = db
+        self.youtube_for_user = youtube_for_user
+        self.on_change = on_change
+        self.api_calls = 0
+
+    async def ensure_indexes(self):
+        await self.db.scheduled_broadcasts.create_index([("sync_done", 1), ("next_sync_at", 1)])
+
+    async def sync_due(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """One reconciliation pass over every broadcast whose next_sync_at has come"""
+        now = now or datetime.now(timezone.utc)
+        due = await self.db.scheduled_broadcasts.find(
+            {"sync_done": {"$ne": True}, "$or": [
+                {"next_sync_at": {"$lte": now}},
+                {"next_sync_at": {"$exists": False}},
+            ]},
+            {"_id": 0, "id": 1, "user_id": 1, "broadcast_id": 1, "stream_id": 1, "scheduled_time": 1,
+             "lifecycle_status": 1, "stream_health": 1}
+        ).to_list(None)
+
+        by_user: Dict[str, List[Dict[str, Any]]] = {}
+        for broadcast in due:
+            by_user.setdefault(broadcast["user_id"], []).append(broadcast)
+
+        calls_before = self.api_calls
+        for user_id, broadcasts in by_user.items():
+            try:
+                youtube = await self.youtube_for_user(user_id)
+            except Exception as e:
+                logging.error(f"Broadcast sync: no YouTube client for user {user_id}: {e}")
+                youtube = None
+            for batch in chunked(broadcasts, BATCH_SIZE):
+                if not youtube:
+                    await self._backoff(batch, now, "No YouTube credentials")
+                    continue
+                try:
+                    await self._sync_batch(youtube, batch, now)
+                except Exception as e:
+                    logging.error(f"Broadcast sync failed for {len(batch)} broadcasts of user {user_id}: {e}")
+                    await self._backoff(batch, now, str(e))
+
+        return {"users": len(by_user), "broadcasts": len(due), "api_calls": self.api_calls - calls_before}
+
+    async def _sync_batch(self, youtube, batch: List[Dict[str, Any]], now: datetime):
+        response = await asyncio.to_thread(youtube.liveBroadcasts().list(
+            part="id,snippet,status",
+            id=",".join(b["broadcast_id"] for b in batch),
+            maxResults=BATCH_SIZE
+        ).execute)
+        self.api_calls += 1
+        items = {item["id"]: summarize_broadcast(item) for item in response.get("items", [])}
+
+        streams: Dict[str, Dict[str, Any]] = {}
+        near_airtime = any(
+            (_parse_time(b.get("scheduled_time")) or now) - now <= timedelta(seconds=HEALTH_WINDOW_SECONDS)
+            or items.get(b["broadcast_id"], {}).get("lifecycle_status") in ACTIVE_LIFECYCLES
+            for b in batch
+        )
+        stream_ids = [b["stream_id"] for b in batch if b.get("stream_id")]
+        if near_airtime and stream_ids:
+            stream_response = await asyncio.to_thread(youtube.liveStreams().list(
+                part="id,status",
+                id=",".join(stream_ids),
+                maxResults=BATCH_SIZE
+            ).execute)
+            self.api_calls += 1
+            streams = {item["id"]: summarize_stream(item) for item in stream_response.get("items", [])}
+
+        operations = []
+        changed = []
+        for broadcast in batch:
+            # Missing from the response: deleted on YouTube
+            summary = items.get(broadcast["broadcast_id"], {"lifecycle_status": "deleted"})
+            lifecycle = summary["lifecycle_status"]
+            delay = next_sync_delay(lifecycle, _parse_time(broadcast.get("scheduled_time")), now)
+            update = {
+                **summary,
+                "synced_at": now.isoformat(),
+                "sync_error": None,
+                "next_sync_at": now + timedelta(seconds=delay) if delay else None,
+                "sync_done": delay is None,
+            }
+            health = streams.get(broadcast.get("stream_id"))
+            if health:
+                update["stream_health"] = health
+            operations.append(UpdateOne({"id": broadcast["id"]}, {"$set": update}))
+
+            if lifecycle != broadcast.get("lifecycle_status") or (health and health != broadcast.get("stream_health")):
+                changed.append((broadcast, {
+                    "lifecycle_status": lifecycle,
+                    "stream_health": health or broadcast.get("stream_health"),
+                }))
+
+        if operations:
+            await self.db.scheduled_broadcasts.bulk_write(operations, ordered=False)
+        if self.on_change:
+            for broadcast, changes in changed:
+                await self.on_change(broadcast, changes)
+
+    async def _backoff(self, batch: List[Dict[str, Any]], now: datetime, error: str):
+        await self.db.scheduled_broadcasts.update_many(
+            {"id": {"$in": [b["id"] for b in batch]}},
+            {"$set": {"next_sync_at": now + timedelta(seconds=ERROR_BACKOFF_SECONDS), "sync_error": error}}
+        )
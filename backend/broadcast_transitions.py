@@ -0,0 +1,163 @@
+"""Managed go-live: drive liveBroadcasts.transition from the encoder instead of YouTube's auto-start
+
+Broadcasts created with `enableAutoStart`/`enableAutoStop` go live whenever
+YouTube's ingest detection notices the stream, which can take a while and
+varies. In managed mode they are created without them and the encoder side
+drives the lifecycle: once FFmpeg runs, `go_live` polls liveStreams.list
+until the bound stream is `active`, transitions the broadcast to `testing`
+(the pre-roll slate plays here), and to `live` at airtime; `complete` ends it
+when the encoder has finished. Polling starts fast and backs off, so a quick
+ingest costs a few list calls and a slow one stays cheap. Each transition is
+a 50-unit API call, charged like every other call through the quota budget.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+from googleapiclient.errors import HttpError
+
+from youtube_quota import error_reason
+
+TRANSITION_MODES = ("auto", "managed")
+POLL_INITIAL_SECONDS = 1
+POLL_MAX_SECONDS = 10
+POLL_BACKOFF = 1.5
+# How long an encoder may run before YouTube must report its stream active
+STREAM_ACTIVE_TIMEOUT_SECONDS = 180
+# How long testStarting / liveStarting may take after a transition was accepted
+LIFECYCLE_TIMEOUT_SECONDS = 120
+# Lifecycle states from which each transition is already done (or no longer possible)
+PAST_TESTING = {"testing", "liveStarting", "live", "complete", "revoked"}
+PAST_LIVE = {"live", "complete", "revoked"}
+ENDED = {"complete", "revoked"}
+
+
+class TransitionError(Exception):
+    """A managed transition could not be made; the broadcast stays in its current state"""
+
+
+def poll_intervals(initial: float = POLL_INITIAL_SECONDS, maximum: float = POLL_MAX_SECONDS,
+                   factor: float = POLL_BACKOFF) -> Iterator[float]:
+    """Geometric poll delays: quick checks first, then no faster than every `maximum` seconds"""
+    delay = initial
+    while True:
+        yield delay
+        delay = min(maximum, delay * factor)
+
+
+class TransitionController:
+    """Runs managed transitions; `youtube_for_user(user_id)` returns an API client or None
+
+    API calls run in worker threads. `go_live` returns the seconds each stage
+    took, measured from when it was called (i.e. encoder start).
+    """
+
+    def __init__(self, youtube_for_user: Callable[[str], Awaitable[Any]]):
+        self.youtube_for_user = youtube_for_user
+
+    async def _client(self, user_id: str):
+        youtube = await self.youtube_for_user(user_id)
+        if not youtube:
+            raise TransitionError(f"No YouTube credentials for user {user_id}")
+        return youtube
+
+    async def _broadcast(self, youtube, broadcast_id: str) -> Dict[str, Any]:
+        response = await asyncio.to_thread(youtube.liveBroadcasts().list(
+            part="id,status,contentDetails", id=broadcast_id
+        ).execute)
+        items = response.get("items", [])
+        if not items:
+            raise TransitionError(f"Broadcast {broadcast_id} no longer exists on YouTube")
+        return items[0]
+
+    async def _stream_status(self, youtube, stream_id: str) -> Optional[str]:
+        response = await asyncio.to_thread(youtube.liveStreams().list(part="id,status", id=stream_id).execute)
+        items = response.get("items", [])
+        return items[0].get("status", {}).get("streamStatus") if items else None
+
+    async def _transition(self, youtube, broadcast_id: str, status: str):
+        try:
+            await asyncio.to_thread(youtube.liveBroadcasts().transition(
+                broadcastStatus=status, id=broadcast_id, part="id,status"
+            ).execute)
+        except HttpError as e:
+            # Already there, e.g. a restarted encoder or a second worker after takeover
+            if error_reason(e) == "redundantTransition":
+                return
+            raise TransitionError(f"Transition of {broadcast_id} to {status} failed: {error_reason(e) or e}") from e
+
+    async def _wait_for(self, what: str, check: Callable[[], Awaitable[bool]], timeout: float,
+                        keep_going: Callable[[], bool]):
+        deadline = time.monotonic() + timeout
+        for delay in poll_intervals():
+            if await check():
+                return
+            if not keep_going():
+                raise TransitionError(f"Encoder stopped while waiting for {what}")
+            if time.monotonic() + delay > deadline:
+                raise TransitionError(f"Timed out after {timeout:.0f}s waiting for {what}")
+            await asyncio.sleep(delay)
+
+    async def _wait_lifecycle(self, youtube, broadcast_id: str, reached: set, keep_going: Callable[[], bool]):
+        async def check() -> bool:
+            lifecycle = (await self._broadcast(youtube, broadcast_id))["status"].get("lifeCycleStatus")
+            if lifecycle in ENDED and not reached & ENDED:
+                raise TransitionError(f"Broadcast {broadcast_id} ended ({lifecycle}) during transition")
+            return lifecycle in reached
+        await self._wait_for(f"broadcast {broadcast_id} to reach {'/'.join(sorted(reached))}",
+                             check, LIFECYCLE_TIMEOUT_SECONDS, keep_going)
+
+    async def go_live(self, user_id: str, broadcast_id: str, stream_id: str,
+                      keep_going: Callable[[], bool], airtime: Optional[datetime] = None) -> Dict[str, float]:
+        """Take a broadcast from ready to live once its stream is active
+
+        `keep_going()` is false once the encoder has exited. With `airtime`,
+        the broadcast waits in testing until then, so a pre-roll slate is not
+        shown live.
+        """
+        started = time.monotonic()
+        timings: Dict[str, float] = {}
+        youtube = await self._client(user_id)
+
+        broadcast = await self._broadcast(youtube, broadcast_id)
+        lifecycle = broadcast["status"].get("lifeCycleStatus")
+        if lifecycle in PAST_LIVE:
+            return timings
+
+        async def stream_active() -> bool:
+            return await self._stream_status(youtube, stream_id) == "active"
+        await self._wait_for(f"stream {stream_id} to become active", stream_active,
+                             STREAM_ACTIVE_TIMEOUT_SECONDS, keep_going)
+        timings["stream_active"] = time.monotonic() - started
+
+        # Without a monitor stream, YouTube only allows ready -> live
+        monitored = broadcast.get("contentDetails", {}).get("monitorStream", {}).get("enableMonitorStream", True)
+        if monitored and lifecycle not in PAST_TESTING:
+            await self._transition(youtube, broadcast_id, "testing")
+            await self._wait_lifecycle(youtube, broadcast_id, PAST_TESTING, keep_going)
+            timings["testing"] = time.monotonic() - started
+
+        if airtime:
+            delay = (airtime - datetime.now(timezone.utc)).total_seconds()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        if not keep_going():
+            raise TransitionError("Encoder stopped before the broadcast went live")
+        requested = time.monotonic()
+        await self._transition(youtube, broadcast_id, "live")
+        await self._wait_lifecycle(youtube, broadcast_id, PAST_LIVE, keep_going)
+        timings["live"] = time.monotonic() - requested
+        timings["total"] = time.monotonic() - started
+        return timings
+
+    async def complete(self, user_id: str, broadcast_id: str) -> bool:
+        """End a live or testing broadcast; False if there was nothing to end"""
+        youtube = await self._client(user_id)
+        lifecycle = (await self._broadcast(youtube, broadcast_id))["status"].get("lifeCycleStatus")
+        if lifecycle not in ("testing", "live"):
+            logging.info(f"Not completing broadcast {broadcast_id}: it is {lifecycle}")
+            return False
+        await self._transition(youtube, broadcast_id, "complete")
+        return True
@@ -0,0 +1,75 @@
+"""Expand bulk schedule requests into slots and validate them all in one pass
+
+A bulk request is a matrix of entries, each one source with a list of dates
+and times. Every slot is checked before anything is created: time format,
+the 3-minute and 180-day limits of validate_schedule_time, and the schedule
+index's source conflict and encoder capacity checks, against existing
+broadcasts and the other slots of the same request.
+"""
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from schedule_index import DEFAULT_WINDOW_SECONDS, ScheduleIndex
+from schedule_slots import lead_error, local_airtime, parse_time_of_day, zone
+
+
+def expand_slots(entries: List[Dict[str, Any]], tz_name: str, default_times: List[str]) -> List[Dict[str, Any]]:
+    """One slot per (entry, date, time), with its UTC airtime or a parse error"""
+    tz = zone(tz_name)
+    slots = []
+    for entry_index, entry in enumerate(entries):
+        for date_str in entry.get("dates") or []:
+            for time_str in entry.get("times") or default_times:
+                slot = {
+                    "index": len(slots),
+                    "entry": entry_index,
+                    "source": entry.get("source"),
+                    "video_id": entry.get("video_id"),
+                    "date": date_str,
+                    "time": time_str,
+                    "airtime": None,
+                    "dst": None,
+                    "error": None,
+                }
+                try:
+                    slot["airtime"], slot["dst"] = local_airtime(date.fromisoformat(date_str), parse_time_of_day(time_str), tz)
+                except (ValueError, TypeError, AttributeError):
+                    slot["error"] = f"Invalid date/time '{date_str} {time_str}', expected YYYY-MM-DD and HH:MM"
+                slots.append(slot)
+    return slots
+
+
+def validate_slots(slots: List[Dict[str, Any]], now: datetime, durations: Dict[int, Optional[float]],
+                   index: ScheduleIndex, channel: str, capacity: int) -> List[Dict[str, Any]]:
+    """Set `error` on every slot that cannot be scheduled; returns the slots
+
+    `durations` maps entry index to source duration in seconds (slots without
+    an `entry` use key None). Slots are
+    checked against the schedule index and against each other in airtime
+    order, so of two conflicting slots the earlier one is kept. The index is
+    left as it was.
+    """
+    candidates = []
+    for slot in slots:
+        if slot["error"]:
+            continue
+        slot["ends_at"] = slot["airtime"] + timedelta(seconds=durations.get(slot.get("entry")) or DEFAULT_WINDOW_SECONDS)
+        slot["error"] = lead_error(slot["airtime"], now)
+        if not slot["error"]:
+            candidates.append(slot)
+
+    accepted = []
+    try:
+        for slot in sorted(candidates, key=lambda s: (s["airtime"], s["index"])):
+            slot["error"] = index.check(channel, slot["video_id"], slot["airtime"], slot["ends_at"], capacity)
+            if not slot["error"]:
+                # Held in the index so later slots of this request see it
+                placeholder = {"id": f"bulk-slot-{slot['index']}", "user_id": channel, "video_id": slot["video_id"],
+                               "scheduled_time": slot["airtime"].isoformat(),
+                               "duration_seconds": (slot["ends_at"] - slot["airtime"]).total_seconds()}
+                index.add(placeholder)
+                accepted.append(placeholder["id"])
+    finally:
+        for placeholder_id in accepted:
+            index.remove(placeholder_id)
+    return slots
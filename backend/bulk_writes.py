@@ -0,0 +1,130 @@
+"""Batched MongoDB writes: one ordered bulk call per collection instead of one round-trip per document
+
+`WriteBatch` collects the inserts and updates of one request (e.g. every
+broadcast, event and stream job of a scheduling form) and writes them when
+the caller flushes. `WriteBehindBuffer` does the same for high-frequency
+telemetry, flushing on its own every `flush_interval` seconds or as soon as
+`max_pending` operations are queued.
+
+Operations keep their order within a collection, and collections are
+written in the order they were first used, so a document is always written
+before an update queued after it.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from pymongo import InsertOne, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError
+
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_MAX_PENDING = 500
+# Operations kept for retry while MongoDB is unreachable; the oldest beyond this are dropped
+MAX_RETAINED = 10000
+
+
+class WriteBatch:
+    def __init__(self, db):
+        self.db = db
+        self.pending: Dict[str, List[Any]] = {}
+
+    def __len__(self):
+        return sum(len(operations) for operations in self.pending.values())
+
+    def insert(self, collection: str, document: Dict[str, Any]):
+        self.pending.setdefault(collection, []).append(InsertOne(document))
+
+    def update(self, collection: str, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False,
+               many: bool = False):
+        operation = UpdateMany(query, update, upsert=upsert) if many else UpdateOne(query, update, upsert=upsert)
+        self.pending.setdefault(collection, []).append(operation)
+
+    async def flush(self) -> int:
+        """Write everything queued so far; returns the number of operations written
+
+        On failure the collections not written yet are queued again and the
+        error is raised.
+        """
+        pending, self.pending = self.pending, {}
+        written = 0
+        collections = list(pending)
+        for position, collection in enumerate(collections):
+            operations = pending[collection]
+            try:
+                # Inserts and updates alike go out as one ordered bulk_write (batched by the driver)
+                await self.db[collection].bulk_write(operations, ordered=True)
+            except BulkWriteError as e:
+                # Everything before the failed operation was applied; the failed one is dropped
+                failed = e.details["writeErrors"][0]
+                logging.error(f"Bulk write to {collection} rejected operation {failed['index']}: {failed.get('errmsg')}")
+                unwritten = {name: pending[name] for name in collections[position + 1:]}
+                if failed["index"] + 1 < len(operations):
+                    unwritten = {collection: operations[failed["index"] + 1:], **unwritten}
+                self._requeue(unwritten)
+                raise
+            except Exception:
+                # Unknown how much was applied; inserts carry their _id by now, so a retry cannot duplicate them
+                self._requeue({name: pending[name] for name in collections[position:]})
+                raise
+            written += len(operations)
+        return written
+
+    def _requeue(self, unwritten: Dict[str, List[Any]]):
+        # Older operations go first, ahead of anything queued during the failed flush
+        for collection, operations in unwritten.items():
+            self.pending[collection] = operations + self.pending.get(collection, [])
+
+
+class WriteBehindBuffer(WriteBatch):
+    """A WriteBatch that flushes itself in the background while `run()` is going"""
+
+    def __init__(self, db, flush_interval: float = DEFAULT_FLUSH_INTERVAL, max_pending: int = DEFAULT_MAX_PENDING):
+        super().__init__(db)
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._full = asyncio.Event()
+        self._lock = asyncio.Lock()
+
+    def insert(self, collection: str, document: Dict[str, Any]):
+        super().insert(collection, document)
+        self._check_size()
+
+    def update(self, collection: str, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False,
+               many: bool = False):
+        super().update(collection, query, update, upsert, many)
+        self._check_size()
+
+    def _check_size(self):
+        if len(self) >= self.max_pending:
+            self._full.set()
+
+    async def flush(self) -> int:
+        # Serialized, so a later flush cannot overtake one still writing
+        async with self._lock:
+            self._full.clear()
+            return await super().flush()
+
+    def _requeue(self, unwritten: Dict[str, List[Any]]):
+        super()._requeue(unwritten)
+        excess = len(self) - MAX_RETAINED
+        if excess > 0:
+            logging.error(f"Write-behind buffer over {MAX_RETAINED} operations, dropping the oldest {excess}")
+            for collection in list(self.pending):
+                dropped = min(excess, len(self.pending[collection]))
+                self.pending[collection] = self.pending[collection][dropped:]
+                excess -= dropped
+
+    async def run(self, stop: Optional[asyncio.Event] = None):
+        """Flush every `flush_interval` seconds, or sooner when `max_pending` is reached"""
+        while not (stop and stop.is_set()):
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            if not self.pending:
+                continue
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"Write-behind flush failed ({len(self)} operations pending): {e}")
+                await asyncio.sleep(self.flush_interval)
@@ -0,0 +1,325 @@
+"""Named FFmpeg encoder profiles and ffprobe based source analysis"""
+import json
+import logging
+import subprocess
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_PROFILE_NAME = "balanced"
+
+# Built-in profiles. These are seeded into the `encoder_profiles` collection on
+# startup and can be edited there; the copies here are the fallback when the
+# database has no entry for a name.
+DEFAULT_ENCODER_PROFILES: Dict[str, Dict[str, Any]] = {
+    "low-cpu": {
+        "name": "low-cpu",
+        "description": "Static or low-motion content (slides, talks, music over artwork)",
+        "mode": "encode",
+        "preset": "ultrafast",
+        "tune": "zerolatency",
+        "max_height": 720,
+        "max_fps": 15,
+        "gop_seconds": 4,
+        "audio_bitrate": "128k",
+        "ladder": [
+            {"max_height": 360, "video_bitrate": "400k", "maxrate": "500k"},
+            {"max_height": 480, "video_bitrate": "600k", "maxrate": "800k"},
+            {"max_height": 720, "video_bitrate": "1000k", "maxrate": "1300k"},
+        ],
+    },
+    "balanced": {
+        "name": "balanced",
+        "description": "General purpose 720p30 encode (previous hardcoded settings)",
+        "mode": "encode",
+        "preset": "veryfast",
+        "tune": "zerolatency",
+        "max_height": 720,
+        "max_fps": 30,
+        "gop_seconds": 2,
+        "audio_bitrate": "128k",
+        "ladder": [
+            {"max_height": 360, "video_bitrate": "800k", "maxrate": "1000k"},
+            {"max_height": 480, "video_bitrate": "1200k", "maxrate": "1500k"},
+            {"max_height": 720, "video_bitrate": "2000k", "maxrate": "2500k"},
+        ],
+    },
+    "quality": {
+        "name": "quality",
+        "description": "High-motion content (sports, gameplay) up to 1080p60",
+        "mode": "encode",
+        "preset": "faster",
+        "tune": "zerolatency",
+        "max_height": 1080,
+        "max_fps": 60,
+        "gop_seconds": 2,
+        "audio_bitrate": "160k",
+        "ladder": [
+            {"max_height": 480, "video_bitrate": "1500k", "maxrate": "2000k"},
+            {"max_height": 720, "video_bitrate": "3000k", "maxrate": "4000k"},
+            {"max_height": 1080, "video_bitrate": "5000k", "maxrate": "6000k"},
+        ],
+    },
+    "still-image": {
+        "name": "still-image",
+        "description": "Still pictures over audio (talks, music over artwork); image+audio broadcasts loop a pre-encoded GOP",
+        "mode": "encode",
+        "preset": "veryfast",
+        "tune": "stillimage",
+        "max_height": 1080,
+        "max_fps": 5,
+        "gop_seconds": 4,
+        "audio_bitrate": "128k",
+        "ladder": [
+            {"max_height": 480, "video_bitrate": "300k", "maxrate": "400k"},
+            {"max_height": 720, "video_bitrate": "500k", "maxrate": "700k"},
+            {"max_height": 1080, "video_bitrate": "800k", "maxrate": "1000k"},
+        ],
+    },
+    "passthrough": {
+        "name": "passthrough",
+        "description": "No re-encode; source must already be H.264/AAC with short keyframe intervals",
+        "mode": "copy",
+        "max_height": 1080,
+        "max_fps": 60,
+        "max_keyframe_interval": 4,
+    },
+}
+
+STILL_PROFILE_NAME = "still-image"
+
+# Motion score thresholds (mean inter-frame packet size / mean keyframe size)
+STILL_MOTION_THRESHOLD = 0.01
+STATIC_MOTION_THRESHOLD = 0.05
+HIGH_MOTION_THRESHOLD = 0.35
+
+
+def _parse_rate(rate: Optional[str]) -> float:
+    """Parse an ffprobe rational like '30000/1001' into a float"""
+    try:
+        if not rate:
+            return 0.0
+        if '/' in rate:
+            num, den = rate.split('/', 1)
+            return float(num) / float(den) if float(den) else 0.0
+        return float(rate)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _parse_int(value: Any) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def analyze_source(path: str, sample_seconds: int = 20, timeout: int = 60) -> Optional[Dict[str, Any]]:
+    """Run ffprobe on a file or URL and summarise resolution, fps, codecs and motion"""
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-print_format', 'json',
+             '-show_format', '-show_streams', path],
+            capture_output=True, text=True, timeout=timeout
+        )
+        if result.returncode != 0:
+            logging.error(f"ffprobe failed for {path}: {result.stderr.strip()[:300]}")
+            return None
+        probe = json.loads(result.stdout or '{}')
+    except Exception as e:
+        logging.error(f"ffprobe failed for {path}: {e}")
+        return None
+
+    streams = probe.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'), None)
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+
+    fmt = probe.get('format', {})
+    analysis = {
+        "width": int(video.get('width', 0)) if video else 0,
+        "height": int(video.get('height', 0)) if video else 0,
+        "fps": round(_parse_rate(video.get('avg_frame_rate') or video.get('r_frame_rate')), 3) if video else 0.0,
+        "video_codec": video.get('codec_name') if video else None,
+        "audio_codec": audio.get('codec_name') if audio else None,
+        "duration": _parse_rate(fmt.get('duration')),
+        "bitrate": _parse_int(fmt.get('bit_rate')),
+        "video_bitrate": _parse_int(video.get('bit_rate')) if video else 0,
+        "audio_bitrate": _parse_int(audio.get('bit_rate')) if audio else 0,
+        "audio_sample_rate": _parse_int(audio.get('sample_rate')) if audio else 0,
+        "pixel_format": video.get('pix_fmt') if video else None,
+        "format_name": fmt.get('format_name'),
+        "motion_score": None,
+        "keyframe_interval": None,
+    }
+
+    if video:
+        analysis.update(_sample_packets(path, sample_seconds, timeout))
+
+    return analysis
+
+
+def _sample_packets(path: str, sample_seconds: int, timeout: int) -> Dict[str, Any]:
+    """Estimate motion and keyframe spacing from packet sizes in the first seconds"""
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+             '-read_intervals', f'%+{sample_seconds}',
+             '-show_entries', 'packet=pts_time,size,flags', '-of', 'csv=p=0', path],
+            capture_output=True, text=True, timeout=timeout
+        )
+    except Exception as e:
+        logging.error(f"Packet sampling failed for {path}: {e}")
+        return {}
+
+    key_sizes, delta_sizes, key_times = [], [], []
+    for line in result.stdout.splitlines():
+        parts = line.strip().split(',')
+        if len(parts) < 3:
+            continue
+        try:
+            pts_time = float(parts[0]) if parts[0] not in ('', 'N/A') else None
+            size = int(parts[1])
+        except ValueError:
+            continue
+        if 'K' in parts[2]:
+            key_sizes.append(size)
+            if pts_time is not None:
+                key_times.append(pts_time)
+        else:
+            delta_sizes.append(size)
+
+    sample = {}
+    if key_sizes and delta_sizes:
+        mean_key = sum(key_sizes) / len(key_sizes)
+        mean_delta = sum(delta_sizes) / len(delta_sizes)
+        sample["motion_score"] = round(mean_delta / mean_key, 4) if mean_key else None
+    if len(key_times) > 1:
+        gaps = [b - a for a, b in zip(key_times, key_times[1:]) if b > a]
+        if gaps:
+            sample["keyframe_interval"] = round(max(gaps), 3)
+    return sample
+
+
+def can_passthrough(analysis: Optional[Dict[str, Any]], profile: Optional[Dict[str, Any]] = None) -> bool:
+    """Whether the source can be sent to YouTube without re-encoding"""
+    if not analysis:
+        return False
+    profile = profile or DEFAULT_ENCODER_PROFILES["passthrough"]
+    keyframe_interval = analysis.get("keyframe_interval")
+    return (
+        analysis.get("video_codec") == "h264"
+        and analysis.get("audio_codec") == "aac"
+        and 0 < analysis.get("height", 0) <= profile.get("max_height", 1080)
+        and 0 < analysis.get("fps", 0) <= profile.get("max_fps", 60)
+        and keyframe_interval is not None
+        and keyframe_interval <= profile.get("max_keyframe_interval", 4)
+    )
+
+
+def is_mp4_container(analysis: Optional[Dict[str, Any]]) -> bool:
+    return bool(analysis) and 'mp4' in (analysis.get("format_name") or '')
+
+
+def select_profile_name(analysis: Optional[Dict[str, Any]]) -> str:
+    """Pick a profile name from ffprobe source analysis"""
+    if not analysis:
+        return DEFAULT_PROFILE_NAME
+
+    if can_passthrough(analysis):
+        return "passthrough"
+
+    motion = analysis.get("motion_score")
+    if motion is not None and motion < STILL_MOTION_THRESHOLD:
+        return STILL_PROFILE_NAME
+    if motion is not None and motion < STATIC_MOTION_THRESHOLD:
+        return "low-cpu"
+
+    high_motion = motion is not None and motion > HIGH_MOTION_THRESHOLD
+    if high_motion and (analysis.get("height", 0) > 720 or analysis.get("fps", 0) > 30):
+        return "quality"
+
+    return DEFAULT_PROFILE_NAME
+
+
+def ladder_rung(profile: Dict[str, Any], height: int) -> Dict[str, Any]:
+    """Smallest ladder rung that covers the output height"""
+    ladder = sorted(profile.get("ladder", []), key=lambda r: r["max_height"])
+    for rung in ladder:
+        if height <= rung["max_height"]:
+            return rung
+    return ladder[-1] if ladder else {"video_bitrate": "2000k", "maxrate": "2500k"}
+
+
+def output_geometry(profile: Dict[str, Any], analysis: Optional[Dict[str, Any]] = None) -> Tuple[int, int, int]:
+    """16:9 output (width, height, fps) of an encode: the source's, capped by the profile"""
+    max_height = profile.get("max_height", 720)
+    source_height = (analysis or {}).get("height") or max_height
+    height = min(max_height, source_height)
+    height -= height % 2
+    width = int(round(height * 16 / 9))
+    width -= width % 2
+
+    max_fps = profile.get("max_fps", 30)
+    source_fps = (analysis or {}).get("fps") or max_fps
+    fps = max(1, min(max_fps, int(round(source_fps))))
+    return width, height, fps
+
+
+def still_image_args(profile: Dict[str, Any], audio_analysis: Optional[Dict[str, Any]] = None) -> List[str]:
+    """Output arguments for a looped pre-encoded picture over an audio source: video copied, audio encoded
+    only when it cannot be copied to FLV as is"""
+    if (audio_analysis or {}).get("audio_codec") == "aac" and (audio_analysis or {}).get("audio_sample_rate") in (44100, 48000):
+        audio = ['-c:a', 'copy']
+    else:
+        audio = ['-c:a', 'aac', '-b:a', profile.get("audio_bitrate", "128k"), '-ar', '44100']
+    return [
+        '-c:v', 'copy',
+        *audio,
+        # The picture loops forever; the audio decides when the broadcast ends
+        '-shortest',
+        '-f', 'flv',
+        '-flvflags', 'no_duration_filesize',
+    ]
+
+
+def encoder_args(profile: Dict[str, Any], analysis: Optional[Dict[str, Any]] = None,
+                 video_filter: Optional[str] = None) -> List[str]:
+    """Build the FFmpeg output encoding arguments for a profile and source"""
+    if profile.get("mode") == "copy":
+        if analysis is not None and not can_passthrough(analysis, profile):
+            logging.warning(f"Source not eligible for passthrough, using {DEFAULT_PROFILE_NAME} profile")
+            return encoder_args(DEFAULT_ENCODER_PROFILES[DEFAULT_PROFILE_NAME], analysis, video_filter)
+        return [
+            '-c:v', 'copy',
+            '-c:a', 'copy',
+            '-f', 'flv',
+            '-flvflags', 'no_duration_filesize',
+        ]
+
+    width, height, fps = output_geometry(profile, analysis)
+    gop = max(1, int(fps * profile.get("gop_seconds", 2)))
+
+    rung = ladder_rung(profile, height)
+    maxrate_kbps = int(str(rung["maxrate"]).rstrip('k'))
+
+    if video_filter is None:
+        video_filter = f'scale={width}:{height}:force_original_aspect_ratio=decrease,pad={width}:{height}:(ow-iw)/2:(oh-ih)/2'
+
+    args = [
+        '-c:v', 'libx264',
+        '-c:a', 'aac',
+        '-preset', profile.get("preset", "veryfast"),
+        '-tune', profile.get("tune", "zerolatency"),
+        '-pix_fmt', 'yuv420p',
+        '-maxrate', rung["maxrate"],
+        '-bufsize', f'{maxrate_kbps * 2}k',
+        '-vf', video_filter,
+        '-r', str(fps),
+        '-g', str(gop),
+        '-keyint_min', str(max(1, gop // 2)),
+        '-sc_threshold', '0',
+        '-b:v', rung["video_bitrate"],
+        '-b:a', profile.get("audio_bitrate", "128k"),
+        '-ar', '44100',
+        '-f', 'flv',
+        '-flvflags', 'no_duration_filesize',
+    ]
+    return args
@@ -0,0 +1,141 @@
+"""Cross-process event bus on a capped MongoDB collection, fanned out to SSE subscribers
+
+Any process (API or stream worker) publishes by inserting into the capped
+`stream_events` collection. Each API process runs a single tailable cursor on
+it and hands matching events to its connected dashboards through in-memory
+queues, so MongoDB load does not grow with the number of open dashboards.
+
+Event ids are generated by each publishing process, so they are not ordered
+across processes; resuming goes by the collection's insertion ($natural)
+order instead.
+"""
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+
+EVENTS_COLLECTION = "stream_events"
+EVENTS_CAPPED_BYTES = 16 * 1024 * 1024
+SUBSCRIBER_QUEUE_SIZE = 256
+REPLAY_LIMIT = 500
+# Clock skew between publishing processes tolerated when a tail cursor is reopened
+RESUME_SKEW_SECONDS = 60
+# Ids remembered to skip events seen before a reopened cursor re-reads them
+SEEN_IDS_LIMIT = 10000
+
+
+class EventBus:
+    def __init__(self, db):
+        self.db = db
+        self.collection = db[EVENTS_COLLECTION]
+        self.subscribers: Dict[asyncio.Queue, str] = {}
+        self._tail_task: Optional[asyncio.Task] = None
+
+    async def ensure_collection(self):
+        try:
+            await self.db.create_collection(EVENTS_COLLECTION, capped=True, size=EVENTS_CAPPED_BYTES)
+        except CollectionInvalid:
+            pass  # already exists
+
+    async def publish(self, event_type: str, user_id: Optional[str], data: Dict[str, Any], batch=None):
+        """Insert an event now, or queue it on `batch` (a bulk_writes.WriteBatch) to go out with its next flush"""
+        if not user_id:
+            return
+        event = {
+            "type": event_type,
+            "user_id": user_id,
+            "data": data,
+            "ts": datetime.now(timezone.utc).isoformat(),
+        }
+        if batch is not None:
+            batch.insert(EVENTS_COLLECTION, event)
+        else:
+            await self.collection.insert_one(event)
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.subscribers[queue] = user_id
+        if not self._tail_task or self._tail_task.done():
+            self._tail_task = asyncio.create_task(self._tail())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.pop(queue, None)
+
+    async def replay(self, user_id: str, after_id: str) -> List[Dict[str, Any]]:
+        """Events a reconnecting client missed since `after_id` (its Last-Event-ID), oldest first
+
+        Walks back in insertion order until `after_id`; if it has been
+        overwritten meanwhile, the newest REPLAY_LIMIT events are returned.
+        """
+        try:
+            last = ObjectId(after_id)
+        except Exception:
+            return []
+        missed = []
+        cursor = self.collection.find(
+            {"$or": [{"_id": last}, {"user_id": user_id}]}
+        ).sort("$natural", -1).limit(REPLAY_LIMIT + 1)
+        async for event in cursor:
+            if event["_id"] == last:
+                break
+            missed.append(event)
+        return missed[:REPLAY_LIMIT][::-1]
+
+    def _dispatch(self, event: Dict[str, Any]):
+        for queue, user_id in list(self.subscribers.items()):
+            if user_id != event["user_id"]:
+                continue
+            if queue.full():
+                # A slow client loses its oldest events rather than stalling everyone
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def _tail(self):
+        """Follow the capped collection from its current end for as long as anyone listens
+
+        A reopened cursor re-reads the last RESUME_SKEW_SECONDS (by publish
+        time) and skips the ids already dispatched, so events inserted late
+        by a process with a lagging clock are not lost.
+        """
+        since = _shift(datetime.now(timezone.utc).isoformat())
+        seen_order: deque = deque()
+        seen = set()
+
+        def remember(event_id):
+            seen.add(event_id)
+            seen_order.append(event_id)
+            if len(seen_order) > SEEN_IDS_LIMIT:
+                seen.discard(seen_order.popleft())
+
+        # Events already there when the first dashboard connected are not news
+        async for event in self.collection.find({"ts": {"$gte": since}}, {"_id": 1}):
+            remember(event["_id"])
+
+        while self.subscribers:
+            cursor = self.collection.find({"ts": {"$gte": since}}, cursor_type=CursorType.TAILABLE_AWAIT)
+            try:
+                while cursor.alive and self.subscribers:
+                    async for event in cursor:
+                        if event["_id"] in seen:
+                            continue
+                        remember(event["_id"])
+                        since = max(since, _shift(event["ts"]))
+                        self._dispatch(event)
+                    await asyncio.sleep(0.5)
+            except Exception as e:
+                logging.error(f"Event tail failed: {e}")
+            finally:
+                await cursor.close()
+            # Cursor dies when the collection is empty or the tail position was overwritten
+            await asyncio.sleep(1)
+
+
+def _shift(ts: str) -> str:
+    """The publish time RESUME_SKEW_SECONDS before `ts`, as stored in events"""
+    return (datetime.fromisoformat(ts) - timedelta(seconds=RESUME_SKEW_SECONDS)).isoformat()
@@ -0,0 +1,106 @@
+"""HTTP Range file responses with zero-copy send where the ASGI server supports it"""
+import os
+import re
+from email.utils import formatdate
+from typing import Mapping, Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+CHUNK_SIZE = 256 * 1024
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header: Optional[str], file_size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single-range Range header into an inclusive (start, end)
+
+    Returns None for no/unsupported ranges (serve the whole file) and raises
+    ValueError when the range cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip().replace(' ', ''))
+    if not match:
+        return None  # multi-range or other units: fall back to a full response
+    start_text, end_text = match.groups()
+    if not start_text and not end_text:
+        return None
+
+    if not start_text:
+        # Suffix range: last N bytes
+        length = int(end_text)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, file_size - length), file_size - 1
+
+    start = int(start_text)
+    end = int(end_text) if end_text else file_size - 1
+    if start >= file_size or end < start:
+        raise ValueError("Range not satisfiable")
+    return start, min(end, file_size - 1)
+
+
+class RangeFileResponse(Response):
+    """Serve a file (or a byte range of it) without loading it into memory"""
+
+    def __init__(self, path: str, range_header: Optional[str] = None, media_type: Optional[str] = None,
+                 headers: Optional[Mapping[str, str]] = None, filename: Optional[str] = None):
+        self.path = path
+        stat = os.stat(path)
+        file_size = stat.st_size
+
+        try:
+            byte_range = parse_range(range_header, file_size)
+            status_code = 206 if byte_range else 200
+        except ValueError:
+            byte_range = None
+            status_code = 416
+
+        super().__init__(content=None, status_code=status_code, headers=headers, media_type=media_type)
+        self.headers.setdefault("accept-ranges", "bytes")
+        self.headers.setdefault("last-modified", formatdate(stat.st_mtime, usegmt=True))
+        if filename:
+            self.headers["content-disposition"] = f"attachment; filename*=utf-8''{quote(filename)}"
+
+        if status_code == 416:
+            self.offset, self.length = 0, 0
+            self.headers["content-range"] = f"bytes */{file_size}"
+        elif byte_range:
+            self.offset = byte_range[0]
+            self.length = byte_range[1] - byte_range[0] + 1
+            self.headers["content-range"] = f"bytes {byte_range[0]}-{byte_range[1]}/{file_size}"
+        else:
+            self.offset, self.length = 0, file_size
+        self.headers["content-length"] = str(self.length)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope.get("method") == "HEAD" or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        with open(self.path, "rb") as f:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                # Server does sendfile() straight from the descriptor
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f.fileno(),
+                    "offset": self.offset,
+                    "count": self.length,
+                    "more_body": False,
+                })
+                return
+
+            fd = f.fileno()
+            offset, remaining = self.offset, self.length
+            while remaining > 0:
+                chunk = await anyio.to_thread.run_sync(os.pread, fd, min(CHUNK_SIZE, remaining), offset)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
@@ -0,0 +1,147 @@
+"""yt-dlp format selection and a TTL cache for resolved stream URLs"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+MAX_HEIGHT = 720
+HLS_PROTOCOLS = ('m3u8', 'm3u8_native', 'hls')
+DIRECT_PROTOCOLS = ('http', 'https')
+
+# Signed googlevideo URLs carry an `expire` unix timestamp; stop reusing them a bit early
+EXPIRY_SAFETY_SECONDS = 300
+DEFAULT_TTL_SECONDS = 3600
+
+
+def _is_hls(fmt: Dict[str, Any]) -> bool:
+    url = fmt.get('url') or ''
+    return url.endswith('.m3u8') or 'manifest' in url or fmt.get('protocol') in HLS_PROTOCOLS
+
+
+def _has(codec: Optional[str]) -> bool:
+    return bool(codec) and codec != 'none'
+
+
+def score_format(fmt: Dict[str, Any]) -> Optional[Tuple]:
+    """Rank a format for RTMP restreaming; None if it cannot be used at all
+
+    Ordering (highest first): muxed audio+video, MP4 container, H.264 video,
+    height up to MAX_HEIGHT, then total bitrate.
+    """
+    height = fmt.get('height') or 0
+    if (not fmt.get('url') or not _has(fmt.get('vcodec')) or _is_hls(fmt)
+            or fmt.get('protocol') not in DIRECT_PROTOCOLS or height > MAX_HEIGHT):
+        return None
+    return (
+        _has(fmt.get('acodec')),
+        fmt.get('ext') == 'mp4',
+        (fmt.get('vcodec') or '').startswith(('avc1', 'h264')),
+        height,
+        fmt.get('tbr') or 0,
+    )
+
+
+def _method_name(fmt: Dict[str, Any]) -> str:
+    height = fmt.get('height', 'unknown')
+    if not _has(fmt.get('acodec')):
+        return f"video_only_http_{fmt.get('ext', 'unknown')}_{height}p"
+    if fmt.get('ext') == 'mp4':
+        return f"mp4_direct_{height}p"
+    return f"direct_http_{fmt.get('ext', 'unknown')}_{height}p"
+
+
+def select_stream_format(info: Dict[str, Any]) -> Tuple[Optional[str], str]:
+    """Pick a stream URL from yt-dlp info in a single pass; returns (url, method) or (None, error)
+
+    The scored `formats` list takes precedence; the top-level `url` (set only
+    when yt-dlp itself resolved a format) is a fallback for extractors without one.
+    """
+    formats = info.get('formats') or []
+    if formats:
+        best, best_score = None, None
+        for fmt in formats:
+            score = score_format(fmt)
+            if score is not None and (best_score is None or score > best_score):
+                best, best_score = fmt, score
+        if best is None:
+            protocols = sorted({fmt.get('protocol', 'unknown') for fmt in formats})
+            return None, (f"No suitable non-HLS format found. Available protocols: {protocols}. "
+                          f"YouTube may only provide HLS for this video.")
+        return best['url'], _method_name(best)
+
+    if info.get('url'):
+        return info['url'], "direct_url"
+
+    if info.get('manifest_url'):
+        return info['manifest_url'], "manifest_url"
+
+    return None, "No suitable stream URL found in extracted info"
+
+
+def url_ttl(url: str, now: Optional[float] = None) -> float:
+    """Seconds a signed stream URL can still be handed out"""
+    now = now or time.time()
+    try:
+        expire = int(parse_qs(urlparse(url).query).get('expire', [''])[0])
+    except ValueError:
+        # Some URLs carry it as a path segment: /expire/<ts>/
+        parts = urlparse(url).path.split('/')
+        try:
+            expire = int(parts[parts.index('expire') + 1])
+        except (ValueError, IndexError):
+            return DEFAULT_TTL_SECONDS
+    return max(0.0, expire - now - EXPIRY_SAFETY_SECONDS)
+
+
+class StreamUrlCache:
+    """Per-video cache of resolved URLs with coalescing of concurrent lookups"""
+
+    def __init__(self):
+        self.entries: Dict[str, Tuple[float, Tuple[str, str]]] = {}
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Tuple[str, str]]:
+        entry = self.entries.get(key)
+        if entry and entry[0] > time.time():
+            return entry[1]
+        if entry:
+            del self.entries[key]
+        return None
+
+    def invalidate(self, key: str):
+        self.entries.pop(key, None)
+
+    async def get_or_resolve(self, key: str,
+                             resolver: Callable[[], Awaitable[Tuple[Optional[str], str]]]) -> Tuple[Optional[str], str]:
+        cached = self.get(key)
+        if cached:
+            self.hits += 1
+            return cached
+
+        # Join a lookup that is already running for the same video
+        pending = self.inflight.get(key)
+        if pending:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            result = await resolver()
+            url = result[0]
+            if url:
+                ttl = url_ttl(url)
+                if ttl > 0:
+                    self.entries[key] = (time.time() + ttl, result)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            # Avoid "exception never retrieved" when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            self.inflight.pop(key, None)
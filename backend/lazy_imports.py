@@ -0,0 +1,58 @@
+"""Deferred imports for the heavy dependencies no request needs at startup
+
+yt_dlp, googleapiclient.discovery and the Google auth/OAuth stacks account
+for a large share of server.py's import time, yet they are first used by a
+YouTube call or a stream job, not by the process coming up. `lazy_module`
+returns a stand-in that imports the real module on first attribute access.
+`preload` imports every registered module (in a worker thread, once the app
+is serving), so a restart shortly before airtime does not leave the first
+stream job paying for them either.
+"""
+import importlib
+import logging
+import sys
+import time
+from typing import Dict, List
+
+
+class LazyModule:
+    """Module stand-in; attribute access imports the module (importlib's lock makes this thread-safe)"""
+
+    def __init__(self, name: str):
+        self._name = name
+
+    @property
+    def loaded(self) -> bool:
+        return self._name in sys.modules
+
+    def __getattr__(self, attr: str):
+        return getattr(importlib.import_module(self._name), attr)
+
+    def __repr__(self) -> str:
+        return f"<lazy module {self._name!r}{' (loaded)' if self.loaded else ''}>"
+
+
+registered: List[LazyModule] = []
+
+
+def lazy_module(name: str) -> LazyModule:
+    module = LazyModule(name)
+    registered.append(module)
+    return module
+
+
+def preload() -> Dict[str, float]:
+    """Import every registered module not loaded yet (blocking); returns seconds spent per module"""
+    timings = {}
+    for module in registered:
+        if module.loaded:
+            continue
+        started = time.perf_counter()
+        try:
+            importlib.import_module(module._name)
+        except Exception as e:
+            # Surfaces again, with its traceback, where the module is first used
+            logging.error(f"Preloading {module._name} failed: {e}")
+            continue
+        timings[module._name] = round(time.perf_counter() - started, 3)
+    return timings
@@ -0,0 +1,236 @@
+"""In-process Prometheus metrics: counters, gauges and histograms in the text exposition format
+
+Recording is a dict lookup and an add under a per-metric lock (pymongo and
+googleapiclient report from worker threads), so instruments can stay on in
+production. Values another component already keeps (running encoders, cache
+hit counts) are read by callbacks at scrape time instead of being tracked on
+the hot path.
+"""
+import asyncio
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds; suits HTTP handlers, MongoDB commands and YouTube API calls alike
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values: Dict[LabelValues, Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, LabelValues, str, float]]:
+        """(suffix, label values, extra label, value) rows for the exposition"""
+        with self.lock:
+            return [("", key, "", value) for key, value in self.values.items()]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        # Per-bucket counts are made cumulative only when rendered
+        position = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][position] += 1
+            series[1] += value
+
+    def samples(self) -> List[Tuple[str, LabelValues, str, float]]:
+        with self.lock:
+            snapshot = [(key, list(counts), total) for key, (counts, total) in self.values.items()]
+        rows = []
+        for key, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                rows.append(("_bucket", key, f'le="{_format_value(bound)}"', cumulative))
+            rows.append(("_sum", key, "", total))
+            rows.append(("_count", key, "", cumulative))
+        return rows
+
+
+class CallbackMetric(Metric):
+    """Counter or gauge whose values are read from `collect()` at scrape time
+
+    `collect` returns a number, or a dict of label-value tuples to numbers.
+    """
+
+    def __init__(self, name: str, documentation: str, kind: str,
+                 collect: Callable[[], Union[float, Dict[LabelValues, float]]], labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.collect = collect
+
+    def samples(self) -> List[Tuple[str, LabelValues, str, float]]:
+        try:
+            values = self.collect()
+        except Exception as e:
+            logging.error(f"Metric callback for {self.name} failed: {e}")
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [("", key, "", value) for key, value in values.items() if value is not None]
+
+
+class Registry:
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        metric.name = self.prefix + metric.name
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, documentation: str, kind: str, collect: Callable[[], Any],
+                 labelnames: Iterable[str] = ()) -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, kind, collect, labelnames))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry(prefix="scheduler_")
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware observing time to response start per route template
+
+    Labelled by the matched route's path template, so path parameters do not
+    multiply series; unmatched paths share one label. Streaming responses (SSE,
+    NDJSON) are measured up to their first byte, not for their whole lifetime.
+    """
+
+    def __init__(self, app, histogram: Histogram):
+        self.app = app
+        self.histogram = histogram
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        observed = False
+
+        async def send_with_metrics(message):
+            nonlocal observed
+            if message["type"] == "http.response.start" and not observed:
+                observed = True
+                route = scope.get("route")
+                self.histogram.observe(
+                    time.perf_counter() - started,
+                    method=scope["method"],
+                    route=getattr(route, "path", None) or "unmatched",
+                    status=message["status"]
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_with_metrics)
+
+
+async def serve(port: int, host: str = "0.0.0.0", target: Optional[Registry] = None) -> asyncio.AbstractServer:
+    """Minimal HTTP listener answering every request with the registry's exposition (for worker.py)"""
+    target = target or registry
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            # Request line and headers are read and ignored
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            body = target.render().encode()
+            writer.write(
+                f"HTTP/1.1 200 OK\r\nContent-Type: {CONTENT_TYPE}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except Exception as e:
+            logging.error(f"Metrics request failed: {e}")
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
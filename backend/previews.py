@@ -0,0 +1,101 @@
+"""Poster frame, seek sprite and preview clip generation for uploaded videos"""
+import logging
+import os
+import subprocess
+from typing import Any, Dict, List, Optional
+
+PREVIEW_FILES = {
+    "poster": ("poster.jpg", "image/jpeg"),
+    "sprite": ("sprite.jpg", "image/jpeg"),
+    "clip": ("preview.mp4", "video/mp4"),
+}
+
+SPRITE_COLUMNS = 10
+SPRITE_ROWS = 10
+SPRITE_TILE_WIDTH = 160
+SPRITE_TILE_HEIGHT = 90
+POSTER_WIDTH = 640
+CLIP_SECONDS = 10
+CLIP_HEIGHT = 240
+
+
+def preview_dir(upload_dir: str, file_id: str) -> str:
+    return os.path.join(upload_dir, "previews", file_id)
+
+
+def build_preview_command(source: str, output_dir: str, duration: float,
+                          has_audio: bool = True) -> List[str]:
+    """One decode pass split three ways: poster frame, tiled seek sprite and a short clip"""
+    duration = max(duration, 1.0)
+    tiles = SPRITE_COLUMNS * SPRITE_ROWS
+    sprite_fps = tiles / duration
+    poster_time = min(duration * 0.1, 30.0)
+    clip_seconds = min(CLIP_SECONDS, duration)
+
+    graph = (
+        "[0:v]split=3[p][s][c];"
+        f"[p]select='gte(t\\,{poster_time:.3f})',scale={POSTER_WIDTH}:-2[poster];"
+        f"[s]fps={sprite_fps:.6f},"
+        f"scale={SPRITE_TILE_WIDTH}:{SPRITE_TILE_HEIGHT}:force_original_aspect_ratio=decrease,"
+        f"pad={SPRITE_TILE_WIDTH}:{SPRITE_TILE_HEIGHT}:(ow-iw)/2:(oh-ih)/2,"
+        f"tile={SPRITE_COLUMNS}x{SPRITE_ROWS}[sprite];"
+        f"[c]trim=0:{clip_seconds:.3f},setpts=PTS-STARTPTS,scale=-2:{CLIP_HEIGHT}[clip]"
+    )
+    if has_audio:
+        graph += f";[0:a]atrim=0:{clip_seconds:.3f},asetpts=PTS-STARTPTS[clipa]"
+
+    cmd = [
+        'ffmpeg', '-y', '-nostdin', '-v', 'error',
+        '-i', source,
+        '-filter_complex', graph,
+        '-map', '[poster]', '-frames:v', '1', '-q:v', '4',
+        os.path.join(output_dir, PREVIEW_FILES["poster"][0]),
+        '-map', '[sprite]', '-frames:v', '1', '-q:v', '6',
+        os.path.join(output_dir, PREVIEW_FILES["sprite"][0]),
+        '-map', '[clip]',
+    ]
+    if has_audio:
+        cmd += ['-map', '[clipa]', '-c:a', 'aac', '-b:a', '64k']
+    cmd += [
+        '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '32',
+        '-pix_fmt', 'yuv420p', '-movflags', '+faststart',
+        os.path.join(output_dir, PREVIEW_FILES["clip"][0]),
+    ]
+    return cmd
+
+
+def generate_previews(source: str, output_dir: str, duration: float, has_audio: bool = True,
+                      timeout: int = 3600) -> Optional[Dict[str, Any]]:
+    """Render previews into output_dir; returns sprite layout metadata or None on failure"""
+    os.makedirs(output_dir, exist_ok=True)
+    cmd = build_preview_command(source, output_dir, duration, has_audio)
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    except Exception as e:
+        logging.error(f"Preview generation failed for {source}: {e}")
+        return None
+
+    if result.returncode != 0:
+        logging.error(f"Preview generation failed for {source}: {result.stderr.strip()[-500:]}")
+        return None
+
+    missing = [name for name, (filename, _) in PREVIEW_FILES.items()
+               if not os.path.exists(os.path.join(output_dir, filename))]
+    if missing:
+        logging.error(f"Preview generation for {source} did not produce: {missing}")
+        return None
+
+    return {
+        "sprite": {
+            "columns": SPRITE_COLUMNS,
+            "rows": SPRITE_ROWS,
+            "tile_width": SPRITE_TILE_WIDTH,
+            "tile_height": SPRITE_TILE_HEIGHT,
+            "interval_seconds": round(max(duration, 1.0) / (SPRITE_COLUMNS * SPRITE_ROWS), 3),
+        },
+        "clip_seconds": min(CLIP_SECONDS, duration),
+        "sizes": {
+            name: os.path.getsize(os.path.join(output_dir, filename))
+            for name, (filename, _) in PREVIEW_FILES.items()
+        },
+    }
@@ -0,0 +1,186 @@
+"""Recurring schedule rules, materialized into YouTube broadcasts only within a rolling horizon
+
+A rule is a small RRULE-like document: a frequency (daily, or weekly on
+chosen weekdays), wall-clock times in the rule's timezone and an optional
+date range. Broadcasts are created for occurrences inside the horizon (48h
+by default) a few at a time, and `materialized_until` records how far each
+rule has been expanded, so a rule running for months costs no API quota
+until its airtimes come close.
+"""
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from schedule_slots import MIN_LEAD_SECONDS, UnknownTimezone, local_airtime, parse_time_of_day, zone
+
+FREQUENCIES = ("daily", "weekly")
+DEFAULT_HORIZON_HOURS = 48
+# Broadcasts created per rule per pass, so one rule cannot starve the others
+MATERIALIZE_BATCH_SIZE = 10
+
+
+class RuleInactive(Exception):
+    """Raised by an occurrence creator when the rule can never produce broadcasts again"""
+
+
+class OccurrenceSkipped(Exception):
+    """Raised by an occurrence creator when this one occurrence cannot be scheduled (e.g. a conflict)"""
+
+
+def _aware(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def validate_rule(rule: Dict[str, Any]) -> List[str]:
+    """Problems that make a rule unusable; empty when it is valid"""
+    errors = []
+    if rule.get("freq") not in FREQUENCIES:
+        errors.append(f"freq must be one of {', '.join(FREQUENCIES)}")
+    if rule.get("freq") == "weekly" and not rule.get("weekdays"):
+        errors.append("weekly rules need at least one weekday (0 = Monday)")
+    if any(day not in range(7) for day in rule.get("weekdays") or []):
+        errors.append("weekdays must be between 0 (Monday) and 6 (Sunday)")
+    if not rule.get("times"):
+        errors.append("At least one time is required")
+    for value in rule.get("times") or []:
+        try:
+            parse_time_of_day(value)
+        except (ValueError, TypeError):
+            errors.append(f"Invalid time '{value}', expected HH:MM")
+    try:
+        zone(rule.get("timezone") or "")
+    except UnknownTimezone as e:
+        errors.append(str(e))
+    for key in ("start_date", "end_date"):
+        if rule.get(key):
+            try:
+                date.fromisoformat(rule[key])
+            except ValueError:
+                errors.append(f"Invalid {key} '{rule[key]}', expected YYYY-MM-DD")
+    if not errors and rule.get("end_date") and rule.get("start_date") and rule["end_date"] < rule["start_date"]:
+        errors.append("end_date is before start_date")
+    return errors
+
+
+def occurrences(rule: Dict[str, Any], after: datetime, until: datetime) -> List[datetime]:
+    """UTC airtimes of a rule in (after, until], in order
+
+    Times are wall-clock times in the rule's timezone, resolved like every
+    other slot (see schedule_slots.local_airtime).
+    """
+    tz = zone(rule["timezone"])
+    times = sorted(parse_time_of_day(value) for value in rule["times"])
+    weekdays = set(rule.get("weekdays") or range(7)) if rule["freq"] == "weekly" else set(range(7))
+
+    day = after.astimezone(tz).date()
+    last_day = until.astimezone(tz).date()
+    if rule.get("start_date"):
+        day = max(day, date.fromisoformat(rule["start_date"]))
+    if rule.get("end_date"):
+        last_day = min(last_day, date.fromisoformat(rule["end_date"]))
+
+    result = []
+    while day <= last_day:
+        if day.weekday() in weekdays:
+            for time_of_day in times:
+                airtime, _ = local_airtime(day, time_of_day, tz)
+                if after < airtime <= until:
+                    result.append(airtime)
+        day += timedelta(days=1)
+    return result
+
+
+def rule_finished(rule: Dict[str, Any], until: datetime) -> bool:
+    """True once the horizon has passed the rule's end date"""
+    if not rule.get("end_date"):
+        return False
+    return until.astimezone(zone(rule["timezone"])).date() > date.fromisoformat(rule["end_date"])
+
+
+class RuleMaterializer:
+    """Creates the broadcasts of active rules that fall inside the horizon
+
+    `create_occurrence(rule, airtime)` creates one broadcast; the resulting
+    scheduled_broadcasts document must carry `rule_id` and `scheduled_time`
+    (airtime.isoformat()) so a pass interrupted halfway is not repeated.
+    """
+
+    def __init__(self, db, create_occurrence: Callable[[Dict[str, Any], datetime], Awaitable[Any]],
+                 horizon_hours: float = DEFAULT_HORIZON_HOURS, batch_size: int = MATERIALIZE_BATCH_SIZE):
+        self.db = db
+        self.create_occurrence = create_occurrence
+        self.horizon = timedelta(hours=horizon_hours)
+        self.batch_size = batch_size
+
+    async def ensure_indexes(self):
+        await self.db.schedule_rules.create_index("id", unique=True)
+        await self.db.schedule_rules.create_index([("active", 1), ("materialized_until", 1)])
+        await self.db.scheduled_broadcasts.create_index([("rule_id", 1), ("scheduled_time", 1)])
+
+    async def materialize_due(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """One pass over every active rule whose horizon has not been filled yet"""
+        now = now or datetime.now(timezone.utc)
+        horizon_end = now + self.horizon
+        rules = await self.db.schedule_rules.find(
+            {"active": True, "$or": [
+                {"materialized_until": {"$lt": horizon_end}},
+                {"materialized_until": None},
+            ]},
+            {"_id": 0}
+        ).to_list(None)
+
+        stats = {"rules": len(rules), "created": 0, "errors": 0}
+        for rule in rules:
+            created, failed = await self.materialize_rule(rule, now)
+            stats["created"] += created
+            stats["errors"] += failed
+        return stats
+
+    async def materialize_rule(self, rule: Dict[str, Any], now: datetime) -> tuple[int, int]:
+        """Create up to `batch_size` pending broadcasts of one rule; returns (created, failed)"""
+        horizon_end = now + self.horizon
+        # Occurrences that are already too close to create are skipped, not created late
+        cursor = max(_aware(rule.get("materialized_until")) or now, now + timedelta(seconds=MIN_LEAD_SECONDS))
+        pending = occurrences(rule, cursor, horizon_end)
+        batch = pending[:self.batch_size]
+        reached = horizon_end if len(pending) <= self.batch_size else batch[-1]
+
+        created = 0
+        for airtime in batch:
+            existing = await self.db.scheduled_broadcasts.find_one(
+                {"rule_id": rule["id"], "scheduled_time": airtime.isoformat()}, {"_id": 1}
+            )
+            if existing:
+                cursor = airtime
+                continue
+            try:
+                await self.create_occurrence(rule, airtime)
+            except OccurrenceSkipped as e:
+                logging.warning(f"Schedule rule {rule['id']} skipped {airtime}: {e}")
+                cursor = airtime
+                continue
+            except RuleInactive as e:
+                logging.warning(f"Deactivating schedule rule {rule['id']}: {e}")
+                await self.db.schedule_rules.update_one(
+                    {"id": rule["id"]},
+                    {"$set": {"active": False, "inactive_reason": str(e), "materialized_until": cursor}}
+                )
+                return created, 1
+            except Exception as e:
+                # Retried on the next pass from this occurrence on
+                logging.error(f"Schedule rule {rule['id']} failed at {airtime}: {e}")
+                await self.db.schedule_rules.update_one(
+                    {"id": rule["id"]},
+                    {"$set": {"last_error": str(e), "materialized_until": cursor}}
+                )
+                return created, 1
+            created += 1
+            cursor = airtime
+
+        update = {"materialized_until": reached, "last_error": None, "last_materialized_at": now.isoformat()}
+        if rule_finished(rule, reached):
+            update.update({"active": False, "inactive_reason": "Rule ended"})
+        await self.db.schedule_rules.update_one({"id": rule["id"]}, {"$set": update})
+        return created, 0
@@ -0,0 +1,150 @@
+"""Sorted interval index over scheduled airtime windows for conflict and capacity checks
+
+Each broadcast occupies [scheduled_time, scheduled_time + duration) and is
+indexed twice: under its (channel, source) key, where two windows must not
+overlap, and in the encoder pool shared by all stream workers, where the
+number of overlapping windows must stay within the pool's capacity. Lookups
+bisect sorted start/end lists, so a check costs O(log n) plus the windows it
+actually hits instead of a scan over every scheduled broadcast.
+"""
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Airtime window assumed when a broadcast's duration is unknown
+DEFAULT_WINDOW_SECONDS = 3600
+# Stream statuses that no longer hold an encoder
+FINISHED_STREAM_STATUSES = ("completed", "failed")
+
+
+def broadcast_window(broadcast: Dict[str, Any]) -> Tuple[datetime, datetime]:
+    start = datetime.fromisoformat(broadcast["scheduled_time"])
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    return start, start + timedelta(seconds=broadcast.get("duration_seconds") or DEFAULT_WINDOW_SECONDS)
+
+
+class IntervalIndex:
+    """Windows sorted by start, with a sorted list of ends for counting concurrency"""
+
+    def __init__(self):
+        self.windows: List[Tuple[datetime, datetime, str]] = []
+        self.starts: List[datetime] = []
+        self.ends: List[datetime] = []
+        # Sorted too, so the longest window is known again once it is removed
+        self.durations: List[timedelta] = []
+        self.by_id: Dict[str, Tuple[datetime, datetime]] = {}
+
+    def __len__(self):
+        return len(self.windows)
+
+    def add(self, start: datetime, end: datetime, item_id: str):
+        position = bisect_right(self.starts, start)
+        self.starts.insert(position, start)
+        self.windows.insert(position, (start, end, item_id))
+        insort(self.ends, end)
+        insort(self.durations, end - start)
+        self.by_id[item_id] = (start, end)
+
+    def remove(self, item_id: str) -> bool:
+        window = self.by_id.pop(item_id, None)
+        if window is None:
+            return False
+        start, end = window
+        # Only windows with the same start sit between here and the one to remove
+        position = bisect_left(self.starts, start)
+        while self.windows[position][2] != item_id:
+            position += 1
+        del self.windows[position]
+        del self.starts[position]
+        del self.ends[bisect_left(self.ends, end)]
+        del self.durations[bisect_left(self.durations, end - start)]
+        return True
+
+    @property
+    def longest(self) -> timedelta:
+        return self.durations[-1] if self.durations else timedelta(0)
+
+    def overlapping(self, start: datetime, end: datetime) -> List[str]:
+        """IDs of windows intersecting [start, end)"""
+        # Nothing starting earlier than `start - longest` can still be running at `start`
+        low = bisect_left(self.starts, start - self.longest)
+        high = bisect_left(self.starts, end)
+        return [item_id for _, window_end, item_id in self.windows[low:high] if window_end > start]
+
+    def active_at(self, moment: datetime) -> int:
+        return bisect_right(self.starts, moment) - bisect_right(self.ends, moment)
+
+    def peak(self, start: datetime, end: datetime) -> int:
+        """Most windows running at the same time within [start, end)"""
+        # Concurrency only rises at a window start, so those are the only points to check
+        low = bisect_right(self.starts, start)
+        high = bisect_left(self.starts, end)
+        return max([self.active_at(start)] + [self.active_at(moment) for moment in self.starts[low:high]])
+
+
+class ScheduleIndex:
+    """All upcoming broadcasts of the deployment, indexed by (channel, source) and in one encoder pool
+
+    `version` is the value of the shared change counter the index was built
+    from; a process rebuilds when another one has changed the schedule since.
+    """
+
+    def __init__(self):
+        self.version: Optional[int] = None
+        self.sources: Dict[Tuple[str, str], IntervalIndex] = {}
+        self.pool = IntervalIndex()
+        self.keys: Dict[str, Tuple[str, str]] = {}
+
+    def rebuild(self, broadcasts: Iterable[Dict[str, Any]], version: Optional[int]):
+        self.sources = {}
+        self.pool = IntervalIndex()
+        self.keys = {}
+        for broadcast in broadcasts:
+            self.add(broadcast)
+        self.version = version
+
+    def add(self, broadcast: Dict[str, Any]):
+        if broadcast.get("stream_status") in FINISHED_STREAM_STATUSES or broadcast["id"] in self.keys:
+            return
+        start, end = broadcast_window(broadcast)
+        key = (broadcast["user_id"], broadcast["video_id"])
+        self.sources.setdefault(key, IntervalIndex()).add(start, end, broadcast["id"])
+        self.pool.add(start, end, broadcast["id"])
+        self.keys[broadcast["id"]] = key
+
+    def remove(self, broadcast_id: str):
+        key = self.keys.pop(broadcast_id, None)
+        if key:
+            self.sources[key].remove(broadcast_id)
+            self.pool.remove(broadcast_id)
+
+    def conflicts(self, channel: str, source_id: str, start: datetime, end: datetime) -> List[str]:
+        """Broadcasts already airing this source on this channel during [start, end)"""
+        index = self.sources.get((channel, source_id))
+        return index.overlapping(start, end) if index else []
+
+    def free_slots(self, start: datetime, end: datetime, capacity: int) -> int:
+        return max(0, capacity - self.pool.peak(start, end))
+
+    def check(self, channel: str, source_id: str, start: datetime, end: datetime, capacity: int) -> Optional[str]:
+        """Why a new window cannot be scheduled, or None if it fits"""
+        if self.conflicts(channel, source_id, start, end):
+            return "This video is already scheduled on the channel at an overlapping time"
+        if not self.free_slots(start, end, capacity):
+            return f"All {capacity} encoder slots are taken at this time"
+        return None
+
+    def capacity_windows(self, start: datetime, end: datetime, step: timedelta, capacity: int) -> List[Dict[str, Any]]:
+        windows = []
+        while start < end:
+            window_end = min(start + step, end)
+            peak = self.pool.peak(start, window_end)
+            windows.append({
+                "start": start.isoformat(),
+                "end": window_end.isoformat(),
+                "scheduled": peak,
+                "free": max(0, capacity - peak),
+            })
+            start = window_end
+        return windows
@@ -0,0 +1,111 @@
+"""Turn dates, wall-clock times and a user timezone into UTC airtimes in one pass
+
+Every scheduling path (single-date forms, bulk requests, recurring rules and
+the validation endpoints) resolves local times through `local_airtime`, so
+they agree on DST: a time skipped by a spring-forward change airs an hour
+later, and a time repeated by a fall-back change airs at its first instance.
+Zones are loaded once per process and shared.
+"""
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+DEFAULT_TIMEZONE = "Asia/Kolkata"
+# YouTube rejects start times closer than this
+MIN_LEAD_SECONDS = 180
+MAX_AHEAD_DAYS = 180
+
+
+class UnknownTimezone(ValueError):
+    pass
+
+
+@lru_cache(maxsize=None)
+def zone(name: str) -> ZoneInfo:
+    """The ZoneInfo for an IANA name, loaded once; raises UnknownTimezone"""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError, TypeError):
+        raise UnknownTimezone(f"Unknown timezone '{name}'")
+
+
+def parse_time_of_day(value: str) -> time:
+    hour, minute = map(int, value.split(':'))
+    return time(hour, minute)
+
+
+def resolve_date(value: str, tz: ZoneInfo) -> date:
+    """A YYYY-MM-DD date, or the local date in `tz` of an ISO instant (what date pickers send as toISOString)"""
+    if len(value) == 10:
+        return date.fromisoformat(value)
+    instant = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if instant.tzinfo is None:
+        instant = instant.replace(tzinfo=timezone.utc)
+    return instant.astimezone(tz).date()
+
+
+def local_airtime(day: date, time_of_day: time, tz: ZoneInfo) -> Tuple[datetime, Optional[str]]:
+    """UTC airtime of a wall-clock time, and "skipped" or "repeated" when a DST change affects it"""
+    local = datetime.combine(day, time_of_day, tzinfo=tz)
+    airtime = local.astimezone(timezone.utc)
+    dst = None
+    if airtime.astimezone(tz).replace(tzinfo=None) != local.replace(tzinfo=None):
+        # In a spring-forward gap; fold=0 applies the offset before the change, i.e. an hour later
+        dst = "skipped"
+    elif local.utcoffset() != local.replace(fold=1).utcoffset():
+        dst = "repeated"
+    return airtime, dst
+
+
+def lead_error(airtime: datetime, now: datetime) -> Optional[str]:
+    """Why YouTube would refuse this start time, or None"""
+    lead = (airtime - now).total_seconds()
+    if lead < MIN_LEAD_SECONDS:
+        return "Must be at least 3 minutes in the future"
+    if lead > MAX_AHEAD_DAYS * 86400:
+        return "Cannot schedule more than 6 months in advance"
+    return None
+
+
+def compute_slots(start_date: date, end_date: date, times: List[str], tz_name: str, now: datetime,
+                  roll_past: bool = False) -> List[Dict[str, Any]]:
+    """One slot per (date, time) in [start_date, end_date], in order, with its UTC airtime or an error
+
+    With `roll_past` (single-date forms only), a time already past today
+    moves to the next day instead of failing. Slots are not checked against
+    the lead time limits; see lead_error.
+    """
+    tz = zone(tz_name)
+    parsed = []
+    for time_str in times:
+        try:
+            parsed.append((time_str, parse_time_of_day(time_str), None))
+        except (ValueError, TypeError, AttributeError):
+            parsed.append((time_str, None, f"Invalid time '{time_str}', expected HH:MM"))
+    local_now = now.astimezone(tz).replace(tzinfo=None)
+
+    slots = []
+    day = start_date
+    while day <= end_date:
+        for time_str, time_of_day, error in parsed:
+            slot = {
+                "index": len(slots),
+                "date": day.isoformat(),
+                "time": time_str,
+                "airtime": None,
+                "local_time": None,
+                "rolled_over": False,
+                "dst": None,
+                "error": error,
+            }
+            if time_of_day is not None:
+                slot_day = day
+                if roll_past and datetime.combine(day, time_of_day) <= local_now:
+                    slot_day = day + timedelta(days=1)
+                    slot["rolled_over"] = True
+                slot["airtime"], slot["dst"] = local_airtime(slot_day, time_of_day, tz)
+                slot["local_time"] = slot["airtime"].astimezone(tz).isoformat()
+            slots.append(slot)
+        day += timedelta(days=1)
+    return slots
@@ -1,38 +1,206 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, BackgroundTasks, status, UploadFile, File
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, BackgroundTasks, Query, status, UploadFile, File, Request
+from fastapi.responses import HTMLResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, monitoring
+from pymongo.errors import DuplicateKeyError
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Literal, Optional
 import uuid
 from datetime import datetime, timedelta, timezone
 import asyncio
+import functools
 import json
 import secrets
-import subprocess
-import threading
+import shutil
+import socket
 import time
-import yt_dlp
-from urllib.parse import urlencode
+from urllib.parse import urlencode, quote
 
-# Google API imports
-from googleapiclient.discovery import build
+from broadcast_sync import BroadcastReconciler
+from broadcast_transitions import TRANSITION_MODES, TransitionController
+from bulk_schedule import expand_slots, validate_slots
+from bulk_writes import WriteBatch, WriteBehindBuffer
+from events import EventBus
+from encoder_profiles import (
+    DEFAULT_ENCODER_PROFILES,
+    DEFAULT_PROFILE_NAME,
+    STILL_PROFILE_NAME,
+    analyze_source,
+    can_passthrough,
+    is_mp4_container,
+    select_profile_name,
+)
+from file_responses import RangeFileResponse
+from format_selection import StreamUrlCache, select_stream_format
+import media_tokens
+from lazy_imports import lazy_module, preload as preload_lazy_modules
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, RequestMetricsMiddleware, registry as metrics_registry
+from previews import PREVIEW_FILES, generate_previews, preview_dir
+from recurrence import DEFAULT_HORIZON_HOURS, OccurrenceSkipped, RuleInactive, RuleMaterializer, validate_rule
+from schedule_index import FINISHED_STREAM_STATUSES, ScheduleIndex, broadcast_window
+from schedule_slots import DEFAULT_TIMEZONE, compute_slots, lead_error, resolve_date, zone
+from slates import SlateLibrary
+from storage import GB, QuotaExceeded, StorageManager
+from stream_jobs import (
+    StreamWorker,
+    acquire_lease,
+    cancel_jobs,
+    default_capacity,
+    default_worker_id as stream_worker_id,
+    enqueue_job,
+    ensure_indexes as ensure_stream_job_indexes,
+    find_stream_owner,
+    live_workers,
+    request_stop,
+)
+from youtube_quota import DEFAULT_DAILY_QUOTA, QuotaBudget, QuotaError, error_reason, method_cost
+from stream_pipeline import (
+    Preroll,
+    StreamSource,
+    mp4_is_faststart,
+    remux_faststart,
+    start_pipeline,
+    supervisor,
+    youtube_rtmp_url,
+)
+
+# Google API imports; the heavy ones load on first use or in preload_dependencies
 from googleapiclient.errors import HttpError
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import Flow
-import google.auth.transport.requests
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+
+yt_dlp = lazy_module("yt_dlp")
+google_discovery = lazy_module("googleapiclient.discovery")
+google_discovery_cache = lazy_module("googleapiclient.discovery_cache")
+google_http = lazy_module("googleapiclient.http")
+google_credentials = lazy_module("google.oauth2.credentials")
+google_auth_requests = lazy_module("google.auth.transport.requests")
+oauth_flow = lazy_module("google_auth_oauthlib.flow")
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Prometheus metrics, served at GET /metrics
+HTTP_REQUEST_SECONDS = metrics_registry.histogram(
+    "http_request_duration_seconds", "Time to response start by route template", ["method", "route", "status"]
+)
+YOUTUBE_API_SECONDS = metrics_registry.histogram(
+    "youtube_api_request_duration_seconds", "YouTube Data API calls by API method", ["method"]
+)
+YOUTUBE_API_ERRORS = metrics_registry.counter(
+    "youtube_api_errors_total", "Failed YouTube Data API calls by API method and HTTP status", ["method", "status"]
+)
+MONGODB_COMMAND_SECONDS = metrics_registry.histogram(
+    "mongodb_command_duration_seconds", "MongoDB commands by command name", ["command"]
+)
+MONGODB_COMMAND_FAILURES = metrics_registry.counter(
+    "mongodb_command_failures_total", "Failed MongoDB commands by command name", ["command"]
+)
+UPLOAD_BYTES = metrics_registry.counter("upload_bytes_total", "Bytes of uploaded videos written to disk")
+STREAM_ON_AIR_OFFSET = metrics_registry.histogram(
+    "stream_on_air_offset_seconds",
+    "When the broadcast's content (after any pre-roll slate) reached the encoder output, relative to scheduled_time",
+    ["method"],
+    buckets=(-5, -2, -1, -0.5, -0.25, 0, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 300)
+)
+BROADCAST_TRANSITION_SECONDS = metrics_registry.histogram(
+    "broadcast_transition_seconds",
+    "Managed go-live stages: encoder start to stream active / testing / live (total), and the live transition itself",
+    ["stage"],
+    buckets=(0.5, 1, 2, 3, 5, 7.5, 10, 15, 20, 30, 45, 60, 120, 180)
+)
+BROADCAST_TRANSITION_FAILURES = metrics_registry.counter(
+    "broadcast_transition_failures_total", "Managed transitions that failed, by target state", ["target"]
+)
+STREAM_STALLS = metrics_registry.counter(
+    "stream_stalls_total", "Streams whose output stopped advancing mid-stream and were replaced by the slate", ["method"]
+)
+SLATE_PLAYOUTS = metrics_registry.counter(
+    "slate_playouts_total", "Slate streams started, by reason (fallback, stall, bridge)", ["reason"]
+)
+STREAM_START_LATENESS = metrics_registry.histogram(
+    "stream_start_lateness_seconds",
+    "Encoder start relative to the broadcast's scheduled_time (negative when early), first start only",
+    ["method"],
+    buckets=(-60, -30, -10, -5, -1, 0, 1, 2, 5, 10, 30, 60, 120, 300, 900)
+)
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Records MongoDB command latency; pymongo calls it from its own threads"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGODB_COMMAND_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name)
+
+    def failed(self, event):
+        MONGODB_COMMAND_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name)
+        MONGODB_COMMAND_FAILURES.inc(command=event.command_name)
+
+@functools.lru_cache(maxsize=None)
+def instrumented_request_class():
+    """InstrumentedHttpRequest, defined on first use so googleapiclient.http is not imported at startup"""
+
+    class InstrumentedHttpRequest(google_http.HttpRequest):
+        """googleapiclient request that goes through the quota budget and records latency and errors per API method
+
+        `user_id` attributes the quota cost in the ledger.
+        """
+
+        def __init__(self, *args, user_id: Optional[str] = None, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.user_id = user_id
+
+        def execute(self, http=None, num_retries=0):
+            method = self.methodId or "unknown"
+
+            def attempt():
+                started = time.perf_counter()
+                try:
+                    # Retries are made by the quota budget, which also accounts for them
+                    return super(InstrumentedHttpRequest, self).execute(http=http, num_retries=0)
+                except HttpError as e:
+                    YOUTUBE_API_ERRORS.inc(method=method, status=e.resp.status)
+                    raise
+                except Exception:
+                    YOUTUBE_API_ERRORS.inc(method=method, status="transport")
+                    raise
+                finally:
+                    YOUTUBE_API_SECONDS.observe(time.perf_counter() - started, method=method)
+
+            return youtube_quota.call(method, self.user_id, attempt)
+
+    return InstrumentedHttpRequest
+
+@functools.lru_cache(maxsize=None)
+def youtube_discovery_document() -> Dict[str, Any]:
+    """The YouTube Data API v3 discovery document bundled with googleapiclient, parsed once per process"""
+    document = json.loads(google_discovery_cache.get_static_doc('youtube', 'v3'))
+    # build_from_document fills in method parameters in place; do it once, before threads share the document
+    service = google_discovery.build_from_document(document, http=google_http.build_http())
+    for resource in document.get('resources', {}):
+        getattr(service, resource)()
+    return document
+
+# Daily units and rate budget of the Google Cloud project behind GOOGLE_CLIENT_ID, shared by all processes
+YOUTUBE_DAILY_QUOTA = int(os.environ.get('YOUTUBE_DAILY_QUOTA', DEFAULT_DAILY_QUOTA))
+YOUTUBE_QUOTA_RATE = float(os.environ.get('YOUTUBE_QUOTA_RATE', '25'))
+YOUTUBE_QUOTA_BURST = float(os.environ.get('YOUTUBE_QUOTA_BURST', '500'))
+QUOTA_FLUSH_INTERVAL = 10
+# Write-behind buffer for stream records and encoder metric events
+WRITE_BEHIND_INTERVAL_SECONDS = float(os.environ.get('WRITE_BEHIND_INTERVAL_SECONDS', '1'))
+WRITE_BEHIND_MAX_PENDING = 500
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandMetrics()])
 db = client[os.environ['DB_NAME']]
 
 # Google OAuth Configuration
@@ -44,6 +212,15 @@ SCOPES = [
     'https://www.googleapis.com/auth/youtube'
 ]
 
+youtube_quota = QuotaBudget(
+    os.environ.get('YOUTUBE_QUOTA_PROJECT') or GOOGLE_CLIENT_ID.split('-')[0],
+    daily_quota=YOUTUBE_DAILY_QUOTA,
+    rate=YOUTUBE_QUOTA_RATE,
+    burst=YOUTUBE_QUOTA_BURST
+)
+metrics_registry.callback("youtube_quota_remaining_units", "Estimated YouTube API units left today", "gauge",
+                          youtube_quota.remaining)
+
 # Create the main app without a prefix
 app = FastAPI(title="YouTube Live Streaming Scheduler")
 
@@ -51,6 +228,79 @@ app = FastAPI(title="YouTube Live Streaming Scheduler")
 api_router = APIRouter(prefix="/api")
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+# Signs the tickets in preview/file and event stream URLs. When unset, a random secret is
+# generated once and shared by every process through MongoDB (see load_media_url_secret)
+MEDIA_URL_SECRET: Optional[str] = os.environ.get('MEDIA_URL_SECRET')
+MEDIA_URL_TTL_SECONDS = int(os.environ.get('MEDIA_URL_TTL_SECONDS', '3600'))
+# Event stream tickets only need to outlive the connect; the dashboard fetches a new one to reconnect
+EVENTS_TICKET_TTL_SECONDS = 60
+# Encoder profiles are shared by every user, so only these YouTube channels may edit them
+ADMIN_CHANNEL_IDS = {c.strip() for c in os.environ.get('ADMIN_CHANNEL_IDS', '').split(',') if c.strip()}
+
+UPLOAD_DIR = os.environ.get('UPLOAD_DIR', '/app/uploads')
+MAX_UPLOAD_BYTES = 2 * GB
+# Alternative YouTube Data API root (e.g. the fake API in benchmarks/fake_youtube.py)
+YOUTUBE_API_ENDPOINT = os.environ.get('YOUTUBE_API_ENDPOINT')
+# When set (e.g. "/protected-uploads/"), file bytes are handed to nginx via X-Accel-Redirect
+UPLOADS_ACCEL_PREFIX = os.environ.get('UPLOADS_ACCEL_PREFIX')
+# "embedded" lets the API process claim scheduled stream jobs; "off" leaves them to worker.py processes
+STREAM_WORKER_MODE = os.environ.get('STREAM_WORKER_MODE', 'embedded')
+
+# Encoders start this early with a pre-roll slate and switch to the content at airtime; 0 starts them at airtime.
+# Must stay below the stream job lookahead (60s) and DIRECT_URL_PREFETCH_SECONDS.
+WARM_LAUNCH_LEAD_SECONDS = float(os.environ.get('WARM_LAUNCH_LEAD_SECONDS', '15'))
+# Still image shown during the pre-roll; a plain dark frame when unset
+WARM_LAUNCH_SLATE = os.environ.get('WARM_LAUNCH_SLATE')
+# Shorter gaps are not worth a slate and are waited out instead
+MIN_PREROLL_SECONDS = 1
+# "auto" lets YouTube start and stop broadcasts on ingest; "managed" transitions them from the encoder.
+# Applies to broadcasts created while it is set.
+YOUTUBE_TRANSITION_MODE = os.environ.get('YOUTUBE_TRANSITION_MODE', 'auto')
+if YOUTUBE_TRANSITION_MODE not in TRANSITION_MODES:
+    raise ValueError(f"YOUTUBE_TRANSITION_MODE must be one of {', '.join(TRANSITION_MODES)}")
+
+# Downloaded YouTube sources, shared across broadcasts of the same video
+SOURCE_CACHE_DIR = os.environ.get('SOURCE_CACHE_DIR', os.path.join(UPLOAD_DIR, 'source-cache'))
+STORAGE_MAINTENANCE_INTERVAL = 900
+# Heavy imports (see lazy_imports.py) are loaded this long after startup, off the event loop
+PRELOAD_DELAY_SECONDS = 0.5
+# How often the lease holder looks for broadcasts due a YouTube status sync
+BROADCAST_SYNC_INTERVAL = 15
+# Limits for POST /api/schedule/bulk; each slot costs three YouTube API calls
+BULK_SCHEDULE_MAX_SLOTS = 500
+BULK_SCHEDULE_MAX_CONCURRENCY = 8
+SCHEDULE_CAPACITY_MAX_WINDOWS = 2000
+
+# IST times operators schedule every day
+DEFAULT_SCHEDULE_TIMES = ["05:55", "06:55", "07:55", "16:55", "17:55"]
+# Recurring schedule rules only get YouTube broadcasts this far ahead
+RECURRING_HORIZON_HOURS = float(os.environ.get('RECURRING_HORIZON_HOURS', DEFAULT_HORIZON_HOURS))
+RECURRING_MATERIALIZE_INTERVAL = 300
+
+# Quotas in GB; 0 disables a limit
+storage = StorageManager(
+    db,
+    UPLOAD_DIR,
+    SOURCE_CACHE_DIR,
+    user_quota_bytes=int(float(os.environ.get('UPLOAD_QUOTA_PER_USER_GB', '20')) * GB),
+    total_quota_bytes=int(float(os.environ.get('UPLOAD_QUOTA_TOTAL_GB', '0')) * GB),
+    cache_max_bytes=int(float(os.environ.get('SOURCE_CACHE_MAX_GB', '10')) * GB),
+    min_free_bytes=int(float(os.environ.get('MIN_FREE_DISK_GB', '2')) * GB)
+)
+
+# Pre-rendered slates, looped in copy mode: the fallback when no source could be fetched
+# and the filler while a stalled source is relaunched
+SLATE_DIR = os.environ.get('SLATE_DIR', os.path.join(UPLOAD_DIR, 'slates'))
+SLATE_BRAND = os.environ.get('SLATE_BRAND', 'Scheduled Stream')
+# Also render slates per broadcast that show its video title
+SLATE_PER_VIDEO = os.environ.get('SLATE_PER_VIDEO', 'true').lower() in ('1', 'true', 'yes')
+slates = SlateLibrary(SLATE_DIR, SLATE_BRAND, WARM_LAUNCH_SLATE)
+# A source whose output has not advanced for this long is taken off air and replaced by the slate
+STALL_TIMEOUT_SECONDS = float(os.environ.get('STALL_TIMEOUT_SECONDS', '20'))
+STALL_RELAUNCH_DELAY_SECONDS = 10
+MAX_STALL_RELAUNCHES = 3
 
 # Pydantic Models
 class User(BaseModel):
@@ -89,17 +339,88 @@ class ScheduleRequest(BaseModel):
     video_title: str
     selected_date: str
     custom_times: Optional[List[str]] = None
-    timezone: Optional[str] = "UTC"  # User's timezone
+    timezone: Optional[str] = DEFAULT_TIMEZONE  # User's timezone; selected_date and times are local to it
+    encoder_profile: Optional[str] = None  # Profile name, or None/"auto" to pick from source analysis
+
+class ScheduleRuleRequest(BaseModel):
+    source: str = "uploaded_file"  # uploaded_file (video_id is the file id), youtube_video
+    video_id: str
+    video_title: Optional[str] = None
+    freq: str = "daily"  # daily, weekly
+    weekdays: Optional[List[int]] = None  # 0 = Monday, weekly rules only
+    times: List[str] = Field(default_factory=lambda: list(DEFAULT_SCHEDULE_TIMES))
+    timezone: str = DEFAULT_TIMEZONE
+    start_date: Optional[str] = None  # YYYY-MM-DD in the rule's timezone
+    end_date: Optional[str] = None
+    encoder_profile: Optional[str] = None
+    image_id: Optional[str] = None  # uploaded image to show over an uploaded_file source (still-image broadcast)
+
+class BulkScheduleEntry(BaseModel):
+    source: str = "youtube_video"  # youtube_video, uploaded_file (video_id is the file id)
+    video_id: str
+    video_title: Optional[str] = None
+    dates: List[str]  # YYYY-MM-DD in the request's timezone
+    times: Optional[List[str]] = None  # defaults to DEFAULT_SCHEDULE_TIMES
+    encoder_profile: Optional[str] = None
+    duration_seconds: Optional[float] = None  # airtime window for overlap checks; known for uploads
+    image_id: Optional[str] = None  # uploaded image to show over an uploaded_file source (still-image broadcast)
+
+class BulkScheduleRequest(BaseModel):
+    entries: List[BulkScheduleEntry]
+    timezone: str = DEFAULT_TIMEZONE
+    dry_run: bool = False
+    concurrency: int = 4
+
+class SchedulePreviewRequest(BaseModel):
+    start_date: str  # YYYY-MM-DD, or an ISO instant whose local date is meant (as selected_date)
+    end_date: Optional[str] = None  # defaults to start_date
+    times: Optional[List[str]] = None  # defaults to DEFAULT_SCHEDULE_TIMES
+    timezone: str = DEFAULT_TIMEZONE
+    roll_past: bool = True  # single-date only: times already past move to the next day
+    source: Optional[str] = None  # youtube_video, uploaded_file; with video_id, checks conflicts
+    video_id: Optional[str] = None
+    duration_seconds: Optional[float] = None
+
+BITRATE_PATTERN = r'^\d+k$'  # FFmpeg kbit/s, e.g. "2500k"; ladder_rung consumers parse this form
+
+class LadderRung(BaseModel):
+    max_height: int = Field(gt=0)
+    video_bitrate: str = Field(pattern=BITRATE_PATTERN)
+    maxrate: str = Field(pattern=BITRATE_PATTERN)
+
+class EncoderProfileUpdate(BaseModel):
+    description: Optional[str] = None
+    mode: Optional[Literal["encode", "copy"]] = None
+    preset: Optional[str] = None
+    tune: Optional[str] = None
+    max_height: Optional[int] = Field(default=None, gt=0)
+    max_fps: Optional[int] = Field(default=None, gt=0)
+    gop_seconds: Optional[float] = Field(default=None, gt=0)
+    audio_bitrate: Optional[str] = Field(default=None, pattern=BITRATE_PATTERN)
+    ladder: Optional[List[LadderRung]] = Field(default=None, min_length=1)
 
 class AuthCallbackRequest(BaseModel):
     code: str
 
 # Helper Functions
-def get_youtube_service(credentials: Credentials):
-    return build('youtube', 'v3', credentials=credentials)
+def get_youtube_service(credentials: "Credentials", user_id: Optional[str] = None):
+    """YouTube client whose calls are budgeted and charged to `user_id` in the quota ledger
 
-def get_credentials_from_token(access_token: str, refresh_token: str) -> Credentials:
-    creds = Credentials(
+    Built from the cached discovery document; build() would read and parse it
+    again for every client.
+    """
+    request_builder = functools.partial(instrumented_request_class(), user_id=user_id)
+    if YOUTUBE_API_ENDPOINT:
+        return google_discovery.build_from_document(
+            youtube_discovery_document(), credentials=credentials, requestBuilder=request_builder,
+            client_options={'api_endpoint': YOUTUBE_API_ENDPOINT}
+        )
+    return google_discovery.build_from_document(
+        youtube_discovery_document(), credentials=credentials, requestBuilder=request_builder
+    )
+
+def get_credentials_from_token(access_token: str, refresh_token: str) -> "Credentials":
+    creds = google_credentials.Credentials(
         token=access_token,
         refresh_token=refresh_token,
         token_uri='https://oauth2.googleapis.com/token',
@@ -109,251 +430,649 @@ def get_credentials_from_token(access_token: str, refresh_token: str) -> Credent
     )
     return creds
 
+async def get_encoder_profile(name: Optional[str]) -> Dict[str, Any]:
+    """Load a named encoder profile from MongoDB, falling back to the built-in defaults"""
+    name = name or DEFAULT_PROFILE_NAME
+    profile = await db.encoder_profiles.find_one({"name": name}, {"_id": 0})
+    if profile:
+        return profile
+    if name in DEFAULT_ENCODER_PROFILES:
+        return DEFAULT_ENCODER_PROFILES[name]
+    logging.warning(f"Unknown encoder profile '{name}', using {DEFAULT_PROFILE_NAME}")
+    return await get_encoder_profile(DEFAULT_PROFILE_NAME)
+
+async def resolve_encoder_profile(name: Optional[str], source: Optional[str],
+                                  analysis: Optional[Dict[str, Any]] = None) -> tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """Return (profile, source analysis); a missing or "auto" name selects from ffprobe analysis
+
+    Pass `analysis` when it is already known (e.g. the upload metadata index) to skip probing.
+    """
+    if analysis is None and source:
+        analysis = await asyncio.to_thread(analyze_source, source)
+    if not name or name == "auto":
+        name = select_profile_name(analysis)
+        logging.info(f"Auto-selected encoder profile '{name}' for {source}")
+        logging.debug(f"Source analysis for {source}: {analysis}")
+    return await get_encoder_profile(name), analysis
+
+stream_url_cache = StreamUrlCache()
+# yt-dlp's duration per resolved video; tells a complete streamed copy from a truncated read
+source_durations: Dict[str, float] = {}
+
+def encoder_usage(field: int) -> Dict[tuple, float]:
+    """One /proc reading per running encoder: field 0 is CPU seconds, 1 resident bytes"""
+    usage = {}
+    for handle in supervisor.active():
+        reading = handle.resource_usage()
+        if reading:
+            usage[(handle.key,)] = reading[field]
+    return usage
+
+# Read at scrape time, so they cost nothing between scrapes
+metrics_registry.callback("active_encoders", "FFmpeg processes running in this process", "gauge",
+                          lambda: len(supervisor.active()))
+metrics_registry.callback("encoder_cpu_seconds_total", "CPU time of each running FFmpeg process", "counter",
+                          lambda: encoder_usage(0), ["stream"])
+metrics_registry.callback("encoder_resident_bytes", "Resident memory of each running FFmpeg process", "gauge",
+                          lambda: encoder_usage(1), ["stream"])
+metrics_registry.callback("cache_lookups_total", "Stream URL and downloaded-source cache lookups", "counter",
+                          lambda: {
+                              ("stream_url", "hit"): stream_url_cache.hits,
+                              ("stream_url", "miss"): stream_url_cache.misses,
+                              ("source", "hit"): storage.cache_hits,
+                              ("source", "miss"): storage.cache_misses,
+                          }, ["cache", "result"])
+
+# Upcoming airtime windows for conflict and encoder capacity checks, rebuilt when another process changes the schedule
+schedule_index = ScheduleIndex()
+
+async def load_schedule_index() -> ScheduleIndex:
+    """The schedule index, rebuilt from MongoDB if the shared change counter moved"""
+    counter = await db.counters.find_one({"_id": "schedule_index"})
+    version = counter["version"] if counter else 0
+    if version != schedule_index.version:
+        since = (datetime.now(timezone.utc) - timedelta(days=1)).isoformat()
+        broadcasts = await db.scheduled_broadcasts.find(
+            {"scheduled_time": {"$gte": since}, "stream_status": {"$nin": list(FINISHED_STREAM_STATUSES)}},
+            {"_id": 0, "id": 1, "user_id": 1, "video_id": 1, "scheduled_time": 1, "duration_seconds": 1, "stream_status": 1}
+        ).to_list(None)
+        schedule_index.rebuild(broadcasts, version)
+    return schedule_index
+
+async def schedule_changed(added: Optional[Dict[str, Any]] = None, removed_id: Optional[str] = None,
+                           indexed: int = 0):
+    """Bump the shared change counter; the local index is patched when no other process changed it meanwhile
+
+    `indexed` counts broadcasts the caller already added to the local index
+    (see commit_schedule_batch); the counter moves by one per broadcast.
+    """
+    increment = indexed or 1
+    try:
+        counter = await db.counters.find_one_and_update(
+            {"_id": "schedule_index"},
+            {"$inc": {"version": increment}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        if schedule_index.version is not None and counter["version"] == schedule_index.version + increment:
+            if added:
+                schedule_index.add(added)
+            if removed_id:
+                schedule_index.remove(removed_id)
+            schedule_index.version = counter["version"]
+    except Exception as e:
+        logging.error(f"Failed to record schedule change: {e}")
+
+async def commit_schedule_batch(batch: WriteBatch, added: List[Dict[str, Any]]):
+    """Write the broadcasts, events and stream jobs a scheduling request queued on `batch`, then record the change"""
+    if not len(batch):
+        return
+    try:
+        await batch.flush()
+    except Exception:
+        # Some of the batch may be stored; the index is rebuilt from what MongoDB has
+        schedule_index.version = None
+        logging.error(f"Failed to store scheduled broadcasts {[broadcast['broadcast_id'] for broadcast in added]}")
+        raise
+    await schedule_changed(indexed=len(added))
+
+async def store_created_broadcasts(batch: WriteBatch, added: List[Dict[str, Any]]):
+    """commit_schedule_batch for broadcasts YouTube already has, right after creating them
+
+    Shielded, so a cancelled request (client gone, shutdown) still stores
+    them. A failed write stays queued on `batch` and is retried by the
+    request's next commit.
+    """
+    try:
+        await asyncio.shield(commit_schedule_batch(batch, added))
+    except Exception:
+        pass  # logged by commit_schedule_batch
+
+# Work that must finish even if the request that started it goes away, and long-lived background
+# loops; the event loop itself keeps only weak references to tasks
+detached_tasks: set = set()
+
+def detach(task: asyncio.Task) -> asyncio.Task:
+    detached_tasks.add(task)
+    task.add_done_callback(detached_tasks.discard)
+    return task
+
+async def encoder_capacity() -> int:
+    """Concurrent streams the live job-claiming workers can run; this host's default if none are up"""
+    workers = await live_workers(db)
+    return sum(worker.get("capacity", 0) for worker in workers if worker.get("claims_jobs")) or default_capacity()
+
+# Broadcast lifecycle and encoder metric events, pushed to dashboards over SSE
+events = EventBus(db)
+SSE_KEEPALIVE_SECONDS = 15
+
+# Stream process records and encoder metric events are written behind, in bulk
+write_buffer = WriteBehindBuffer(db, WRITE_BEHIND_INTERVAL_SECONDS, WRITE_BEHIND_MAX_PENDING)
+
+async def publish_broadcast_status(broadcast_id: str, stream_status: str, **details) -> Optional[Dict[str, Any]]:
+    """Record a broadcast's stream lifecycle status and push it to the owner's dashboards
+
+    Statuses: scheduled, prefetching, live, restarted, completed, failed.
+    Returns the broadcast document as it was before this status (None for
+    streams without one, e.g. tests).
+    """
+    try:
+        broadcast = await db.scheduled_broadcasts.find_one_and_update(
+            {"broadcast_id": broadcast_id},
+            {"$set": {"stream_status": stream_status, "stream_status_at": datetime.now(timezone.utc).isoformat()}},
+            projection={"_id": 0, "id": 1, "user_id": 1, "scheduled_time": 1, "stream_status": 1,
+                        "stream_id": 1, "transition_mode": 1}
+        )
+        if broadcast:
+            await events.publish("broadcast", broadcast["user_id"], {
+                "id": broadcast["id"],
+                "broadcast_id": broadcast_id,
+                "stream_status": stream_status,
+                **details
+            })
+            if stream_status in FINISHED_STREAM_STATUSES:
+                await schedule_changed(removed_id=broadcast["id"])
+        return broadcast
+    except Exception as e:
+        logging.error(f"Failed to publish status {stream_status} for broadcast {broadcast_id}: {e}")
+        return None
+
+def _extract_video_info(video_url: str) -> Dict[str, Any]:
+    """Blocking yt-dlp metadata extraction (run in a worker thread)"""
+    # No 'format' option: select_stream_format ranks info['formats'] itself
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'skip_download': True,
+        'writesubtitles': False,
+        'writeautomaticsub': False,
+        'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        return ydl.extract_info(video_url, download=False)
+
+async def _resolve_video_stream_url(video_id: str) -> tuple[str, str]:
+    video_url = f'https://www.youtube.com/watch?v={video_id}'
+    logging.info(f"Attempting to extract URL from: {video_url}")
+    
+    try:
+        info = await asyncio.to_thread(_extract_video_info, video_url)
+    except yt_dlp.DownloadError as e:
+        error_str = str(e)
+        if "live event will begin in" in error_str.lower():
+            error_msg = f"Cannot extract from future live event: {error_str}. Please use a completed/existing video."
+        elif "private video" in error_str.lower():
+            error_msg = f"Video is private or restricted: {error_str}"
+        elif "video unavailable" in error_str.lower():
+            error_msg = f"Video unavailable: {error_str}. Video may be deleted or restricted."
+        else:
+            error_msg = f"yt-dlp download error: {error_str}"
+        logging.error(error_msg)
+        return None, error_msg
+    except Exception as e:
+        error_msg = f"yt-dlp extraction error: {str(e)}"
+        logging.error(error_msg)
+        return None, error_msg
+    
+    if info.get('duration'):
+        source_durations[video_id] = float(info['duration'])
+    stream_url, method = select_stream_format(info)
+    if not stream_url:
+        logging.error(f"{method} (video {video_id}, {len(info.get('formats') or [])} formats)")
+        return None, method
+    
+    logging.info(f"Selected {method} for video {video_id}")
+    return stream_url, f"Success via {method}"
+
 async def get_video_stream_url(video_id: str) -> tuple[str, str]:
-    """Get the best quality stream URL for a YouTube video"""
+    """Get the best quality stream URL for a YouTube video
+
+    Results are cached until shortly before the signed URL expires, and
+    concurrent calls for the same video share one extraction.
+    """
     try:
-        ydl_opts = {
-            'format': 'best[height<=720]/best',  # Simplified format selection
-            'quiet': False,
-            'no_warnings': False,
-            'extractaudio': False,
-            'audioformat': 'aac',
-            'outtmpl': '%(id)s.%(ext)s',
-            'writesubtitles': False,
-            'writeautomaticsub': False,
-            'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'http_chunk_size': 10485760,  # 10MB chunks
-        }
-        
-        video_url = f'https://www.youtube.com/watch?v={video_id}'
-        logging.info(f"Attempting to extract URL from: {video_url}")
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            try:
-                info = ydl.extract_info(video_url, download=False)
-                logging.info(f"Successfully extracted info for video {video_id}")
-                
-                # Try multiple extraction methods
-                stream_url = None
-                extraction_method = "unknown"
-                
-                # Method 1: Direct URL
-                if 'url' in info:
-                    stream_url = info['url']
-                    extraction_method = "direct_url"
-                    logging.info(f"Found direct URL: {stream_url[:100]}...")
-                
-                # Method 2: Best format from formats list
-                elif 'formats' in info and len(info['formats']) > 0:
-                    formats = info['formats']
-                    logging.info(f"Found {len(formats)} formats")
-                    
-                    # Log all available formats for debugging
-                    logging.info("Available formats:")
-                    for i, fmt in enumerate(formats[:10]):  # Log first 10 formats
-                        protocol = fmt.get('protocol', 'unknown')
-                        url = fmt.get('url', '')
-                        is_hls = url.endswith('.m3u8') or 'manifest' in url or protocol in ['m3u8', 'm3u8_native']
-                        logging.info(f"Format {i}: {fmt.get('format_id')} - {fmt.get('ext')} - {fmt.get('height')}p - Protocol: {protocol} - HLS: {is_hls}")
-                    
-                    # Prioritize direct HTTP/HTTPS URLs over HLS manifests
-                    # First try: mp4 with both video and audio, NOT HLS
-                    for fmt in formats:
-                        url = fmt.get('url', '')
-                        protocol = fmt.get('protocol', '')
-                        is_hls = (url.endswith('.m3u8') or 'manifest' in url or 
-                                protocol in ['m3u8', 'm3u8_native', 'hls'])
-                        
-                        if (fmt.get('ext') == 'mp4' and
-                            fmt.get('vcodec') != 'none' and 
-                            fmt.get('acodec') != 'none' and 
-                            url and not is_hls and
-                            fmt.get('height', 0) <= 720 and
-                            protocol in ['http', 'https']):
-                            stream_url = url
-                            extraction_method = f"mp4_direct_{fmt.get('height', 'unknown')}p"
-                            logging.info(f"Selected MP4 HTTP format: {fmt.get('format_id')} - {fmt.get('height', 'unknown')}p")
-                            break
-                    
-                    # Second try: any non-HLS HTTP format with video and audio
-                    if not stream_url:
-                        for fmt in formats:
-                            url = fmt.get('url', '')
-                            protocol = fmt.get('protocol', '')
-                            is_hls = (url.endswith('.m3u8') or 'manifest' in url or 
-                                    protocol in ['m3u8', 'm3u8_native', 'hls'])
-                            
-                            if (fmt.get('vcodec') != 'none' and 
-                                fmt.get('acodec') != 'none' and 
-                                url and not is_hls and
-                                fmt.get('height', 0) <= 720 and
-                                protocol in ['http', 'https']):
-                                stream_url = url
-                                extraction_method = f"direct_http_{fmt.get('ext', 'unknown')}_{fmt.get('height', 'unknown')}p"
-                                logging.info(f"Selected direct HTTP format: {fmt.get('format_id')} - {fmt.get('height', 'unknown')}p")
-                                break
-                    
-                    # Third try: any HTTP format (even without audio, we'll add audio later)
-                    if not stream_url:
-                        for fmt in formats:
-                            url = fmt.get('url', '')
-                            protocol = fmt.get('protocol', '')
-                            is_hls = (url.endswith('.m3u8') or 'manifest' in url or 
-                                    protocol in ['m3u8', 'm3u8_native', 'hls'])
-                            
-                            if (fmt.get('vcodec') != 'none' and 
-                                url and not is_hls and
-                                fmt.get('height', 0) <= 720 and
-                                protocol in ['http', 'https']):
-                                stream_url = url
-                                extraction_method = f"video_only_http_{fmt.get('ext', 'unknown')}_{fmt.get('height', 'unknown')}p"
-                                logging.info(f"Selected video-only HTTP format: {fmt.get('format_id')} - {fmt.get('height', 'unknown')}p")
-                                break
-                    
-                    # Last resort: reject HLS completely and return error
-                    if not stream_url:
-                        available_protocols = list(set([fmt.get('protocol', 'unknown') for fmt in formats[:10]]))
-                        error_msg = f"No suitable non-HLS format found. Available protocols: {available_protocols}. YouTube may only provide HLS for this video."
-                        logging.error(error_msg)
-                        return None, error_msg
-                
-                # Method 3: Try manifest URL if available
-                elif 'manifest_url' in info:
-                    stream_url = info['manifest_url']
-                    extraction_method = "manifest_url"
-                    logging.info(f"Using manifest URL: {stream_url[:100]}...")
-                
-                if stream_url:
-                    return stream_url, f"Success via {extraction_method}"
-                else:
-                    error_msg = "No suitable stream URL found in extracted info"
-                    logging.error(error_msg)
-                    return None, error_msg
-                    
-            except yt_dlp.DownloadError as e:
-                error_str = str(e)
-                if "live event will begin in" in error_str.lower():
-                    error_msg = f"Cannot extract from future live event: {error_str}. Please use a completed/existing video."
-                elif "private video" in error_str.lower():
-                    error_msg = f"Video is private or restricted: {error_str}"
-                elif "video unavailable" in error_str.lower():
-                    error_msg = f"Video unavailable: {error_str}. Video may be deleted or restricted."
-                else:
-                    error_msg = f"yt-dlp download error: {error_str}"
-                logging.error(error_msg)
-                return None, error_msg
-                
-            except Exception as e:
-                error_msg = f"yt-dlp extraction error: {str(e)}"
-                logging.error(error_msg)
-                return None, error_msg
-                
+        return await stream_url_cache.get_or_resolve(video_id, lambda: _resolve_video_stream_url(video_id))
     except Exception as e:
         error_msg = f"General error in video extraction: {str(e)}"
         logging.error(error_msg)
         return None, error_msg
 
-def stream_video_to_rtmp(video_url: str, rtmp_url: str, duration_seconds: int = None):
-    """Stream a video to RTMP endpoint using FFmpeg"""
+async def stream_video_to_rtmp(video_url: str, rtmp_url: str, duration_seconds: int = None,
+                               encoder_profile: Dict[str, Any] = None, analysis: Dict[str, Any] = None,
+                               key: Optional[str] = None):
+    """Stream a video URL to an RTMP endpoint using the shared pipeline"""
     try:
-        # Detect if input is HLS manifest
-        is_hls = video_url.endswith('.m3u8') or 'manifest' in video_url
-        
-        # Base FFmpeg command
-        cmd = ['ffmpeg', '-y']  # -y to overwrite output
-        
-        # Input options
-        if is_hls:
-            # HLS-specific input options
-            cmd.extend([
-                '-protocol_whitelist', 'file,http,https,tcp,tls,crypto',
-                '-user_agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                '-headers', 'User-Agent: Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                '-re',  # Read at native frame rate
-                '-i', video_url
-            ])
-        else:
-            # Direct video URL options
-            cmd.extend([
-                '-re',  # Read at native frame rate
-                '-i', video_url
-            ])
-        
-        # Output encoding options
-        cmd.extend([
-            '-c:v', 'libx264',  # Video codec
-            '-c:a', 'aac',      # Audio codec
-            '-preset', 'veryfast',  # Encoding preset
-            '-tune', 'zerolatency',  # Low latency
-            '-pix_fmt', 'yuv420p',  # Pixel format
-            '-maxrate', '2500k',     # Maximum bitrate
-            '-bufsize', '5000k',     # Buffer size
-            '-vf', 'scale=1280:720:force_original_aspect_ratio=decrease,pad=1280:720:(ow-iw)/2:(oh-ih)/2',  # Scale and pad
-            '-r', '30',              # Frame rate
-            '-g', '60',              # GOP size
-            '-keyint_min', '30',     # Minimum keyframe interval
-            '-sc_threshold', '0',    # Disable scene change detection
-            '-b:v', '2000k',         # Video bitrate
-            '-b:a', '128k',          # Audio bitrate
-            '-ar', '44100',          # Audio sample rate
-            '-f', 'flv',             # Output format
-            '-flvflags', 'no_duration_filesize',  # FLV flags
-        ])
-        
-        # Add duration if specified
-        if duration_seconds:
-            cmd.insert(-1, '-t')
-            cmd.insert(-1, str(duration_seconds))
-        
-        # Add RTMP destination
-        cmd.append(rtmp_url)
-        
-        # Add duration if specified
-        if duration_seconds:
-            cmd.insert(-1, '-t')
-            cmd.insert(-1, str(duration_seconds))
-        
-        logging.info(f"Starting FFmpeg stream: {' '.join(cmd)}")
-        
-        # Start FFmpeg process with better error handling
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,  # Combine stderr and stdout
-            stdin=subprocess.PIPE,
-            universal_newlines=True,
-            bufsize=1
+        return await start_pipeline(
+            key or rtmp_url,
+            StreamSource.url(video_url),
+            [rtmp_url],
+            method="direct_url_stream",
+            profile=encoder_profile,
+            analysis=analysis,
+            duration_seconds=duration_seconds
         )
+    except Exception as e:
+        logging.error(f"Failed to start video stream: {e}")
+        return None
+
+async def start_broadcast_stream(broadcast_id: str, source: StreamSource, stream_key: str, method: str,
+                                 profile: Dict[str, Any], analysis: Optional[Dict[str, Any]] = None,
+                                 video_filter: Optional[str] = None, record: Optional[Dict[str, Any]] = None,
+                                 startup_check_seconds: float = 0, cache_path: Optional[str] = None,
+                                 preroll: Optional[Preroll] = None, copy_to: Optional[str] = None):
+    """Start a broadcast pipeline and record it in streaming_processes; returns the handle or None
+
+    `cache_path` pins a source-cache file against eviction for as long as FFmpeg runs.
+    `preroll` plays a slate first (see wait_for_airtime). `copy_to` keeps a copy of the source as it is read.
+    """
+    handle = await start_pipeline(
+        broadcast_id,
+        source,
+        [youtube_rtmp_url(stream_key)],
+        method=method,
+        profile=profile,
+        analysis=analysis,
+        video_filter=video_filter,
+        metadata={"cache_path": cache_path} if cache_path else None,
+        preroll=preroll,
+        copy_to=copy_to
+    )
+    handle.metadata["preroll_seconds"] = preroll.seconds if preroll else 0
+    if cache_path:
+        storage.acquire(cache_path)
+    
+    if startup_check_seconds and not await supervisor.wait_started(handle, startup_check_seconds):
+        logging.error(f"FFmpeg ({method}) exited during startup for broadcast {broadcast_id}. Output: {handle.output()[-1000:]}")
+        return None
+    
+    write_buffer.insert("streaming_processes", {
+        "broadcast_id": broadcast_id,
+        "process_id": handle.pid,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "method": method,
+        "encoder_profile": profile["name"],
+        "worker_id": stream_worker.worker_id if stream_worker else None,
+        "preroll_seconds": round(preroll.seconds, 3) if preroll else 0,
+        **(record or {})
+    })
+    if stream_worker:
+        await stream_worker.heartbeat()
+    
+    broadcast = await publish_broadcast_status(broadcast_id, "live", method=method, encoder_profile=profile["name"])
+    if broadcast:
+        handle.metadata["user_id"] = broadcast["user_id"]
+        handle.metadata["id"] = broadcast["id"]
+        # Restarts and takeovers would count the outage itself as lateness
+        if broadcast.get("scheduled_time") and broadcast.get("stream_status") in (None, "scheduled", "prefetching"):
+            airtime = broadcast_window(broadcast)[0]
+            STREAM_START_LATENESS.observe((datetime.now(timezone.utc) - airtime).total_seconds(), method=method)
+            handle.metadata["airtime"] = airtime
+        if broadcast.get("transition_mode") == "managed" and broadcast.get("stream_id"):
+            handle.metadata["go_live_task"] = asyncio.create_task(manage_go_live(handle, broadcast))
+    return handle
+
+async def manage_go_live(handle, broadcast: Dict[str, Any]):
+    """Transition a managed broadcast to live once its encoder's stream is active, recording stage latencies"""
+    try:
+        timings = await transition_controller.go_live(
+            broadcast["user_id"],
+            handle.key,
+            broadcast["stream_id"],
+            keep_going=lambda: handle.running,
+            airtime=handle.metadata.get("airtime")
+        )
+    except Exception as e:
+        BROADCAST_TRANSITION_FAILURES.inc(target="live")
+        logging.error(f"Managed go-live failed for broadcast {handle.key}: {e}")
+        await db.scheduled_broadcasts.update_one({"broadcast_id": handle.key}, {"$set": {"transition_error": str(e)}})
+        await events.publish("broadcast", broadcast["user_id"], {
+            "id": broadcast["id"],
+            "broadcast_id": handle.key,
+            "transition_error": str(e)
+        })
+        return
+    if not timings:
+        # Already live, e.g. after an encoder restart
+        return
+    for stage, seconds in timings.items():
+        BROADCAST_TRANSITION_SECONDS.observe(seconds, stage=stage)
+    latency = {stage: round(seconds, 3) for stage, seconds in timings.items()}
+    logging.info(f"Broadcast {handle.key} is live (managed transition): {latency}")
+    await db.scheduled_broadcasts.update_one(
+        {"broadcast_id": handle.key},
+        {"$set": {"transition_latency": latency, "transition_error": None, "lifecycle_status": "live", "status": "live"}}
+    )
+    await events.publish("broadcast", broadcast["user_id"], {
+        "id": broadcast["id"],
+        "broadcast_id": handle.key,
+        "status": "live",
+        "lifecycle_status": "live",
+        "transition_latency": latency
+    })
+
+async def complete_managed_broadcast(broadcast_id: str):
+    """End a managed broadcast on YouTube once its stream job has finished for good"""
+    broadcast = await db.scheduled_broadcasts.find_one(
+        {"broadcast_id": broadcast_id, "transition_mode": "managed"}, {"_id": 0, "user_id": 1}
+    )
+    if not broadcast:
+        return
+    try:
+        if await transition_controller.complete(broadcast["user_id"], broadcast_id):
+            logging.info(f"Completed managed broadcast {broadcast_id}")
+    except Exception as e:
+        BROADCAST_TRANSITION_FAILURES.inc(target="complete")
+        logging.error(f"Failed to complete managed broadcast {broadcast_id}: {e}")
+
+def copies_source(profile: Dict[str, Any], analysis: Optional[Dict[str, Any]]) -> bool:
+    """Whether encoder_args will pass the source through rather than re-encode it"""
+    return profile.get("mode") == "copy" and (analysis is None or can_passthrough(analysis, profile))
+
+async def sleep_until(moment: datetime):
+    delay = (moment - datetime.now(timezone.utc)).total_seconds()
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+async def wait_for_airtime(start_time: datetime, profile: Dict[str, Any],
+                           analysis: Optional[Dict[str, Any]] = None) -> Optional[Preroll]:
+    """Return when the encoder should be launched, with the pre-roll that fills the time left to airtime
+
+    Encoding profiles launch up to WARM_LAUNCH_LEAD_SECONDS early, so process
+    startup, input open and the RTMP handshake happen during the slate and
+    the content starts at airtime. Copy-mode output cannot splice a slate in,
+    so it launches at airtime without one.
+    """
+    if WARM_LAUNCH_LEAD_SECONDS > 0 and not copies_source(profile, analysis):
+        await sleep_until(start_time - timedelta(seconds=WARM_LAUNCH_LEAD_SECONDS))
+        remaining = (start_time - datetime.now(timezone.utc)).total_seconds()
+        if remaining >= MIN_PREROLL_SECONDS:
+            return Preroll(remaining, WARM_LAUNCH_SLATE)
+    await sleep_until(start_time)
+    return None
+
+@supervisor.on_progress
+async def publish_stream_metrics(handle):
+    """Push live encoder metrics (fps, bitrate, speed, dropped frames) to the owner's dashboards"""
+    if handle.metadata.get("user_id"):
+        await events.publish("metrics", handle.metadata["user_id"], {
+            "broadcast_id": handle.key,
+            "method": handle.method,
+            **handle.metrics
+        }, batch=write_buffer)
+
+@supervisor.on_progress
+async def record_on_air_accuracy(handle):
+    """Record once per broadcast when its content reached the encoder output, relative to airtime"""
+    airtime = handle.metadata.get("airtime")
+    out_time = handle.metrics.get("out_time_seconds")
+    preroll_seconds = handle.metadata.get("preroll_seconds", 0)
+    if not airtime or handle.metadata.get("on_air_recorded") or out_time is None or out_time < preroll_seconds:
+        return
+    handle.metadata["on_air_recorded"] = True
+    # Output is paced in real time, so the first output frame went out `out_time` seconds ago
+    on_air_at = datetime.now(timezone.utc) - timedelta(seconds=out_time - preroll_seconds)
+    offset = round((on_air_at - airtime).total_seconds(), 3)
+    STREAM_ON_AIR_OFFSET.observe(offset, method=handle.method)
+    write_buffer.update("streaming_processes", {"broadcast_id": handle.key, "process_id": handle.pid},
+                        {"$set": {"time_to_start_seconds": offset}})
+    await db.scheduled_broadcasts.update_one(
+        {"broadcast_id": handle.key},
+        {"$set": {"on_air_at": on_air_at.isoformat(), "on_air_offset_seconds": offset,
+                  "preroll_seconds": round(preroll_seconds, 3)}}
+    )
+    if handle.metadata.get("user_id"):
+        await events.publish("broadcast", handle.metadata["user_id"], {
+            "id": handle.metadata["id"],
+            "broadcast_id": handle.key,
+            "on_air_offset_seconds": offset
+        })
+
+@supervisor.on_exit
+async def record_stream_exit(handle):
+    """Mark a stream's process record as ended once FFmpeg exits"""
+    if handle.metadata.get("cache_path"):
+        storage.release(handle.metadata["cache_path"])
+    write_buffer.update("streaming_processes", {"broadcast_id": handle.key, "process_id": handle.pid}, {"$set": {
+        "ended_at": datetime.now(timezone.utc).isoformat(),
+        "exit_code": handle.process.returncode
+    }})
+    if stream_worker:
+        await stream_worker.heartbeat()
+
+UPLOAD_EXTENSIONS = {
+    "video": ('.mp4', '.avi', '.mov', '.mkv', '.wmv'),
+    "audio": ('.mp3', '.m4a', '.aac', '.wav', '.flac', '.ogg'),
+    "image": ('.jpg', '.jpeg', '.png'),
+}
+
+def upload_media_kind(filename: str) -> Optional[str]:
+    """video, audio or image by file extension; None if the upload is not accepted"""
+    return next((kind for kind, extensions in UPLOAD_EXTENSIONS.items()
+                 if filename.lower().endswith(extensions)), None)
+
+def probe_error(media_kind: str, media: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Why a probed upload cannot be used for its kind, or None"""
+    if media_kind == "image":
+        return None if media and media.get("video_codec") else "File is corrupt or not a decodable image"
+    if media_kind == "audio":
+        if media and media.get("audio_codec") and media.get("duration"):
+            return None
+        return "File is corrupt or has no decodable audio stream"
+    if media and media.get("video_codec") and media.get("duration"):
+        return None
+    return "File is corrupt or has no decodable video stream"
+
+def still_source_error(video_info: Dict[str, Any], image_id: Optional[str] = None,
+                       image_info: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """Why an uploaded source (shown over the image `image_id`, if given) cannot be scheduled, or None"""
+    if video_info.get("probe_status") == "invalid":
+        return f"Video cannot be streamed: {video_info.get('probe_error')}"
+    if video_info.get("media_kind") == "image":
+        return "An image is shown over an audio or video upload; pass it as image_id"
+    if not image_id:
+        return None
+    if not image_info:
+        return "Image not found"
+    if image_info.get("media_kind") != "image":
+        return "image_id must refer to an uploaded image"
+    if image_info.get("probe_status") == "invalid":
+        return f"Image cannot be used: {image_info.get('probe_error')}"
+    media = video_info.get("media")
+    if media and not media.get("audio_codec"):
+        return "Source has no audio to play under the image"
+    return None
+
+async def probe_uploaded_video(file_id: str):
+    """Post-upload stage: index media metadata and remux stream-ready files to faststart MP4
+
+    Audio and image uploads are only validated and indexed; they air as still-image broadcasts.
+    """
+    import os
+    
+    try:
+        video_info = await db.uploaded_videos.find_one({"id": file_id})
+        if not video_info:
+            return
+        
+        await db.uploaded_videos.update_one({"id": file_id}, {"$set": {"probe_status": "probing"}})
+        file_path = video_info["file_path"]
+        media_kind = video_info.get("media_kind", "video")
+        
+        media = await asyncio.to_thread(analyze_source, file_path)
+        error = probe_error(media_kind, media)
+        if error:
+            logging.error(f"Uploaded {media_kind} {file_id} is not usable: {error}")
+            await db.uploaded_videos.update_one({"id": file_id}, {"$set": {
+                "probe_status": "invalid",
+                "probe_error": error,
+                "stream_ready": False
+            }})
+            return
+        
+        if media_kind != "video":
+            await db.uploaded_videos.update_one({"id": file_id}, {"$set": {
+                "probe_status": "ready",
+                "probed_at": datetime.now(timezone.utc).isoformat(),
+                "stream_ready": False,
+                "remuxed": False,
+                "media": media
+            }})
+            logging.info(f"Probed uploaded {media_kind} {file_id}: {media.get('video_codec') or media.get('audio_codec')}")
+            return
         
-        # Monitor the process for a few seconds to catch early failures
-        import threading
+        updates = {
+            "probe_status": "ready",
+            "probed_at": datetime.now(timezone.utc).isoformat(),
+            "stream_ready": can_passthrough(media),
+            "remuxed": False
+        }
         
-        def log_output():
+        # Compatible streams only need a container change, never a re-encode
+        if updates["stream_ready"] and not (is_mp4_container(media) and mp4_is_faststart(file_path)):
+            upload_dir = os.path.dirname(file_path)
+            remux_path = os.path.join(upload_dir, f"{file_id}.remux.mp4")
+            final_path = os.path.join(upload_dir, f"{file_id}.mp4")
+            
             try:
-                for line in process.stdout:
-                    logging.info(f"FFmpeg: {line.strip()}")
-            except:
-                pass
+                if await asyncio.to_thread(remux_faststart, file_path, remux_path):
+                    os.replace(remux_path, final_path)
+                    if final_path != file_path and os.path.exists(file_path):
+                        os.remove(file_path)
+                    media["format_name"] = "mov,mp4,m4a,3gp,3g2,mj2"
+                    updates.update({
+                        "file_path": final_path,
+                        "saved_filename": os.path.basename(final_path),
+                        "file_size": os.path.getsize(final_path),
+                        "remuxed": True
+                    })
+                    logging.info(f"Remuxed uploaded video {file_id} to faststart MP4")
+            finally:
+                # Left behind only when the remux or the rename failed
+                if os.path.exists(remux_path):
+                    os.remove(remux_path)
         
-        # Start logging thread
-        log_thread = threading.Thread(target=log_output)
-        log_thread.daemon = True
-        log_thread.start()
+        updates["media"] = media
+        await db.uploaded_videos.update_one({"id": file_id}, {"$set": updates})
+        logging.info(f"Probed uploaded video {file_id}: {media.get('video_codec')}/{media.get('audio_codec')} "
+                     f"{media.get('width')}x{media.get('height')}@{media.get('fps')} stream_ready={updates['stream_ready']}")
         
-        return process
+        await generate_upload_previews(file_id)
         
     except Exception as e:
-        logging.error(f"Failed to start video stream: {e}")
-        return None
+        logging.error(f"Probe failed for uploaded video {file_id}: {e}")
+        await db.uploaded_videos.update_one({"id": file_id}, {"$set": {"probe_status": "error", "probe_error": str(e)}})
+
+async def generate_upload_previews(file_id: str):
+    """Render poster, seek sprite and preview clip for a probed upload"""
+    try:
+        video_info = await db.uploaded_videos.find_one({"id": file_id})
+        if not video_info or not video_info.get("media"):
+            return
+        
+        media = video_info["media"]
+        await db.uploaded_videos.update_one({"id": file_id}, {"$set": {"preview_status": "generating"}})
+        
+        previews = await asyncio.to_thread(
+            generate_previews,
+            video_info["file_path"],
+            preview_dir(UPLOAD_DIR, file_id),
+            media.get("duration") or 0,
+            bool(media.get("audio_codec"))
+        )
+        
+        if previews:
+            await db.uploaded_videos.update_one({"id": file_id}, {"$set": {
+                "preview_status": "ready",
+                "previews": previews
+            }})
+            logging.info(f"Generated previews for uploaded video {file_id}: {previews['sizes']}")
+        else:
+            await db.uploaded_videos.update_one({"id": file_id}, {"$set": {"preview_status": "failed"}})
+            
+    except Exception as e:
+        logging.error(f"Preview generation failed for uploaded video {file_id}: {e}")
+        await db.uploaded_videos.update_one({"id": file_id}, {"$set": {"preview_status": "failed"}})
+
+async def stream_still_image(broadcast_id: str, stream_key: str, audio_path: str, start_time: datetime,
+                             media: Optional[Dict[str, Any]] = None, image_id: Optional[str] = None):
+    """Air an uploaded image (or the slate) over an uploaded audio or video file's sound
+
+    The picture is encoded once with the still-image profile into a single
+    GOP that FFmpeg loops in copy mode; only the audio is encoded live, and
+    not even that when it is already AAC.
+    """
+    import os
+    
+    profile = await get_encoder_profile(STILL_PROFILE_NAME)
+    image_info = await db.uploaded_videos.find_one({"id": image_id}) if image_id else None
+    if image_id and not (image_info and os.path.exists(image_info["file_path"])):
+        logging.warning(f"Image {image_id} for broadcast {broadcast_id} is gone; showing the slate instead")
+        image_info = None
+    clip = await slates.still(
+        profile,
+        image_info["file_path"] if image_info else None,
+        image_info.get("media") if image_info else None,
+        await slate_title(broadcast_id)
+    )
+    if not clip:
+        raise RuntimeError(f"Could not render the still image for broadcast {broadcast_id}")
+    analysis = media or await asyncio.to_thread(analyze_source, audio_path)
+    
+    # Nothing to warm up: the picture is copied and audio encoding starts instantly
+    await sleep_until(start_time)
+    
+    def start(position: float = 0):
+        return start_broadcast_stream(
+            broadcast_id,
+            StreamSource.still(clip["path"], audio_path, seek=position),
+            stream_key,
+            method="still_image_stream",
+            profile=profile,
+            analysis=analysis,
+            record={"file_path": audio_path, "image_path": clip["path"],
+                    **({"resumed_at_seconds": round(position, 1)} if position else {})}
+        )
+    
+    handle = await start()
+    if handle:
+        logging.info(f"Still-image stream started for broadcast {broadcast_id}")
+        await run_with_stall_failover(handle, broadcast_id, stream_key, profile, clip["analysis"], start)
+    else:
+        logging.error(f"Failed to start still-image stream for broadcast {broadcast_id}")
 
-async def schedule_uploaded_video_stream(broadcast_id: str, stream_key: str, file_path: str, start_time: datetime):
-    """Schedule streaming of an uploaded video file"""
+async def schedule_uploaded_video_stream(broadcast_id: str, stream_key: str, file_path: str, start_time: datetime,
+                                         encoder_profile: Optional[str] = None, file_id: Optional[str] = None,
+                                         image_id: Optional[str] = None):
+    """Schedule streaming of an uploaded video file; returns once the stream has ended
+
+    Audio uploads, and any upload scheduled with an `image_id`, air as still-image broadcasts.
+    """
     import os
     
     try:
-        # Calculate wait time
-        now = datetime.now(timezone.utc)
-        wait_seconds = (start_time - now).total_seconds()
+        # The source is prepared before the warm-launch lead, so probing does not delay airtime
+        launch_at = start_time - timedelta(seconds=WARM_LAUNCH_LEAD_SECONDS)
+        wait_seconds = (launch_at - datetime.now(timezone.utc)).total_seconds()
         
         if wait_seconds > 0:
             logging.info(f"Waiting {wait_seconds} seconds to start uploaded video stream for broadcast {broadcast_id}")
@@ -361,255 +1080,633 @@ async def schedule_uploaded_video_stream(broadcast_id: str, stream_key: str, fil
         
         logging.info(f"Starting uploaded video stream for broadcast {broadcast_id}")
         
+        # The upload may have been remuxed since scheduling; use the indexed path and metadata
+        media = None
+        media_kind = "video"
+        if file_id:
+            video_info = await db.uploaded_videos.find_one({"id": file_id})
+            if video_info:
+                file_path = video_info["file_path"]
+                media = video_info.get("media")
+                media_kind = video_info.get("media_kind", "video")
+        
         # Check if file exists
         if not os.path.exists(file_path):
-            logging.error(f"Uploaded file not found: {file_path}")
+            raise FileNotFoundError(f"Uploaded file not found: {file_path}")
+        
+        if image_id or media_kind == "audio":
+            await stream_still_image(broadcast_id, stream_key, file_path, start_time, media, image_id)
             return
         
-        # Stream the uploaded file
-        rtmp_url = f"rtmp://a.rtmp.youtube.com/live2/{stream_key}"
-        
-        cmd = [
-            'ffmpeg', '-y',
-            '-re',  # Read at native frame rate
-            '-i', file_path,
-            '-c:v', 'libx264',
-            '-c:a', 'aac',
-            '-preset', 'veryfast',
-            '-tune', 'zerolatency',
-            '-pix_fmt', 'yuv420p',
-            '-maxrate', '2500k',
-            '-bufsize', '5000k',
-            '-vf', 'scale=1280:720:force_original_aspect_ratio=decrease,pad=1280:720:(ow-iw)/2:(oh-ih)/2',
-            '-r', '30',
-            '-g', '60',
-            '-keyint_min', '30',
-            '-sc_threshold', '0',
-            '-b:v', '2000k',
-            '-b:a', '128k',
-            '-ar', '44100',
-            '-f', 'flv',
-            '-flvflags', 'no_duration_filesize',
-            rtmp_url
-        ]
-        
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            stdin=subprocess.PIPE,
-            universal_newlines=True,
-            bufsize=1
+        profile, analysis = await resolve_encoder_profile(encoder_profile, file_path, analysis=media)
+        preroll = await wait_for_airtime(start_time, profile, analysis)
+        
+        handle = await start_broadcast_stream(
+            broadcast_id,
+            StreamSource.file(file_path),
+            stream_key,
+            method="uploaded_file_stream",
+            profile=profile,
+            analysis=analysis,
+            record={"file_path": file_path},
+            preroll=preroll
         )
         
-        if process:
-            # Store process info
-            await db.streaming_processes.insert_one({
-                "broadcast_id": broadcast_id,
-                "process_id": process.pid,
-                "started_at": datetime.now(timezone.utc).isoformat(),
-                "file_path": file_path,
-                "method": "uploaded_file_stream"
-            })
-            
+        def relaunch(position: float):
+            # Resumes where the stalled stream left off
+            return start_broadcast_stream(
+                broadcast_id,
+                StreamSource.file(file_path, seek=position),
+                stream_key,
+                method="uploaded_file_stream",
+                profile=profile,
+                analysis=analysis,
+                record={"file_path": file_path, "resumed_at_seconds": round(position, 1)}
+            )
+        
+        if handle:
             logging.info(f"Uploaded video stream started successfully for broadcast {broadcast_id}")
+            await run_with_stall_failover(handle, broadcast_id, stream_key, profile, analysis, relaunch)
         else:
             logging.error(f"Failed to start uploaded video stream for broadcast {broadcast_id}")
             
     except Exception as e:
         logging.error(f"Error in uploaded video stream: {e}")
+        raise
+
+# How long before airtime the direct URL is resolved for progressive streams
+DIRECT_URL_PREFETCH_SECONDS = 45
+# A streamed copy this much shorter than the video counts as truncated
+SOURCE_COPY_TOLERANCE_SECONDS = 2
 
-async def schedule_video_stream(broadcast_id: str, stream_key: str, video_id: str, start_time: datetime):
-    """Schedule a video stream to start at a specific time"""
-    import tempfile
+def download_youtube_video(video_id: str, temp_file: str) -> bool:
+    """Download a YouTube video with yt-dlp (blocking); True if a usable file was written"""
     import os
     
+    # Download the video with more robust options
+    ydl_opts = {
+        'format': 'best[ext=mp4][height<=720]/best[height<=720]',
+        'outtmpl': temp_file,
+        'quiet': True,
+        'no_warnings': True,
+        'retries': 3,
+        'fragment_retries': 3,
+        'socket_timeout': 30,
+        'http_chunk_size': 10485760,
+        'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+        'extractor_args': {
+            'youtube': {
+                'player_client': ['web', 'web_safari', 'web_embedded'],
+                'skip': ['translate'],
+            }
+        }
+    }
+    
     try:
-        # Calculate wait time
-        now = datetime.now(timezone.utc)
-        wait_seconds = (start_time - now).total_seconds()
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            ydl.download([f'https://www.youtube.com/watch?v={video_id}'])
         
-        if wait_seconds > 0:
-            logging.info(f"Waiting {wait_seconds} seconds to start stream for broadcast {broadcast_id}")
-            await asyncio.sleep(wait_seconds)
+        if os.path.exists(temp_file) and os.path.getsize(temp_file) > 1024:  # File exists and is > 1KB
+            logging.info(f"Successfully downloaded {video_id} ({os.path.getsize(temp_file)} bytes)")
+            return True
+        logging.error(f"Downloaded file is empty or too small for {video_id}")
+    except Exception as e:
+        logging.error(f"Download failed for {video_id}: {e}")
+    return False
+
+async def fetch_source_video(video_id: str) -> Optional[str]:
+    """Cached local copy of a YouTube video, downloading it (once) if needed"""
+    return await storage.fetch(video_id, lambda part_path: asyncio.to_thread(download_youtube_video, video_id, part_path))
+
+async def stream_downloaded_video(broadcast_id: str, stream_key: str, video_id: str,
+                                  source_path: Optional[str], encoder_profile: Optional[str] = None,
+                                  airtime: Optional[datetime] = None):
+    """Loop a cached copy of a YouTube video, or fall back to a test pattern if the download failed
+
+    With `airtime` the encoder is launched warm for it (see wait_for_airtime).
+    Returns once the stream has ended.
+    """
+    # If download failed, loop the slate instead
+    if not source_path:
+        logging.info(f"Download failed for {video_id}, streaming the fallback slate")
         
-        logging.info(f"Starting scheduled stream for broadcast {broadcast_id}")
+        try:
+            profile, _ = await resolve_encoder_profile(encoder_profile, None)
+            if airtime:
+                # Copy-mode playout has no pre-roll; this waits for airtime
+                await wait_for_airtime(airtime, await get_encoder_profile("passthrough"))
+            handle = await start_slate_stream(broadcast_id, stream_key, "fallback", profile,
+                                              record={"video_id": video_id, "note": "Download failed, using slate"})
+            if not handle:
+                handle = await start_test_pattern_stream(broadcast_id, stream_key, video_id)
+            
+            if handle:
+                logging.info(f"Fallback stream started successfully for broadcast {broadcast_id}")
+                await handle.process.wait()
+                
+        except Exception as fallback_error:
+            logging.error(f"Fallback streaming failed: {fallback_error}")
         
-        # Construct RTMP URL first (needed for both success and fallback)
-        rtmp_url = f"rtmp://a.rtmp.youtube.com/live2/{stream_key}"
+        return
+    
+    # Stream the downloaded file
+    profile, analysis = await resolve_encoder_profile(encoder_profile, source_path)
+    preroll = await wait_for_airtime(airtime, profile, analysis) if airtime else None
+    
+    def relaunch(position: float):
+        # The cached copy loops, so it simply starts over
+        return start_broadcast_stream(
+            broadcast_id,
+            StreamSource.file(source_path, loop=True),
+            stream_key,
+            method="download_and_stream",
+            profile=profile,
+            analysis=analysis,
+            record={"video_id": video_id, "source_path": source_path},
+            cache_path=source_path
+        )
+    
+    handle = await start_broadcast_stream(
+        broadcast_id,
+        StreamSource.file(source_path, loop=True),
+        stream_key,
+        method="download_and_stream",
+        profile=profile,
+        analysis=analysis,
+        record={"video_id": video_id, "source_path": source_path},
+        cache_path=source_path,
+        preroll=preroll
+    )
+    
+    if handle:
+        logging.info(f"Download+Stream started successfully for broadcast {broadcast_id}")
+        await run_with_stall_failover(handle, broadcast_id, stream_key, profile, analysis, relaunch)
+    else:
+        logging.error(f"Failed to start download+stream for broadcast {broadcast_id}")
+
+async def start_test_pattern_stream(broadcast_id: str, stream_key: str, video_id: str):
+    """Live-encoded test pattern; the last resort when no slate could be rendered"""
+    # A test pattern does not need the full encode budget
+    fallback_profile = await get_encoder_profile("low-cpu")
+    return await start_broadcast_stream(
+        broadcast_id,
+        StreamSource.lavfi('testsrc2=size=1280x720:rate=30', 'sine=frequency=440:sample_rate=44100'),
+        stream_key,
+        method="fallback_test_pattern",
+        profile=fallback_profile,
+        analysis={"height": 720, "fps": 30},
+        video_filter=f'drawtext=text="Scheduled Stream - Video ID\\: {video_id} - %{{localtime}}":fontcolor=white:fontsize=24:x=10:y=10:box=1:boxcolor=black@0.8',
+        record={"video_id": video_id, "note": "Download failed, using test pattern"},
+        startup_check_seconds=2
+    )
+
+async def slate_title(broadcast_id: str) -> Optional[str]:
+    """Video title shown on this broadcast's slates (None for the generic slate)"""
+    if not SLATE_PER_VIDEO:
+        return None
+    broadcast = await db.scheduled_broadcasts.find_one({"broadcast_id": broadcast_id}, {"_id": 0, "video_title": 1})
+    return broadcast.get("video_title") if broadcast else None
+
+async def start_slate_stream(broadcast_id: str, stream_key: str, reason: str,
+                             profile: Optional[Dict[str, Any]] = None, analysis: Optional[Dict[str, Any]] = None,
+                             record: Optional[Dict[str, Any]] = None):
+    """Loop the slate matching an output profile and source to the broadcast in copy mode; None if unavailable"""
+    slate = await slates.get(profile, analysis, await slate_title(broadcast_id))
+    if not slate:
+        return None
+    SLATE_PLAYOUTS.inc(reason=reason)
+    return await start_broadcast_stream(
+        broadcast_id,
+        StreamSource.file(slate["path"], loop=True),
+        stream_key,
+        method="slate",
+        profile=await get_encoder_profile("passthrough"),
+        analysis=slate["analysis"],
+        record={"slate_path": slate["path"], "reason": reason, **(record or {})},
+        startup_check_seconds=2
+    )
+
+async def run_with_stall_failover(handle, broadcast_id: str, stream_key: str, profile: Dict[str, Any],
+                                  analysis: Optional[Dict[str, Any]], relaunch: Callable[[float], Awaitable[Any]]):
+    """Wait for a stream to end; whenever its output stalls, put the slate on air and relaunch the source
+
+    `relaunch(position)` starts the source again `position` seconds in and
+    returns the new handle (or None). After MAX_STALL_RELAUNCHES the slate
+    stays on air until the stream is stopped.
+    """
+    # Rendered ahead, so a stall does not wait for it
+    prepared = asyncio.create_task(slates.get(profile, analysis, await slate_title(broadcast_id)))
+    position = 0.0
+    relaunches = 0
+    while handle:
+        if not await supervisor.wait_exit_or_stall(handle, STALL_TIMEOUT_SECONDS):
+            return
+        STREAM_STALLS.inc(method=handle.method)
+        position += max(0.0, (handle.metrics.get("out_time_seconds") or 0) - handle.metadata.get("preroll_seconds", 0))
+        logging.warning(f"{handle.method} for broadcast {broadcast_id} stalled at {position:.0f}s; putting the slate on air")
+        await supervisor.stop(broadcast_id, deliberate=False)
+        await publish_broadcast_status(broadcast_id, "restarted", reason="Source stalled; slate on air")
+        await prepared
+        slate = await start_slate_stream(broadcast_id, stream_key, "stall", profile, analysis)
+        if relaunches >= MAX_STALL_RELAUNCHES:
+            logging.error(f"Broadcast {broadcast_id} stalled {relaunches + 1} times; leaving the slate on air")
+            if slate:
+                await slate.process.wait()
+            return
+        relaunches += 1
+        await asyncio.sleep(STALL_RELAUNCH_DELAY_SECONDS)
+        if slate:
+            if slate.stopped:
+                return
+            await supervisor.stop(broadcast_id, deliberate=False)
+        handle = await relaunch(position)
+
+async def source_copy_complete(video_id: str, path: str) -> bool:
+    """Whether a copy written while streaming holds the whole video, going by yt-dlp's duration"""
+    expected = source_durations.get(video_id)
+    if not expected or not os.path.exists(path):
+        return False
+    media = await asyncio.to_thread(analyze_source, path)
+    return bool(media and (media.get("duration") or 0) >= expected - SOURCE_COPY_TOLERANCE_SECONDS)
+
+async def continue_from_direct_stream(handle, copy_path: str, broadcast_id: str, stream_key: str,
+                                      video_id: str, encoder_profile: Optional[str] = None,
+                                      profile: Optional[Dict[str, Any]] = None):
+    """Once the direct-URL stream ends or stalls, carry on from a cached copy
+
+    A stream that read the whole video leaves its copy at `copy_path`, which
+    becomes the cached source. Otherwise the video is downloaded only now,
+    with the slate on air until the download finishes.
+    """
+    stalled = await supervisor.wait_exit_or_stall(handle, STALL_TIMEOUT_SECONDS)
+    if stalled:
+        STREAM_STALLS.inc(method=handle.method)
+        await supervisor.stop(broadcast_id, deliberate=False)
+    returncode = await handle.process.wait()
+    
+    source_path = None
+    if not stalled and returncode == 0 and await source_copy_complete(video_id, copy_path):
+        source_path = await storage.adopt(video_id, copy_path)
+    elif os.path.exists(copy_path):
+        os.remove(copy_path)
+    
+    if handle.stopped:
+        return
+    
+    await publish_broadcast_status(broadcast_id, "restarted", reason=f"Direct stream exited with code {returncode}")
+    slate = None
+    if not source_path:
+        logging.warning(f"Direct stream for broadcast {broadcast_id} ended (code {returncode}) without a complete copy; "
+                        f"slate on air until the download finishes")
+        download_task = asyncio.create_task(fetch_source_video(video_id))
+        slate = await start_slate_stream(broadcast_id, stream_key, "bridge", profile)
+        source_path = await download_task
+    if slate:
+        if slate.stopped or (not source_path and slate.running):
+            # Stopped meanwhile, or the slate is the fallback anyway
+            await slate.process.wait()
+            return
+        await supervisor.stop(broadcast_id, deliberate=False)
+    
+    logging.warning(f"Switching broadcast {broadcast_id} to the cached copy (available: {bool(source_path)})")
+    await stream_downloaded_video(broadcast_id, stream_key, video_id, source_path, encoder_profile)
+
+async def schedule_video_stream(broadcast_id: str, stream_key: str, video_id: str, start_time: datetime,
+                                encoder_profile: Optional[str] = None):
+    """Schedule a video stream to start at a specific time
+
+    A cached copy is streamed directly when present. Otherwise streaming starts
+    progressively from the resolved direct URL at airtime, and the same FFmpeg
+    process copies what it reads into the source cache, so the video is
+    fetched from YouTube once. When the video ends the cached copy loops as
+    before; if the direct read fails, a separate download takes over. Runs as
+    a stream job and returns once the broadcast's stream has ended.
+    """
+    try:
+        cached_path = storage.lookup(video_id)
+        
+        # Resolve the direct URL shortly before airtime (it is cached until the signed URL expires)
+        direct_url, extraction_info = None, None
+        if not cached_path:
+            prefetch_seconds = (start_time - datetime.now(timezone.utc)).total_seconds() - DIRECT_URL_PREFETCH_SECONDS
+            if prefetch_seconds > 0:
+                logging.info(f"Waiting {prefetch_seconds} seconds to resolve stream URL for broadcast {broadcast_id}")
+                await asyncio.sleep(prefetch_seconds)
+            
+            direct_url, extraction_info = await get_video_stream_url(video_id)
+            if not direct_url:
+                logging.warning(f"Direct URL unavailable for {video_id}: {extraction_info}")
         
-        # Use download+stream method since it's more reliable
-        temp_dir = tempfile.mkdtemp()
-        temp_file = os.path.join(temp_dir, f"{video_id}_{broadcast_id}.mp4")
+        # Sources are picked and probed before the warm-launch lead; the launch itself waits in wait_for_airtime
+        launch_at = start_time - timedelta(seconds=WARM_LAUNCH_LEAD_SECONDS)
+        wait_seconds = (launch_at - datetime.now(timezone.utc)).total_seconds()
         
-        # Download the video with more robust options
-        ydl_opts = {
-            'format': 'best[ext=mp4][height<=720]/best[height<=720]',
-            'outtmpl': temp_file,
-            'quiet': False,
-            'retries': 3,
-            'fragment_retries': 3,
-            'socket_timeout': 30,
-            'http_chunk_size': 10485760,
-            'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'extractor_args': {
-                'youtube': {
-                    'player_client': ['web', 'web_safari', 'web_embedded'],
-                    'skip': ['translate'],
-                }
-            }
-        }
+        if wait_seconds > 0:
+            logging.info(f"Waiting {wait_seconds} seconds to start stream for broadcast {broadcast_id}")
+            await asyncio.sleep(wait_seconds)
         
-        download_success = False
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([f'https://www.youtube.com/watch?v={video_id}'])
-            
-            if os.path.exists(temp_file) and os.path.getsize(temp_file) > 1024:  # File exists and is > 1KB
-                download_success = True
-                logging.info(f"Successfully downloaded {video_id} ({os.path.getsize(temp_file)} bytes)")
-            else:
-                logging.error(f"Downloaded file is empty or too small for {video_id}")
-        except Exception as e:
-            logging.error(f"Download failed for {video_id}: {e}")
+        logging.info(f"Starting scheduled stream for broadcast {broadcast_id}")
         
-        # If download failed, use fallback streaming method
-        if not download_success:
-            logging.info(f"Download failed for {video_id}, using fallback test pattern stream")
-            
-            try:
-                # Stream a test pattern with video info overlay
-                cmd = [
-                    'ffmpeg', '-y',
-                    '-f', 'lavfi',
-                    '-i', 'testsrc2=size=1280x720:rate=30',
-                    '-f', 'lavfi', 
-                    '-i', 'sine=frequency=440:sample_rate=44100',
-                    '-c:v', 'libx264',
-                    '-c:a', 'aac',
-                    '-preset', 'veryfast',
-                    '-tune', 'zerolatency',
-                    '-pix_fmt', 'yuv420p',
-                    '-maxrate', '2500k',
-                    '-bufsize', '5000k',
-                    '-vf', f'drawtext=text="Scheduled Stream - Video ID\\: {video_id} - %{{localtime}}":fontcolor=white:fontsize=24:x=10:y=10:box=1:boxcolor=black@0.8',
-                    '-r', '30',
-                    '-g', '60',
-                    '-keyint_min', '30',
-                    '-sc_threshold', '0',
-                    '-b:v', '2000k',
-                    '-b:a', '128k',
-                    '-ar', '44100',
-                    '-f', 'flv',
-                    '-flvflags', 'no_duration_filesize',
-                    rtmp_url
-                ]
-                
-                logging.info(f"Fallback FFmpeg command: {' '.join(cmd)}")
-                
-                process = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    stdin=subprocess.PIPE
-                )
-                
-                # Wait a moment to check if process started
-                time.sleep(2)
-                
-                if process.poll() is None:
-                    # Process is running
-                    logging.info(f"Fallback stream started successfully for broadcast {broadcast_id}")
-                    
-                    # Store fallback process info
-                    await db.streaming_processes.insert_one({
-                        "broadcast_id": broadcast_id,
-                        "process_id": process.pid,
-                        "started_at": datetime.now(timezone.utc),
-                        "video_id": video_id,
-                        "method": "fallback_test_pattern",
-                        "note": "Download failed, using test pattern"
-                    })
-                else:
-                    # Process died
-                    stdout, stderr = process.communicate()
-                    logging.error(f"Fallback FFmpeg failed. STDOUT: {stdout.decode() if stdout else 'None'}")
-                    logging.error(f"Fallback FFmpeg failed. STDERR: {stderr.decode() if stderr else 'None'}")
-                    
-            except Exception as fallback_error:
-                logging.error(f"Fallback streaming failed: {fallback_error}")
-            
+        cached_path = cached_path if cached_path and os.path.exists(cached_path) else storage.lookup(video_id)
+        if cached_path:
+            await stream_downloaded_video(broadcast_id, stream_key, video_id, cached_path, encoder_profile,
+                                          airtime=start_time)
             return
         
-        # Stream the downloaded file
-        
-        cmd = [
-            'ffmpeg', '-y',
-            '-stream_loop', '-1',  # Loop the video
-            '-re',  # Read at native frame rate
-            '-i', temp_file,
-            '-c:v', 'libx264',
-            '-c:a', 'aac',
-            '-preset', 'veryfast',
-            '-tune', 'zerolatency',
-            '-pix_fmt', 'yuv420p',
-            '-maxrate', '2500k',
-            '-bufsize', '5000k',
-            '-vf', 'scale=1280:720:force_original_aspect_ratio=decrease,pad=1280:720:(ow-iw)/2:(oh-ih)/2',
-            '-r', '30',
-            '-g', '60',
-            '-keyint_min', '30',
-            '-sc_threshold', '0',
-            '-b:v', '2000k',
-            '-b:a', '128k',
-            '-ar', '44100',
-            '-f', 'flv',
-            '-flvflags', 'no_duration_filesize',
-            rtmp_url
-        ]
-        
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            stdin=subprocess.PIPE,
-            universal_newlines=True,
-            bufsize=1
-        )
-        
-        if process:
-            # Store process info for potential cleanup
-            await db.streaming_processes.insert_one({
-                "broadcast_id": broadcast_id,
-                "process_id": process.pid,
-                "started_at": datetime.now(timezone.utc),
-                "video_id": video_id,
-                "temp_file": temp_file,
-                "temp_dir": temp_dir,
-                "method": "download_and_stream"
-            })
-            
-            logging.info(f"Download+Stream started successfully for broadcast {broadcast_id}")
-            
-            # Schedule cleanup (after a reasonable time)
-            def cleanup_later():
-                time.sleep(3600)  # Wait 1 hour before cleanup
-                try:
-                    if os.path.exists(temp_file):
-                        os.remove(temp_file)
-                    if os.path.exists(temp_dir):
-                        os.rmdir(temp_dir)
-                    logging.info(f"Cleaned up temp files for broadcast {broadcast_id}")
-                except:
-                    pass
-            
-            threading.Thread(target=cleanup_later, daemon=True).start()
-            
-        else:
-            logging.error(f"Failed to start download+stream for broadcast {broadcast_id}")
+        if direct_url:
+            # Remote sources are not probed at airtime; "auto" resolves to the default profile
+            profile, analysis = await resolve_encoder_profile(encoder_profile, None)
+            if "video_only" in extraction_info:
+                # The pre-roll graph needs an audio track to join; launch at airtime instead
+                await sleep_until(start_time)
+                preroll = None
+            else:
+                preroll = await wait_for_airtime(start_time, profile, analysis)
+            # A video-only format would cache a silent copy
+            copy_path = storage.tee_path(video_id) if "video_only" not in extraction_info else None
+            handle = await start_broadcast_stream(
+                broadcast_id,
+                StreamSource.url(direct_url),
+                stream_key,
+                method="direct_url_stream",
+                profile=profile,
+                analysis=analysis,
+                preroll=preroll,
+                copy_to=copy_path,
+                record={"video_id": video_id}
+            )
+            if handle:
+                logging.info(f"Direct URL stream started for broadcast {broadcast_id} ({extraction_info})")
+                if copy_path:
+                    await continue_from_direct_stream(
+                        handle, copy_path, broadcast_id, stream_key, video_id, encoder_profile, profile
+                    )
+                    return
+                await handle.process.wait()
+                if handle.stopped:
+                    return
+            elif copy_path and os.path.exists(copy_path):
+                os.remove(copy_path)
+        
+        source_path = await fetch_source_video(video_id)
+        await stream_downloaded_video(broadcast_id, stream_key, video_id, source_path, encoder_profile,
+                                      airtime=start_time)
             
     except Exception as e:
         logging.error(f"Error in scheduled video stream: {e}")
+        raise
+
+async def run_with_lifecycle_events(job: Dict[str, Any], stream):
+    """Await a job's stream coroutine, publishing its start and outcome"""
+    if job["attempts"] > 1:
+        await publish_broadcast_status(job["key"], "restarted", reason="Taken over by another worker")
+    else:
+        await publish_broadcast_status(job["key"], "prefetching")
+    try:
+        await stream
+    except Exception as e:
+        await publish_broadcast_status(job["key"], "failed", error=str(e))
+        await complete_managed_broadcast(job["key"])
+        raise
+    await publish_broadcast_status(job["key"], "completed")
+    await complete_managed_broadcast(job["key"])
+
+async def run_youtube_video_job(job: Dict[str, Any]):
+    payload = job["payload"]
+    await run_with_lifecycle_events(job, schedule_video_stream(
+        job["key"], payload["stream_key"], payload["video_id"], job["start_time"], payload.get("encoder_profile")
+    ))
+
+async def run_uploaded_video_job(job: Dict[str, Any]):
+    payload = job["payload"]
+    await run_with_lifecycle_events(job, schedule_uploaded_video_stream(
+        job["key"], payload["stream_key"], payload["file_path"], job["start_time"],
+        payload.get("encoder_profile"), payload.get("file_id"), payload.get("image_id")
+    ))
+
+STREAM_JOB_RUNNERS = {
+    "youtube_video": run_youtube_video_job,
+    "uploaded_video": run_uploaded_video_job,
+}
+
+def create_stream_worker(claim_jobs: bool = True) -> StreamWorker:
+    """Worker that runs stream jobs through this process's supervisor
+
+    Without `claim_jobs` it only heartbeats the streams this process started
+    (e.g. test streams) and executes stop commands routed to it.
+    """
+    return StreamWorker(
+        db,
+        STREAM_JOB_RUNNERS if claim_jobs else {},
+        stop_stream=supervisor.stop,
+        list_streams=lambda: [handle.key for handle in supervisor.active()]
+    )
+
+stream_worker: Optional[StreamWorker] = None
+
+async def youtube_service_for_user(user_id: str):
+    """YouTube client for a stored user, refreshing the access token if needed"""
+    user = await db.users.find_one({"id": user_id}, {"_id": 0})
+    if not user:
+        return None
+    user = await refresh_token_if_needed(User(**user))
+    creds = get_credentials_from_token(user.access_token, user.refresh_token)
+    return await asyncio.to_thread(get_youtube_service, creds, user_id)
+
+async def publish_lifecycle_change(broadcast: Dict[str, Any], changes: Dict[str, Any]):
+    await events.publish("broadcast", broadcast["user_id"], {
+        "id": broadcast["id"],
+        "broadcast_id": broadcast["broadcast_id"],
+        **changes
+    })
+
+broadcast_reconciler = BroadcastReconciler(db, youtube_service_for_user, on_change=publish_lifecycle_change)
+transition_controller = TransitionController(youtube_service_for_user)
+
+# Quota units of one create_live_event call
+LIVE_EVENT_QUOTA_UNITS = sum(method_cost(f"youtube.{method}") for method in (
+    "liveBroadcasts.insert", "liveStreams.insert", "liveBroadcasts.bind"
+))
+
+def create_live_event(youtube, title: str, description: str, scheduled_datetime_utc: datetime,
+                      stream_title: str) -> Dict[str, str]:
+    """Create a YouTube broadcast and an RTMP stream and bind them (blocking, three API calls)
+
+    In managed transition mode YouTube does not start or stop the broadcast
+    on its own; manage_go_live and complete_managed_broadcast do.
+    """
+    auto_transitions = YOUTUBE_TRANSITION_MODE == "auto"
+    broadcast_body = {
+        'snippet': {
+            'title': title,
+            'description': description,
+            'scheduledStartTime': scheduled_datetime_utc.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+        },
+        'status': {
+            'privacyStatus': 'unlisted',
+            'selfDeclaredMadeForKids': False
+        },
+        'contentDetails': {
+            'enableAutoStart': auto_transitions,
+            'enableAutoStop': auto_transitions,
+            'recordFromStart': True,
+            'enableDvr': True,
+            'enableContentEncryption': False,
+            'enableEmbed': True,
+            'projection': 'rectangular'
+        }
+    }
+    
+    broadcast_response = youtube.liveBroadcasts().insert(
+        part='snippet,status,contentDetails',
+        body=broadcast_body
+    ).execute()
+    
+    broadcast_id = broadcast_response['id']
+    
+    # Create live stream
+    stream_body = {
+        'snippet': {
+            'title': stream_title
+        },
+        'cdn': {
+            'frameRate': '30fps',
+            'ingestionType': 'rtmp',
+            'resolution': '720p'
+        }
+    }
+    
+    stream_response = youtube.liveStreams().insert(
+        part='snippet,cdn',
+        body=stream_body
+    ).execute()
+    
+    stream_id = stream_response['id']
+    
+    # Bind stream to broadcast
+    youtube.liveBroadcasts().bind(
+        part='id',
+        id=broadcast_id,
+        streamId=stream_id
+    ).execute()
+    
+    return {
+        "broadcast_id": broadcast_id,
+        "stream_id": stream_id,
+        "stream_name": stream_response['cdn']['ingestionInfo']['streamName'],
+        "transition_mode": YOUTUBE_TRANSITION_MODE
+    }
+
+async def record_scheduled_broadcast(user_id: str, video_id: str, video_title: str, live_event: Dict[str, str],
+                                     scheduled_datetime_utc: datetime, encoder_profile: Optional[str],
+                                     job_kind: str, job_payload: Dict[str, Any], batch: Optional[WriteBatch] = None,
+                                     **extra) -> Dict[str, Any]:
+    """Store a created broadcast, push it to dashboards and queue its stream job; returns the document
+
+    With a `batch`, the writes are queued for commit_schedule_batch and the
+    broadcast goes into the local schedule index right away, so the
+    request's later slots are checked against it.
+    """
+    broadcast_id = live_event["broadcast_id"]
+    broadcast_data = {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "video_id": video_id,
+        "video_title": video_title,
+        "broadcast_id": broadcast_id,
+        "stream_id": live_event["stream_id"],
+        "scheduled_time": scheduled_datetime_utc.isoformat(),
+        "status": 'created',
+        "stream_status": "scheduled",
+        "stream_url": live_event["stream_name"],
+        "watch_url": f"https://www.youtube.com/watch?v={broadcast_id}",
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "encoder_profile": encoder_profile or "auto",
+        "transition_mode": live_event.get("transition_mode", "auto"),
+        **extra
+    }
+    
+    if batch is not None:
+        batch.insert("scheduled_broadcasts", broadcast_data)
+        clean_broadcast_data = dict(broadcast_data)
+        schedule_index.add(clean_broadcast_data)
+    else:
+        await db.scheduled_broadcasts.insert_one(broadcast_data)
+        # Remove any MongoDB ObjectId before returning
+        clean_broadcast_data = {k: v for k, v in broadcast_data.items() if k != '_id'}
+    await events.publish("broadcast", user_id, clean_broadcast_data, batch=batch)
+    if batch is None:
+        await schedule_changed(added=clean_broadcast_data)
+    
+    # Queue the streaming for whichever worker is free at airtime
+    await enqueue_job(db, broadcast_id, job_kind, scheduled_datetime_utc, {
+        "stream_key": live_event["stream_name"],
+        "encoder_profile": encoder_profile,
+        **job_payload
+    }, user_id=user_id, batch=batch)
+    return clean_broadcast_data
+
+async def schedule_source_broadcast(youtube, user_id: str, source: str, video_id: str, video_title: str,
+                                    airtime: datetime, tz_name: str, encoder_profile: Optional[str],
+                                    video_info: Optional[Dict[str, Any]] = None, image_id: Optional[str] = None,
+                                    **extra) -> Dict[str, Any]:
+    """Create and record one broadcast of an uploaded file (pass its `video_info`) or a YouTube video
+
+    An `image_id` airs an uploaded file as a still-image broadcast over that image.
+    """
+    if source == "uploaded_file":
+        job_kind, job_payload = "uploaded_video", {"file_path": video_info['file_path'], "file_id": video_id}
+        extra["source"] = "uploaded_file"
+        extra.setdefault("duration_seconds", (video_info.get("media") or {}).get("duration"))
+        if image_id:
+            job_payload["image_id"] = extra["image_id"] = image_id
+    else:
+        job_kind, job_payload = "youtube_video", {"video_id": video_id}
+    
+    local_airtime = airtime.astimezone(zone(tz_name))
+    time_12hr = local_airtime.strftime('%I:%M %p').lstrip('0').replace(':00', '')
+    live_event = await asyncio.to_thread(
+        create_live_event,
+        youtube,
+        f"🔴 LIVE: {video_title} - {time_12hr}",
+        f"Scheduled live stream: {video_title}\n\nScheduled for: {local_airtime.strftime('%Y-%m-%d %I:%M %p %Z')}",
+        airtime,
+        f"Stream for {video_title} at {local_airtime.strftime('%H:%M %Z')}"
+    )
+    return await record_scheduled_broadcast(
+        user_id, video_id, video_title, live_event, airtime, encoder_profile, job_kind, job_payload, **extra
+    )
+
+async def create_rule_occurrence(rule: Dict[str, Any], airtime: datetime):
+    """Create the broadcast for one occurrence of a recurring schedule rule"""
+    video_info = None
+    video_title = rule["video_title"]
+    if rule["source"] == "uploaded_file":
+        video_info = await db.uploaded_videos.find_one({"id": rule["video_id"], "user_id": rule["user_id"]})
+        image_info = None
+        if rule.get("image_id"):
+            image_info = await db.uploaded_videos.find_one({"id": rule["image_id"], "user_id": rule["user_id"]})
+        if not video_info or still_source_error(video_info, rule.get("image_id"), image_info):
+            raise RuleInactive(f"Uploaded video {rule['video_id']} (or its image) is missing or cannot be streamed")
+        video_title = video_info.get('custom_title', video_info['original_filename'])
+    
+    start, end = broadcast_window({"scheduled_time": airtime.isoformat(),
+                                   "duration_seconds": ((video_info or {}).get("media") or {}).get("duration")})
+    index = await load_schedule_index()
+    error = index.check(rule["user_id"], rule["video_id"], start, end, await encoder_capacity())
+    if error:
+        raise OccurrenceSkipped(error)
+    
+    youtube = await youtube_service_for_user(rule["user_id"])
+    if not youtube:
+        raise RuleInactive(f"User {rule['user_id']} no longer exists")
+    
+    await schedule_source_broadcast(
+        youtube, rule["user_id"], rule["source"], rule["video_id"], video_title, airtime, rule["timezone"],
+        rule.get("encoder_profile"), video_info=video_info, image_id=rule.get("image_id"), rule_id=rule["id"]
+    )
+
+rule_materializer = RuleMaterializer(db, create_rule_occurrence, horizon_hours=RECURRING_HORIZON_HOURS)
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
     token = credentials.credentials
@@ -618,11 +1715,47 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         raise HTTPException(status_code=401, detail="Invalid authentication")
     return User(**user)
 
+def serve_upload_file(request: Request, path: str, media_type: Optional[str] = None,
+                      headers: Optional[Dict[str, str]] = None, filename: Optional[str] = None) -> Response:
+    """Serve a file under UPLOAD_DIR with Range support, offloading to nginx when configured"""
+    relative = os.path.relpath(os.path.realpath(path), os.path.realpath(UPLOAD_DIR))
+    if relative.startswith('..'):
+        raise HTTPException(status_code=403, detail="File is outside the uploads directory")
+    
+    if UPLOADS_ACCEL_PREFIX:
+        headers = dict(headers or {})
+        headers["X-Accel-Redirect"] = f"{UPLOADS_ACCEL_PREFIX.rstrip('/')}/{quote(relative)}"
+        if filename:
+            headers["Content-Disposition"] = f"attachment; filename*=utf-8''{quote(filename)}"
+        return Response(status_code=200, headers=headers, media_type=media_type)
+    
+    return RangeFileResponse(path, request.headers.get("range"), media_type=media_type,
+                             headers=headers, filename=filename)
+
+def media_url(user_id: str, file_id: str, kind: str) -> str:
+    """API path of an upload's file ("file") or preview with a signed ticket, for <img>/<video> tags"""
+    path = f"/api/uploaded-videos/{file_id}/file" if kind == "file" else f"/api/uploaded-videos/{file_id}/preview/{kind}"
+    ticket = media_tokens.issue(MEDIA_URL_SECRET, user_id, f"upload:{file_id}:{kind}", MEDIA_URL_TTL_SECONDS)
+    return f"{path}?ticket={ticket}"
+
+async def get_media_user_id(file_id: str, kind: str, ticket: Optional[str],
+                            credentials: Optional[HTTPAuthorizationCredentials]) -> str:
+    """User id behind a media request: the bearer token if sent, else a ticket from media_url"""
+    if credentials:
+        user = await db.users.find_one({"access_token": credentials.credentials}, {"_id": 0, "id": 1})
+        if not user:
+            raise HTTPException(status_code=401, detail="Invalid authentication")
+        return user["id"]
+    user_id = media_tokens.verify(MEDIA_URL_SECRET, ticket or "", f"upload:{file_id}:{kind}")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Missing or expired media ticket")
+    return user_id
+
 async def refresh_token_if_needed(user: User) -> User:
     try:
         creds = get_credentials_from_token(user.access_token, user.refresh_token)
         if creds.expired:
-            creds.refresh(google.auth.transport.requests.Request())
+            creds.refresh(google_auth_requests.Request())
             # Update user with new token
             await db.users.update_one(
                 {"id": user.id},
@@ -639,7 +1772,7 @@ async def refresh_token_if_needed(user: User) -> User:
 async def get_auth_url():
     """Get Google OAuth URL for authentication"""
     try:
-        flow = Flow.from_client_config(
+        flow = oauth_flow.Flow.from_client_config(
             {
                 "web": {
                     "client_id": GOOGLE_CLIENT_ID,
@@ -664,7 +1797,7 @@ async def get_auth_url():
 async def auth_callback(request: AuthCallbackRequest):
     """Handle OAuth callback and store user credentials"""
     try:
-        flow = Flow.from_client_config(
+        flow = oauth_flow.Flow.from_client_config(
             {
                 "web": {
                     "client_id": GOOGLE_CLIENT_ID,
@@ -684,13 +1817,13 @@ async def auth_callback(request: AuthCallbackRequest):
         credentials = flow.credentials
         
         # Get user info from YouTube API
-        youtube = get_youtube_service(credentials)
+        youtube = await asyncio.to_thread(get_youtube_service, credentials)
         
         # Get channel information
-        channel_response = youtube.channels().list(
+        channel_response = await asyncio.to_thread(youtube.channels().list(
             part='snippet,contentDetails',
             mine=True
-        ).execute()
+        ).execute)
         
         if not channel_response.get('items'):
             raise HTTPException(status_code=400, detail="No YouTube channel found")
@@ -746,35 +1879,39 @@ async def get_user_videos(current_user: User = Depends(get_current_user)):
     try:
         user = await refresh_token_if_needed(current_user)
         creds = get_credentials_from_token(user.access_token, user.refresh_token)
-        youtube = get_youtube_service(creds)
+        youtube = await asyncio.to_thread(get_youtube_service, creds, user.id)
         
         # Get uploaded videos playlist
-        channel_response = youtube.channels().list(
+        channel_response = await asyncio.to_thread(youtube.channels().list(
             part='contentDetails',
             mine=True
-        ).execute()
+        ).execute)
         
         uploads_playlist_id = channel_response['items'][0]['contentDetails']['relatedPlaylists']['uploads']
         
         # Get videos from uploads playlist
-        videos_response = youtube.playlistItems().list(
+        videos_response = await asyncio.to_thread(youtube.playlistItems().list(
             part='snippet',
             playlistId=uploads_playlist_id,
             maxResults=50
-        ).execute()
+        ).execute)
+        
+        # Durations for the whole page in one call (1 unit) rather than one call per video
+        items = videos_response.get('items', [])
+        details = {}
+        if items:
+            video_details = await asyncio.to_thread(youtube.videos().list(
+                part='contentDetails',
+                id=','.join(item['snippet']['resourceId']['videoId'] for item in items),
+                maxResults=50
+            ).execute)
+            details = {video['id']: video for video in video_details.get('items', [])}
         
         videos = []
-        for item in videos_response.get('items', []):
+        for item in items:
             video_id = item['snippet']['resourceId']['videoId']
-            
-            # Get video details for duration
-            video_details = youtube.videos().list(
-                part='contentDetails,snippet',
-                id=video_id
-            ).execute()
-            
-            if video_details.get('items'):
-                video = video_details['items'][0]
+            video = details.get(video_id)
+            if video:
                 videos.append(YouTubeVideo(
                     id=video_id,
                     title=item['snippet']['title'],
@@ -786,6 +1923,8 @@ async def get_user_videos(current_user: User = Depends(get_current_user)):
         
         return {"videos": videos}
         
+    except QuotaError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         logging.error(f"Failed to fetch videos: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch videos")
@@ -797,190 +1936,110 @@ async def schedule_broadcast(
     background_tasks: BackgroundTasks = None
 ):
     """Schedule live broadcasts for a video"""
-    import pytz
+    tz_name = request.timezone or DEFAULT_TIMEZONE
+    try:
+        tz = zone(tz_name)
+        selected_date = resolve_date(request.selected_date, tz)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     try:
         user = await refresh_token_if_needed(current_user)
         creds = get_credentials_from_token(user.access_token, user.refresh_token)
-        youtube = get_youtube_service(creds)
+        youtube = await asyncio.to_thread(get_youtube_service, creds, user.id)
         
         # Default times if not provided
-        default_times = ["05:55", "06:55", "07:55", "16:55", "17:55"]
-        times_to_schedule = request.custom_times or default_times
+        times_to_schedule = request.custom_times or DEFAULT_SCHEDULE_TIMES
+        capacity = await encoder_capacity()
         
         scheduled_broadcasts = []
         errors = []
         
-        # Set user timezone to India (IST)
-        user_tz = pytz.timezone("Asia/Kolkata")
-        utc_tz = pytz.timezone("UTC")
-        
-        # Parse the selected date and convert from UTC to IST for date-only operations
-        selected_date_str = request.selected_date.replace('Z', '')
-        selected_date_utc = datetime.fromisoformat(selected_date_str)
-        if selected_date_utc.tzinfo is None:
-            selected_date_utc = selected_date_utc.replace(tzinfo=timezone.utc)
-        
-        # Convert to IST and get just the date part
-        selected_date_ist = selected_date_utc.astimezone(user_tz)
-        selected_date = selected_date_ist.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+        # Times already past on the selected date move to the next day
+        now_utc = datetime.now(timezone.utc)
+        now_local = now_utc.astimezone(tz)
+        slots = compute_slots(selected_date, selected_date, times_to_schedule, tz_name, now_utc, roll_past=True)
+        # Loaded once; broadcasts of this request are added to it as they are created
+        index = await load_schedule_index()
+        batch = WriteBatch(db)
         
-        # Get current time in both timezones for reference
-        now_utc = datetime.now(utc_tz)
-        now_ist = now_utc.astimezone(user_tz)
+        logging.debug(f"Current time: {now_utc} UTC, {now_local} {tz_name}")
+        logging.debug(f"Selected date: {selected_date}, times to schedule: {times_to_schedule}")
         
-        logging.info(f"Current UTC time: {now_utc}")
-        logging.info(f"Current IST time: {now_ist}")
-        logging.info(f"Selected date (naive): {selected_date}")
-        logging.info(f"Times to schedule: {times_to_schedule}")
-        
-        for time_str in times_to_schedule:
+        for position, slot in enumerate(slots):
+            time_str = slot["time"]
+            label = f"{time_str} {now_local.strftime('%Z')}"
             try:
-                # Parse time and combine with date in IST
-                hour, minute = map(int, time_str.split(':'))
-                scheduled_datetime_naive = selected_date.replace(hour=hour, minute=minute, second=0, microsecond=0)
-                
-                # Localize to IST
-                scheduled_datetime_ist = user_tz.localize(scheduled_datetime_naive)
-                
-                # If the scheduled time is in the past (same day), move it to next day
-                current_ist_naive = now_ist.replace(tzinfo=None)
-                logging.info(f"Comparing: {scheduled_datetime_naive} with current IST: {current_ist_naive}")
-                
-                if scheduled_datetime_naive <= current_ist_naive:
-                    # Add one day
-                    scheduled_datetime_naive = scheduled_datetime_naive + timedelta(days=1)
-                    scheduled_datetime_ist = user_tz.localize(scheduled_datetime_naive)
-                    logging.info(f"Time was in past, moved to next day: {scheduled_datetime_ist}")
-                
-                # Convert to UTC for YouTube API
-                scheduled_datetime_utc = scheduled_datetime_ist.astimezone(utc_tz)
-                
-                logging.info(f"Scheduling {time_str} IST -> {scheduled_datetime_utc} UTC")
+                if slot["error"]:
+                    errors.append(f"Time {label}: {slot['error']}")
+                    continue
                 
-                # Calculate time difference from now
-                time_diff = scheduled_datetime_utc - now_utc
-                minutes_from_now = time_diff.total_seconds() / 60
+                scheduled_datetime_utc = slot["airtime"]
+                scheduled_datetime_local = scheduled_datetime_utc.astimezone(tz)
+                label = f"{time_str} {scheduled_datetime_local.strftime('%Z')}"
+                logging.info(f"Scheduling {label} -> {scheduled_datetime_utc} UTC")
                 
                 # Validate scheduling constraints
-                if time_diff.total_seconds() < 180:  # 3 minutes (reduced for testing)
-                    errors.append(f"Time {time_str} IST is too soon ({int(minutes_from_now)} minutes from now). Must be at least 3 minutes in the future.")
+                lead_problem = lead_error(scheduled_datetime_utc, now_utc)
+                if lead_problem:
+                    errors.append(f"Time {label}: {lead_problem}")
                     continue
                 
-                if time_diff.days > 180:  # ~6 months
-                    errors.append(f"Time {time_str} IST is too far in the future. Maximum 6 months ahead.")
+                # Conflict and encoder capacity check against everything already scheduled
+                start, end = broadcast_window({"scheduled_time": scheduled_datetime_utc.isoformat()})
+                conflict = index.check(user.id, request.video_id, start, end, capacity)
+                if conflict:
+                    errors.append(f"Time {label}: {conflict}")
                     continue
                 
-                # Format datetime for YouTube API
-                scheduled_datetime_iso = scheduled_datetime_utc.strftime('%Y-%m-%dT%H:%M:%S.000Z')
-                
                 # Format time for display (12-hour format)
-                time_display = scheduled_datetime_ist.strftime('%I%p').lower().replace(':00', '').replace('0', '')  # e.g., "5am", "6pm"
+                time_display = scheduled_datetime_local.strftime('%I%p').lower().replace(':00', '').replace('0', '')  # e.g., "5am", "6pm"
                 
                 # Create broadcast title with time
                 broadcast_title = f"{request.video_title} - {time_display}"
                 
-                # Create live broadcast with auto-start/stop enabled
-                broadcast_body = {
-                    'snippet': {
-                        'title': f"🔴 LIVE: {broadcast_title}",
-                        'description': f"Scheduled live stream of: {request.video_title}\n\nScheduled for: {scheduled_datetime_ist.strftime('%Y-%m-%d %I:%M %p IST')}\nOriginal video: https://youtube.com/watch?v={request.video_id}",
-                        'scheduledStartTime': scheduled_datetime_iso,
-                    },
-                    'status': {
-                        'privacyStatus': 'unlisted',
-                        'selfDeclaredMadeForKids': False
-                    },
-                    'contentDetails': {
-                        'enableAutoStart': True,
-                        'enableAutoStop': True,
-                        'recordFromStart': True,
-                        'enableDvr': True,
-                        'enableContentEncryption': False,
-                        'enableEmbed': True,
-                        'projection': 'rectangular'
-                    }
-                }
-                
-                broadcast_response = youtube.liveBroadcasts().insert(
-                    part='snippet,status,contentDetails',
-                    body=broadcast_body
-                ).execute()
-                
-                broadcast_id = broadcast_response['id']
-                
-                # Create live stream
-                stream_body = {
-                    'snippet': {
-                        'title': f"Stream for {broadcast_title}"
-                    },
-                    'cdn': {
-                        'frameRate': '30fps',
-                        'ingestionType': 'rtmp',
-                        'resolution': '720p'
-                    }
-                }
-                
-                stream_response = youtube.liveStreams().insert(
-                    part='snippet,cdn',
-                    body=stream_body
-                ).execute()
-                
-                stream_id = stream_response['id']
-                stream_name = stream_response['cdn']['ingestionInfo']['streamName']
-                
-                # Bind stream to broadcast
-                youtube.liveBroadcasts().bind(
-                    part='id',
-                    id=broadcast_id,
-                    streamId=stream_id
-                ).execute()
-                
-                # Store in database
-                broadcast_data = {
-                    "id": str(uuid.uuid4()),
-                    "user_id": user.id,
-                    "video_id": request.video_id,
-                    "video_title": request.video_title,
-                    "broadcast_id": broadcast_id,
-                    "stream_id": stream_id,
-                    "scheduled_time": scheduled_datetime_utc.isoformat(),
-                    "status": 'created',
-                    "stream_url": stream_name,
-                    "watch_url": f"https://www.youtube.com/watch?v={broadcast_id}",
-                    "created_at": datetime.now(timezone.utc).isoformat()
-                }
-                
-                result = await db.scheduled_broadcasts.insert_one(broadcast_data)
-                # Remove any MongoDB ObjectId before adding to response
-                clean_broadcast_data = {k: v for k, v in broadcast_data.items() if k != '_id'}
-                scheduled_broadcasts.append(clean_broadcast_data)
+                # Create live broadcast with auto-start/stop enabled, plus its bound stream
+                live_event = await asyncio.to_thread(
+                    create_live_event,
+                    youtube,
+                    f"🔴 LIVE: {broadcast_title}",
+                    f"Scheduled live stream of: {request.video_title}\n\nScheduled for: {scheduled_datetime_local.strftime('%Y-%m-%d %I:%M %p %Z')}\nOriginal video: https://youtube.com/watch?v={request.video_id}",
+                    scheduled_datetime_utc,
+                    f"Stream for {broadcast_title}"
+                )
                 
-                # Schedule the video streaming
-                asyncio.create_task(
-                    schedule_video_stream(
-                        broadcast_id=broadcast_id,
-                        stream_key=stream_name,
-                        video_id=request.video_id,
-                        start_time=scheduled_datetime_utc
-                    )
+                # Store in database and queue the video streaming, before the next slot is created
+                broadcast = await record_scheduled_broadcast(
+                    user.id, request.video_id, request.video_title, live_event, scheduled_datetime_utc,
+                    request.encoder_profile, "youtube_video", {"video_id": request.video_id}, batch=batch
                 )
+                scheduled_broadcasts.append(broadcast)
+                await store_created_broadcasts(batch, [broadcast])
                 
-                logging.info(f"Successfully scheduled broadcast and video stream for {time_str} IST ({scheduled_datetime_utc} UTC)")
+                logging.info(f"Successfully scheduled broadcast and video stream for {label} ({scheduled_datetime_utc} UTC)")
                 
+            except QuotaError as quota_error:
+                # The remaining times would fail the same way; stop instead of spending more calls
+                errors.append(f"Time {label}: {quota_error}")
+                errors.extend(f"Time {later['time']}: not attempted, YouTube API quota exhausted" for later in slots[position + 1:])
+                logging.error(f"Stopped scheduling at {time_str}: {quota_error}")
+                break
             except HttpError as youtube_error:
-                error_details = str(youtube_error)
-                if "invalidScheduledStartTime" in error_details:
-                    errors.append(f"Time {time_str} IST: YouTube rejected the scheduling time. Try a time further in the future.")
+                reason = error_reason(youtube_error)
+                if reason == "invalidScheduledStartTime":
+                    errors.append(f"Time {label}: YouTube rejected the scheduling time. Try a time further in the future.")
                 else:
-                    errors.append(f"Time {time_str} IST: YouTube API error - {str(youtube_error)}")
+                    errors.append(f"Time {label}: YouTube API error ({reason or youtube_error.resp.status}) - {youtube_error.reason}")
                 logging.error(f"YouTube API error for {time_str}: {youtube_error}")
             except Exception as slot_error:
-                errors.append(f"Time {time_str} IST: Failed to schedule - {str(slot_error)}")
+                errors.append(f"Time {label}: Failed to schedule - {str(slot_error)}")
                 logging.error(f"Error scheduling {time_str}: {slot_error}")
         
+        # Retries whatever a per-slot commit failed to store
+        await commit_schedule_batch(batch, [])
+        
         # Prepare response
-        response_message = f"Successfully scheduled {len(scheduled_broadcasts)} broadcasts for IST timezone"
+        response_message = f"Successfully scheduled {len(scheduled_broadcasts)} broadcasts for {tz_name}"
         if errors:
             response_message += f". {len(errors)} failed"
         
@@ -991,62 +2050,309 @@ async def schedule_broadcast(
             "success_count": len(scheduled_broadcasts),
             "error_count": len(errors),
             "timezone_info": {
-                "user_timezone": "Asia/Kolkata (IST)",
-                "current_ist_time": now_ist.strftime('%Y-%m-%d %H:%M:%S IST'),
+                "user_timezone": f"{tz_name} ({now_local.strftime('%Z')})",
+                "current_local_time": now_local.strftime('%Y-%m-%d %H:%M:%S %Z'),
                 "current_utc_time": now_utc.strftime('%Y-%m-%d %H:%M:%S UTC')
             }
         }
         
     except Exception as e:
-        logging.error(f"Failed to schedule broadcasts: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to schedule broadcasts: {str(e)}")
+        logging.error(f"Failed to schedule broadcasts: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to schedule broadcasts: {str(e)}")
+
+@api_router.post("/schedule/bulk")
+async def schedule_bulk(request: BulkScheduleRequest, current_user: User = Depends(get_current_user)):
+    """Schedule many sources across many dates and times, streaming per-slot results as NDJSON
+
+    Every slot is validated before any broadcast is created. The stream starts
+    with a "plan" line, then one "result" line per slot (invalid ones first, the
+    rest as they are created) and ends with a "summary" line.
+    """
+    try:
+        zone(request.timezone)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        entries = [entry.dict() for entry in request.entries]
+        slots = expand_slots(entries, request.timezone, DEFAULT_SCHEDULE_TIMES)
+        if len(slots) > BULK_SCHEDULE_MAX_SLOTS:
+            raise HTTPException(status_code=400, detail=f"Too many slots ({len(slots)}); at most {BULK_SCHEDULE_MAX_SLOTS} per request")
+        
+        # Uploaded sources are loaded with one query
+        file_ids = [entry["video_id"] for entry in entries if entry["source"] == "uploaded_file"]
+        file_ids += [entry["image_id"] for entry in entries if entry["image_id"]]
+        uploads = {}
+        if file_ids:
+            async for video in db.uploaded_videos.find({"id": {"$in": file_ids}, "user_id": current_user.id}, {"_id": 0}):
+                uploads[video["id"]] = video
+        
+        durations = {}
+        for index, entry in enumerate(entries):
+            video_info = uploads.get(entry["video_id"]) if entry["source"] == "uploaded_file" else None
+            error = None
+            if entry["source"] not in ("youtube_video", "uploaded_file"):
+                error = "source must be youtube_video or uploaded_file"
+            elif entry["source"] == "uploaded_file" and not video_info:
+                error = "Video not found"
+            elif video_info:
+                error = still_source_error(video_info, entry["image_id"], uploads.get(entry["image_id"]))
+            elif entry["image_id"]:
+                error = "image_id is only supported for uploaded_file entries"
+            elif not entry["video_title"]:
+                error = "video_title is required for youtube_video entries"
+            if video_info:
+                entry["video_title"] = entry["video_title"] or video_info.get('custom_title', video_info['original_filename'])
+                durations[index] = entry["duration_seconds"] or (video_info.get("media") or {}).get("duration")
+            else:
+                durations[index] = entry["duration_seconds"]
+            if error:
+                for slot in slots:
+                    if slot["entry"] == index and not slot["error"]:
+                        slot["error"] = error
+        
+        index = await load_schedule_index()
+        validate_slots(slots, datetime.now(timezone.utc), durations, index, current_user.id, await encoder_capacity())
+        valid = [slot for slot in slots if not slot["error"]]
+        
+        # Slots beyond today's remaining quota are refused up front, not left half-created
+        remaining_units = youtube_quota.remaining()
+        affordable = remaining_units // LIVE_EVENT_QUOTA_UNITS
+        for slot in valid[affordable:]:
+            slot["error"] = f"Not enough YouTube API quota today ({LIVE_EVENT_QUOTA_UNITS} units per slot, {remaining_units} remain for {affordable} slots)"
+        valid = valid[:affordable]
+        
+        youtube_services = asyncio.Queue()
+        if valid and not request.dry_run:
+            user = await refresh_token_if_needed(current_user)
+            creds = get_credentials_from_token(user.access_token, user.refresh_token)
+            # API clients are not thread-safe, so each concurrent creation gets its own
+            concurrency = max(1, min(request.concurrency, BULK_SCHEDULE_MAX_CONCURRENCY, len(valid)))
+            for _ in range(concurrency):
+                youtube_services.put_nowait(await asyncio.to_thread(get_youtube_service, creds, user.id))
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Failed to plan bulk schedule: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to plan bulk schedule: {str(e)}")
+    
+    def line(data: Dict[str, Any]) -> str:
+        return json.dumps(data, default=str) + "\n"
+    
+    def slot_result(slot: Dict[str, Any], result_status: str, **details) -> str:
+        return line({
+            "type": "result",
+            "index": slot["index"],
+            "entry": slot["entry"],
+            "video_id": slot["video_id"],
+            "date": slot["date"],
+            "time": slot["time"],
+            "status": result_status,
+            **details
+        })
+    
+    # Each created broadcast is stored before its result is reported; slots finishing while a
+    # write is in flight share the next one
+    batch = WriteBatch(db)
+    batched: List[Dict[str, Any]] = []
+    write_errors: List[str] = []
+    commit_lock = asyncio.Lock()
+    
+    async def commit():
+        async with commit_lock:
+            if not len(batch):
+                return
+            added = batched[:]
+            batched.clear()
+            try:
+                await commit_schedule_batch(batch, added)
+            except Exception as e:
+                write_errors.append(f"Failed to store {len(added)} created broadcasts: {e}")
+    
+    async def create(slot: Dict[str, Any]) -> tuple[bool, str]:
+        entry = entries[slot["entry"]]
+        youtube = await youtube_services.get()
+        try:
+            broadcast = await schedule_source_broadcast(
+                youtube, current_user.id, entry["source"], entry["video_id"], entry["video_title"],
+                slot["airtime"], request.timezone, entry["encoder_profile"],
+                video_info=uploads.get(entry["video_id"]), image_id=entry["image_id"],
+                duration_seconds=durations.get(slot["entry"]), batch=batch
+            )
+            batched.append(broadcast)
+            await asyncio.shield(commit())
+            return True, slot_result(slot, "created", broadcast=broadcast)
+        except QuotaError as e:
+            # Later slots fail fast in the budget without reaching YouTube
+            return False, slot_result(slot, "failed", error=str(e), retry_at=e.retry_at.isoformat())
+        except Exception as e:
+            logging.error(f"Bulk schedule slot {slot['index']} failed: {e}")
+            return False, slot_result(slot, "failed", error=str(e))
+        finally:
+            youtube_services.put_nowait(youtube)
+    
+    async def results():
+        yield line({"type": "plan", "total": len(slots), "valid": len(valid), "invalid": len(slots) - len(valid),
+                    "dry_run": request.dry_run, "quota_units": len(valid) * LIVE_EVENT_QUOTA_UNITS,
+                    "quota_remaining": remaining_units})
+        for slot in slots:
+            if slot["error"]:
+                yield slot_result(slot, "invalid", error=slot["error"])
+        
+        created = failed = 0
+        if request.dry_run:
+            for slot in valid:
+                yield slot_result(slot, "valid", scheduled_time=slot["airtime"].isoformat())
+        else:
+            # Detached: if the client disconnects, slots already under way are still created and stored
+            tasks = [detach(asyncio.create_task(create(slot))) for slot in valid]
+            # The service pool bounds concurrency; results stream in completion order
+            for task in asyncio.as_completed(tasks):
+                ok, result = await task
+                if ok:
+                    created += 1
+                else:
+                    failed += 1
+                yield result
+            # Retries whatever an earlier commit failed to store
+            await commit()
+        
+        yield line({"type": "summary", "created": created, "failed": failed, "invalid": len(slots) - len(valid),
+                    "write_errors": write_errors})
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@api_router.get("/schedule/capacity")
+async def get_schedule_capacity(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    step_minutes: int = 60,
+    current_user: User = Depends(get_current_user)
+):
+    """Free encoder slots per time window (default: the next 48 hours in 1-hour windows)"""
+    try:
+        now = datetime.now(timezone.utc)
+        window_start = datetime.fromisoformat(start.replace('Z', '+00:00')) if start else now
+        window_end = datetime.fromisoformat(end.replace('Z', '+00:00')) if end else window_start + timedelta(hours=48)
+        if window_start.tzinfo is None:
+            window_start = window_start.replace(tzinfo=timezone.utc)
+        if window_end.tzinfo is None:
+            window_end = window_end.replace(tzinfo=timezone.utc)
+        step = timedelta(minutes=max(step_minutes, 1))
+        if window_end <= window_start or (window_end - window_start) / step > SCHEDULE_CAPACITY_MAX_WINDOWS:
+            raise HTTPException(status_code=400, detail=f"Invalid range; at most {SCHEDULE_CAPACITY_MAX_WINDOWS} windows")
+        
+        capacity = await encoder_capacity()
+        index = await load_schedule_index()
+        return {
+            "capacity": capacity,
+            "windows": index.capacity_windows(window_start, window_end, step, capacity)
+        }
+    
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date format: {str(e)}")
+    except Exception as e:
+        logging.error(f"Failed to compute schedule capacity: {e}")
+        raise HTTPException(status_code=500, detail="Failed to compute schedule capacity")
 
 @api_router.get("/validate-schedule")
-async def validate_schedule_time(date: str, time: str):
-    """Validate if a schedule time is acceptable"""
+async def validate_schedule_time(date: str, time: str, timezone_name: str = Query("UTC", alias="timezone")):
+    """Validate if a schedule time is acceptable (one time; the form uses POST /schedule/preview)"""
     try:
-        # Parse the datetime
-        selected_date = datetime.fromisoformat(date.replace('Z', ''))
-        if selected_date.tzinfo is None:
-            selected_date = selected_date.replace(tzinfo=timezone.utc)
-        
-        hour, minute = map(int, time.split(':'))
-        scheduled_datetime = selected_date.replace(hour=hour, minute=minute, second=0, microsecond=0)
-        
-        if scheduled_datetime.tzinfo is None:
-            scheduled_datetime = scheduled_datetime.replace(tzinfo=timezone.utc)
-        
+        tz = zone(timezone_name)
+        day = resolve_date(date, tz)
         now = datetime.now(timezone.utc)
-        time_diff = scheduled_datetime - now
-        
-        validation_result = {
-            "valid": True,
-            "message": "Schedule time is valid",
+        slot = compute_slots(day, day, [time], timezone_name, now)[0]
+        if slot["error"]:
+            raise ValueError(slot["error"])
+        scheduled_datetime = slot["airtime"]
+        error = lead_error(scheduled_datetime, now)
+        return {
+            "valid": error is None,
+            "message": error or "Schedule time is valid",
             "scheduled_time": scheduled_datetime.isoformat(),
-            "minutes_from_now": int(time_diff.total_seconds() / 60)
+            "local_time": slot["local_time"],
+            "minutes_from_now": int((scheduled_datetime - now).total_seconds() / 60)
         }
         
-        # Check constraints
-        if time_diff.total_seconds() < 180:  # 3 minutes (reduced for testing)
-            validation_result["valid"] = False
-            validation_result["message"] = "Must be at least 3 minutes in the future"
-        elif time_diff.days > 180:  # ~6 months
-            validation_result["valid"] = False
-            validation_result["message"] = "Cannot schedule more than 6 months in advance"
-        elif scheduled_datetime <= now:
-            validation_result["valid"] = False
-            validation_result["message"] = "Schedule time must be in the future"
-        
-        return validation_result
-        
     except Exception as e:
         return {
             "valid": False,
             "message": f"Invalid date/time format: {str(e)}",
-            "scheduled_time": None,
             "minutes_from_now": 0
         }
 
+@api_router.post("/schedule/preview")
+async def preview_schedule(request: SchedulePreviewRequest, current_user: User = Depends(get_current_user)):
+    """Validate every (date, time) of a scheduling form in one call, with UTC airtimes
+
+    Each slot gets its UTC and local airtime, whether it rolled over to the
+    next day or was moved by a DST change, and the reason it cannot be
+    scheduled (lead time limits and, when video_id is given, overlaps and
+    encoder capacity), if any.
+    """
+    try:
+        tz = zone(request.timezone)
+        start_date = resolve_date(request.start_date, tz)
+        end_date = resolve_date(request.end_date, tz) if request.end_date else start_date
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date is before start_date")
+    
+    times = request.times or DEFAULT_SCHEDULE_TIMES
+    slot_count = ((end_date - start_date).days + 1) * len(times)
+    if slot_count > BULK_SCHEDULE_MAX_SLOTS:
+        raise HTTPException(status_code=400, detail=f"Too many slots ({slot_count}); at most {BULK_SCHEDULE_MAX_SLOTS} per request")
+    
+    try:
+        now = datetime.now(timezone.utc)
+        # Rolling past times forward only makes sense when the next day is not in the range already
+        slots = compute_slots(start_date, end_date, times, request.timezone, now,
+                              roll_past=request.roll_past and start_date == end_date)
+        
+        if request.video_id:
+            duration = request.duration_seconds
+            if request.source == "uploaded_file" and duration is None:
+                video_info = await db.uploaded_videos.find_one({"id": request.video_id, "user_id": current_user.id},
+                                                               {"_id": 0, "media.duration": 1})
+                duration = ((video_info or {}).get("media") or {}).get("duration")
+            for slot in slots:
+                slot["video_id"] = request.video_id
+            validate_slots(slots, now, {None: duration}, await load_schedule_index(), current_user.id, await encoder_capacity())
+        else:
+            for slot in slots:
+                if not slot["error"]:
+                    slot["error"] = lead_error(slot["airtime"], now)
+        
+        results = [{
+            "index": slot["index"],
+            "date": slot["date"],
+            "time": slot["time"],
+            "valid": not slot["error"],
+            "message": slot["error"] or "Schedule time is valid",
+            "scheduled_time": slot["airtime"].isoformat() if slot["airtime"] else None,
+            "local_time": slot["local_time"],
+            "minutes_from_now": int((slot["airtime"] - now).total_seconds() / 60) if slot["airtime"] else None,
+            "rolled_over": slot["rolled_over"],
+            "dst": slot["dst"],
+        } for slot in slots]
+        valid_count = sum(1 for result in results if result["valid"])
+        return {
+            "timezone": request.timezone,
+            "current_local_time": now.astimezone(tz).isoformat(),
+            "slots": results,
+            "valid_count": valid_count,
+            "error_count": len(results) - valid_count,
+        }
+    
+    except Exception as e:
+        logging.error(f"Failed to preview schedule: {e}")
+        raise HTTPException(status_code=500, detail="Failed to preview schedule")
+
 @api_router.get("/broadcasts")
 async def get_user_broadcasts(current_user: User = Depends(get_current_user)):
     """Get user's scheduled broadcasts"""
@@ -1087,15 +2393,26 @@ async def delete_broadcast(
         # Delete from YouTube if still exists
         user = await refresh_token_if_needed(current_user)
         creds = get_credentials_from_token(user.access_token, user.refresh_token)
-        youtube = get_youtube_service(creds)
+        youtube = await asyncio.to_thread(get_youtube_service, creds, user.id)
         
         try:
-            youtube.liveBroadcasts().delete(id=broadcast['broadcast_id']).execute()
+            await asyncio.to_thread(youtube.liveBroadcasts().delete(id=broadcast['broadcast_id']).execute)
         except HttpError:
             pass  # Broadcast might already be deleted
+        except QuotaError as e:
+            logging.warning(f"Broadcast {broadcast['broadcast_id']} left on YouTube: {e}")
+        
+        # Cancel its stream job; the owning worker stops FFmpeg if it is already live
+        await cancel_jobs(db, broadcast['broadcast_id'])
         
         # Delete from database
         await db.scheduled_broadcasts.delete_one({"id": broadcast_id})
+        await schedule_changed(removed_id=broadcast_id)
+        await events.publish("broadcast", current_user.id, {
+            "id": broadcast_id,
+            "broadcast_id": broadcast['broadcast_id'],
+            "deleted": True
+        })
         
         return {"message": "Broadcast deleted successfully"}
         
@@ -1199,45 +2516,25 @@ async def test_streaming(
         logging.info(f"Extracted video URL: {video_url[:100]}...")
         
         # Test RTMP URL construction
-        rtmp_url = f"rtmp://a.rtmp.youtube.com/live2/{stream_key}"
+        rtmp_url = youtube_rtmp_url(stream_key)
         logging.info(f"RTMP URL: {rtmp_url}")
         
-        # Test FFmpeg command construction
-        cmd = [
-            'ffmpeg',
-            '-re',
-            '-i', video_url,
-            '-c:v', 'libx264',
-            '-c:a', 'aac',
-            '-preset', 'veryfast',
-            '-maxrate', '3000k',
-            '-bufsize', '6000k',
-            '-vf', 'scale=-2:720',
-            '-g', '50',
-            '-f', 'flv',
-            '-t', '30',  # Only stream for 30 seconds for testing
-            rtmp_url
-        ]
-        
-        logging.info(f"FFmpeg command: {' '.join(cmd)}")
-        
-        # Start FFmpeg process with detailed logging
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            stdin=subprocess.PIPE
+        handle = await stream_video_to_rtmp(
+            video_url,
+            rtmp_url,
+            duration_seconds=30,  # Only stream for 30 seconds for testing
+            encoder_profile=await get_encoder_profile(DEFAULT_PROFILE_NAME),
+            key=f"test_stream_{video_id}_{int(time.time())}"
         )
+        if not handle:
+            return {"success": False, "error": "FFmpeg process could not be started", "rtmp_url": rtmp_url}
         
         # Wait a bit and check if process is still running
-        time.sleep(5)
-        
-        if process.poll() is None:
-            # Process is still running
+        if await supervisor.wait_started(handle, 5):
             logging.info("FFmpeg process started successfully and is running")
             
             # Kill the test process after checking
-            process.terminate()
+            await supervisor.stop(handle.key)
             
             return {
                 "success": True,
@@ -1249,15 +2546,13 @@ async def test_streaming(
             }
         else:
             # Process died, get error output
-            stdout, stderr = process.communicate()
-            logging.error(f"FFmpeg failed. STDOUT: {stdout.decode()}")
-            logging.error(f"FFmpeg failed. STDERR: {stderr.decode()}")
+            output = handle.output()
+            logging.error(f"FFmpeg failed. Output: {output}")
             
             return {
                 "success": False,
                 "error": "FFmpeg process failed",
-                "stdout": stdout.decode()[-500:],  # Last 500 chars
-                "stderr": stderr.decode()[-500:],  # Last 500 chars
+                "output": output[-500:],  # Last 500 chars
                 "video_url": video_url[:100] + "...",
                 "rtmp_url": rtmp_url,
                 "extraction_method": extraction_info
@@ -1277,59 +2572,29 @@ async def test_simple_streaming(
         logging.info(f"Testing simple stream with stream key {stream_key}")
         
         # Use a simple test pattern instead of YouTube video
-        rtmp_url = f"rtmp://a.rtmp.youtube.com/live2/{stream_key}"
+        rtmp_url = youtube_rtmp_url(stream_key)
         logging.info(f"RTMP URL: {rtmp_url}")
         
-        # Create a simple test pattern using FFmpeg
-        cmd = [
-            'ffmpeg', '-y',
-            '-f', 'lavfi',
-            '-i', 'testsrc2=size=1280x720:rate=30',
-            '-f', 'lavfi', 
-            '-i', 'sine=frequency=1000:sample_rate=44100',
-            '-c:v', 'libx264',
-            '-c:a', 'aac',
-            '-preset', 'veryfast',
-            '-tune', 'zerolatency',
-            '-pix_fmt', 'yuv420p',
-            '-maxrate', '2500k',
-            '-bufsize', '5000k',
-            '-vf', 'drawtext=text="Test Stream %{localtime}":fontcolor=white:fontsize=24:x=10:y=10',
-            '-r', '30',
-            '-g', '60',
-            '-keyint_min', '30',
-            '-sc_threshold', '0',
-            '-b:v', '2000k',
-            '-b:a', '128k',
-            '-ar', '44100',
-            '-f', 'flv',
-            '-flvflags', 'no_duration_filesize',
-            '-t', '60',  # Stream for 60 seconds
-            rtmp_url
-        ]
-        
-        logging.info(f"FFmpeg command: {' '.join(cmd)}")
-        
-        # Start FFmpeg process
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            stdin=subprocess.PIPE,
-            universal_newlines=True,
-            bufsize=1
+        test_key = f"test_simple_{int(time.time())}"
+        handle = await start_pipeline(
+            test_key,
+            StreamSource.lavfi('testsrc2=size=1280x720:rate=30', 'sine=frequency=1000:sample_rate=44100'),
+            [rtmp_url],
+            method="simple_test",
+            profile=await get_encoder_profile(DEFAULT_PROFILE_NAME),
+            analysis={"height": 720, "fps": 30},
+            video_filter='drawtext=text="Test Stream %{localtime}":fontcolor=white:fontsize=24:x=10:y=10',
+            duration_seconds=60  # Stream for 60 seconds
         )
         
         # Wait a bit and check if process is running
-        time.sleep(3)
-        
-        if process.poll() is None:
+        if await supervisor.wait_started(handle, 3):
             logging.info("Simple test stream started successfully")
             
             # Store process info
             await db.streaming_processes.insert_one({
-                "broadcast_id": f"test_simple_{int(time.time())}",
-                "process_id": process.pid,
+                "broadcast_id": test_key,
+                "process_id": handle.pid,
                 "started_at": datetime.now(timezone.utc),
                 "video_id": "test_pattern",
                 "stream_type": "simple_test"
@@ -1339,19 +2604,19 @@ async def test_simple_streaming(
                 "success": True,
                 "message": "Simple test stream started successfully",
                 "rtmp_url": rtmp_url,
-                "process_id": process.pid,
+                "process_id": handle.pid,
                 "stream_duration": "60 seconds",
                 "test_pattern": "Color bars with timestamp and 1kHz tone"
             }
         else:
             # Process failed, get error output
-            stdout, stderr = process.communicate()
-            logging.error(f"Simple stream FFmpeg failed. Output: {stdout}")
+            output = handle.output()
+            logging.error(f"Simple stream FFmpeg failed. Output: {output}")
             
             return {
                 "success": False,
                 "error": "FFmpeg process failed to start",
-                "output": stdout[-500:] if stdout else "No output",
+                "output": output[-500:] if output else "No output",
                 "rtmp_url": rtmp_url
             }
             
@@ -1361,6 +2626,7 @@ async def test_simple_streaming(
 
 @api_router.post("/upload-video")
 async def upload_video(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user)
 ):
@@ -1369,57 +2635,101 @@ async def upload_video(
         import os
         
         # Validate file type and size
-        if not file.filename.lower().endswith(('.mp4', '.avi', '.mov', '.mkv', '.wmv')):
-            raise HTTPException(status_code=400, detail="Only video files are allowed")
+        media_kind = upload_media_kind(file.filename)
+        if not media_kind:
+            raise HTTPException(status_code=400, detail="Only video, audio and image files are allowed")
         
         # Check content length if available
-        if hasattr(file, 'size') and file.size > 2 * 1024 * 1024 * 1024:  # 2GB
+        if file.size is not None and file.size > MAX_UPLOAD_BYTES:
             raise HTTPException(status_code=413, detail="File too large. Maximum size is 2GB.")
         
-        # Create uploads directory if it doesn't exist
-        upload_dir = "/app/uploads"
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Generate unique filename
-        file_id = str(uuid.uuid4())
-        file_extension = os.path.splitext(file.filename)[1]
-        saved_filename = f"{file_id}{file_extension}"
-        file_path = os.path.join(upload_dir, saved_filename)
-        
-        # Save uploaded file
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        file_size = os.path.getsize(file_path)
-        
-        # Store file info in database
-        file_info = {
-            "id": file_id,
-            "user_id": current_user.id,
-            "original_filename": file.filename,
-            "custom_title": file.filename.rsplit('.', 1)[0],  # Default to filename without extension
-            "saved_filename": saved_filename,
-            "file_path": file_path,
-            "file_size": file_size,
-            "upload_time": datetime.now(timezone.utc).isoformat(),
-            "content_type": file.content_type
-        }
+        # Hold quota for the upload before writing anything; the copy stops at the reserved size
+        reserved_bytes = file.size if file.size is not None else MAX_UPLOAD_BYTES
+        reservation_id = await storage.reserve_upload(current_user.id, reserved_bytes)
         
-        await db.uploaded_videos.insert_one(file_info)
+        file_path = None
+        try:
+            # Create uploads directory if it doesn't exist
+            upload_dir = UPLOAD_DIR
+            os.makedirs(upload_dir, exist_ok=True)
+            
+            # Generate unique filename
+            file_id = str(uuid.uuid4())
+            file_extension = os.path.splitext(file.filename)[1]
+            saved_filename = f"{file_id}{file_extension}"
+            file_path = os.path.join(upload_dir, saved_filename)
+            
+            # Save uploaded file (copied in chunks off the event loop)
+            with open(file_path, "wb") as buffer:
+                await asyncio.to_thread(storage.copy_upload, file.file, buffer, reserved_bytes)
+            
+            file_size = os.path.getsize(file_path)
+            UPLOAD_BYTES.inc(file_size)
+            
+            # Store file info in database
+            file_info = {
+                "id": file_id,
+                "user_id": current_user.id,
+                "original_filename": file.filename,
+                "custom_title": file.filename.rsplit('.', 1)[0],  # Default to filename without extension
+                "saved_filename": saved_filename,
+                "file_path": file_path,
+                "file_size": file_size,
+                "upload_time": datetime.now(timezone.utc).isoformat(),
+                "content_type": file.content_type,
+                "media_kind": media_kind,
+                "probe_status": "pending"
+            }
+            
+            await db.uploaded_videos.insert_one(file_info)
+        except BaseException:
+            # Partial or unrecorded files would only count against the disk
+            if file_path and os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+        finally:
+            # The upload is counted through its uploaded_videos record now, or has failed
+            await storage.release_upload(reservation_id)
+        
+        # Validate and index the media after responding
+        background_tasks.add_task(probe_uploaded_video, file_id)
         
         return {
             "success": True,
             "file_id": file_id,
             "filename": file.filename,
             "size_mb": round(file_size / 1024 / 1024, 2),
+            "media_kind": media_kind,
+            "probe_status": "pending",
             "message": "Video uploaded successfully"
         }
         
+    except HTTPException:
+        raise
+    except QuotaExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         logging.error(f"Video upload failed: {e}")
         raise HTTPException(status_code=500, detail="Video upload failed")
 
+@api_router.get("/storage/usage")
+async def get_storage_usage(current_user: User = Depends(get_current_user)):
+    """Upload usage against quotas, source cache size and free disk space"""
+    try:
+        return await storage.usage_report(current_user.id)
+    except Exception as e:
+        logging.error(f"Failed to get storage usage: {e}")
+        raise HTTPException(status_code=500, detail="Failed to get storage usage")
+
+@api_router.get("/youtube/quota")
+async def get_youtube_quota(current_user: User = Depends(get_current_user)):
+    """Today's YouTube API units from the quota ledger: project total, per method and this user's share"""
+    try:
+        return await youtube_quota.usage(db, current_user.id)
+    except Exception as e:
+        logging.error(f"Failed to get YouTube quota usage: {e}")
+        raise HTTPException(status_code=500, detail="Failed to get YouTube quota usage")
+
 @api_router.get("/uploaded-videos")
 async def get_uploaded_videos(current_user: User = Depends(get_current_user)):
     """Get list of uploaded videos for current user"""
@@ -1433,6 +2743,10 @@ async def get_uploaded_videos(current_user: User = Depends(get_current_user)):
             # Remove MongoDB ObjectId to avoid serialization issues
             if "_id" in video:
                 del video["_id"]
+            # Signed URLs for <img>/<video> tags, which cannot send the Authorization header
+            video["file_url"] = media_url(current_user.id, video["id"], "file")
+            if video.get("preview_status") == "ready":
+                video["preview_urls"] = {kind: media_url(current_user.id, video["id"], kind) for kind in PREVIEW_FILES}
             videos.append(video)
         
         return {"videos": videos}
@@ -1454,6 +2768,7 @@ async def delete_uploaded_video(file_id: str, current_user: User = Depends(get_c
         # Delete physical file
         if os.path.exists(video_info['file_path']):
             os.remove(video_info['file_path'])
+        shutil.rmtree(preview_dir(UPLOAD_DIR, file_id), ignore_errors=True)
         
         # Delete from database
         await db.uploaded_videos.delete_one({"id": file_id, "user_id": current_user.id})
@@ -1464,6 +2779,70 @@ async def delete_uploaded_video(file_id: str, current_user: User = Depends(get_c
         logging.error(f"Failed to delete video: {e}")
         raise HTTPException(status_code=500, detail="Failed to delete video")
 
+@api_router.get("/uploaded-videos/{file_id}/preview/{kind}")
+async def get_uploaded_video_preview(
+    file_id: str,
+    kind: str,
+    request: Request,
+    ticket: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    """Serve a cached poster, seek sprite or preview clip for an uploaded video"""
+    import os
+    
+    if kind not in PREVIEW_FILES:
+        raise HTTPException(status_code=404, detail="Unknown preview type")
+    user_id = await get_media_user_id(file_id, kind, ticket, credentials)
+    
+    video_info = await db.uploaded_videos.find_one(
+        {"id": file_id, "user_id": user_id},
+        {"_id": 0, "preview_status": 1}
+    )
+    if not video_info:
+        raise HTTPException(status_code=404, detail="Video not found")
+    
+    filename, media_type = PREVIEW_FILES[kind]
+    path = os.path.join(preview_dir(UPLOAD_DIR, file_id), filename)
+    if video_info.get("preview_status") != "ready" or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"Preview not available ({video_info.get('preview_status', 'pending')})")
+    
+    stat = os.stat(path)
+    etag = f'"{file_id}-{kind}-{int(stat.st_mtime)}-{stat.st_size}"'
+    headers = {
+        # Previews never change for a given file id; they are regenerated under a new mtime
+        "Cache-Control": "private, max-age=604800",
+        "ETag": etag
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    return serve_upload_file(request, path, media_type=media_type, headers=headers)
+
+@api_router.api_route("/uploaded-videos/{file_id}/file", methods=["GET", "HEAD"])
+async def get_uploaded_video_file(
+    file_id: str,
+    request: Request,
+    download: bool = False,
+    ticket: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    """Stream an uploaded file back with HTTP Range support (seekable in <video>)"""
+    import os
+    import mimetypes
+    
+    user_id = await get_media_user_id(file_id, "file", ticket, credentials)
+    video_info = await db.uploaded_videos.find_one({"id": file_id, "user_id": user_id})
+    if not video_info:
+        raise HTTPException(status_code=404, detail="Video not found")
+    
+    path = video_info["file_path"]
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="File missing on disk")
+    
+    media_type = mimetypes.guess_type(path)[0] or video_info.get("content_type") or "application/octet-stream"
+    filename = video_info["original_filename"] if download else None
+    return serve_upload_file(request, path, media_type=media_type, filename=filename)
+
 @api_router.put("/uploaded-videos/{file_id}/title")
 async def update_video_title(
     file_id: str,
@@ -1491,175 +2870,187 @@ async def update_video_title(
         logging.error(f"Failed to update title: {e}")
         raise HTTPException(status_code=500, detail="Failed to update title")
 
+@api_router.get("/encoder-profiles")
+async def list_encoder_profiles(current_user: User = Depends(get_current_user)):
+    """List available encoder profiles"""
+    try:
+        profiles = await db.encoder_profiles.find({}, {"_id": 0}).sort("name", 1).to_list(100)
+        return {"profiles": profiles, "default": DEFAULT_PROFILE_NAME}
+    except Exception as e:
+        logging.error(f"Failed to list encoder profiles: {e}")
+        raise HTTPException(status_code=500, detail="Failed to list encoder profiles")
+
+@api_router.put("/encoder-profiles/{name}")
+async def update_encoder_profile(
+    name: str,
+    request: EncoderProfileUpdate,
+    current_user: User = Depends(get_current_user)
+):
+    """Create or update a named encoder profile (admins only; profiles are shared by all users)"""
+    if current_user.channel_id not in ADMIN_CHANNEL_IDS:
+        raise HTTPException(status_code=403, detail="Only administrators can edit encoder profiles")
+    try:
+        updates = {k: v for k, v in request.dict().items() if v is not None}
+        
+        base = dict(DEFAULT_ENCODER_PROFILES.get(name) or DEFAULT_ENCODER_PROFILES[DEFAULT_PROFILE_NAME])
+        existing = await db.encoder_profiles.find_one({"name": name}, {"_id": 0})
+        profile = {**base, **(existing or {}), **updates, "name": name}
+        
+        await db.encoder_profiles.replace_one({"name": name}, profile, upsert=True)
+        return {"message": "Encoder profile saved", "profile": profile}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Failed to update encoder profile: {e}")
+        raise HTTPException(status_code=500, detail="Failed to update encoder profile")
+
+@api_router.get("/uploaded-videos/{file_id}/analysis")
+async def analyze_uploaded_video(
+    file_id: str,
+    refresh: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """Report indexed media metadata and the profile that would be auto-selected"""
+    try:
+        video_info = await db.uploaded_videos.find_one({"id": file_id, "user_id": current_user.id})
+        if not video_info:
+            raise HTTPException(status_code=404, detail="Video not found")
+        
+        if refresh or not video_info.get("media"):
+            await probe_uploaded_video(file_id)
+            video_info = await db.uploaded_videos.find_one({"id": file_id})
+        
+        analysis = video_info.get("media")
+        if not analysis:
+            raise HTTPException(status_code=422, detail=video_info.get("probe_error") or "Could not analyze video")
+        
+        return {
+            "analysis": analysis,
+            "stream_ready": video_info.get("stream_ready", False),
+            "remuxed": video_info.get("remuxed", False),
+            "recommended_profile": select_profile_name(analysis)
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Failed to analyze video: {e}")
+        raise HTTPException(status_code=500, detail="Failed to analyze video")
+
 @api_router.post("/schedule/uploaded-video")
 async def schedule_uploaded_video(
     request: dict,
     current_user: User = Depends(get_current_user)
 ):
     """Schedule broadcasts using uploaded video"""
-    import pytz
-    
     try:
         file_id = request["file_id"]
-        selected_date = request["selected_date"] 
         custom_times = request.get("custom_times")
+        encoder_profile = request.get("encoder_profile")
+        tz_name = request.get("timezone") or DEFAULT_TIMEZONE
+        try:
+            tz = zone(tz_name)
+            selected_date = resolve_date(request["selected_date"], tz)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         # Get uploaded video info
         video_info = await db.uploaded_videos.find_one({"id": file_id, "user_id": current_user.id})
         if not video_info:
             raise HTTPException(status_code=404, detail="Video not found")
         
+        image_id = request.get("image_id")
+        image_info = None
+        if image_id:
+            image_info = await db.uploaded_videos.find_one({"id": image_id, "user_id": current_user.id})
+        source_error = still_source_error(video_info, image_id, image_info)
+        if source_error:
+            raise HTTPException(status_code=400, detail=source_error)
+        
         # Get YouTube credentials
         user = await refresh_token_if_needed(current_user)
         creds = get_credentials_from_token(user.access_token, user.refresh_token)
-        youtube = get_youtube_service(creds)
+        youtube = await asyncio.to_thread(get_youtube_service, creds, user.id)
+        
+        job_payload = {"file_path": video_info['file_path'], "file_id": file_id}
+        still_fields = {}
+        if image_id:
+            job_payload["image_id"] = still_fields["image_id"] = image_id
         
         # Default times if not provided
-        default_times = ["05:55", "06:55", "07:55", "16:55", "17:55"]
-        times_to_schedule = custom_times or default_times
+        times_to_schedule = custom_times or DEFAULT_SCHEDULE_TIMES
+        capacity = await encoder_capacity()
         
         scheduled_broadcasts = []
         errors = []
         
-        # Set user timezone to India (IST)
-        user_tz = pytz.timezone("Asia/Kolkata")
-        utc_tz = pytz.timezone("UTC")
-        
-        # Parse the selected date and convert from UTC to IST
-        selected_date_str = selected_date.replace('Z', '')
-        selected_date_utc = datetime.fromisoformat(selected_date_str)
-        if selected_date_utc.tzinfo is None:
-            selected_date_utc = selected_date_utc.replace(tzinfo=timezone.utc)
+        # Times already past on the selected date move to the next day
+        now_utc = datetime.now(timezone.utc)
+        slots = compute_slots(selected_date, selected_date, times_to_schedule, tz_name, now_utc, roll_past=True)
+        # Loaded once; broadcasts of this request are added to it as they are created
+        index = await load_schedule_index()
+        batch = WriteBatch(db)
         
-        selected_date_ist = selected_date_utc.astimezone(user_tz)
-        selected_date = selected_date_ist.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
-        
-        now_utc = datetime.now(utc_tz)
-        now_ist = now_utc.astimezone(user_tz)
-        
-        for time_str in times_to_schedule:
+        for position, slot in enumerate(slots):
+            time_str = slot["time"]
             try:
-                # Parse time and combine with date
-                hour, minute = map(int, time_str.split(':'))
-                scheduled_datetime_naive = selected_date.replace(hour=hour, minute=minute, second=0, microsecond=0)
-                
-                # If the scheduled time is in the past (same day), move it to next day
-                current_ist_naive = now_ist.replace(tzinfo=None)
-                if scheduled_datetime_naive <= current_ist_naive:
-                    scheduled_datetime_naive = scheduled_datetime_naive + timedelta(days=1)
+                if slot["error"]:
+                    errors.append(f"Time {time_str}: {slot['error']}")
+                    continue
                 
-                # Localize to IST then convert to UTC
-                scheduled_datetime_ist = user_tz.localize(scheduled_datetime_naive)
-                scheduled_datetime_utc = scheduled_datetime_ist.astimezone(utc_tz)
+                scheduled_datetime_utc = slot["airtime"]
+                scheduled_datetime_local = scheduled_datetime_utc.astimezone(tz)
                 
                 # Validate scheduling constraints
-                time_diff = scheduled_datetime_utc - now_utc
-                
-                if time_diff.total_seconds() < 180:  # 3 minutes
-                    errors.append(f"Time {time_str} IST is too soon. Must be at least 3 minutes in the future.")
+                lead_problem = lead_error(scheduled_datetime_utc, now_utc)
+                if lead_problem:
+                    errors.append(f"Time {time_str} {scheduled_datetime_local.strftime('%Z')}: {lead_problem}")
                     continue
                 
-                if time_diff.days > 180:  # ~6 months
-                    errors.append(f"Time {time_str} IST is too far in the future. Maximum 6 months ahead.")
+                # Conflict and encoder capacity check against everything already scheduled
+                start, end = broadcast_window({"scheduled_time": scheduled_datetime_utc.isoformat(),
+                                               "duration_seconds": (video_info.get("media") or {}).get("duration")})
+                conflict = index.check(user.id, file_id, start, end, capacity)
+                if conflict:
+                    errors.append(f"Time {time_str} {scheduled_datetime_local.strftime('%Z')}: {conflict}")
                     continue
                 
                 # Format time for title (12-hour format)
-                time_12hr = scheduled_datetime_ist.strftime('%I:%M %p').lstrip('0').replace(':00', '')  # e.g., "5:55 AM"
+                time_12hr = scheduled_datetime_local.strftime('%I:%M %p').lstrip('0').replace(':00', '')  # e.g., "5:55 AM"
                 
                 # Create YouTube Live broadcast with custom title and time
                 custom_title = video_info.get('custom_title', video_info['original_filename'])
-                broadcast_title = f"{custom_title} - {time_12hr}"
-                
-                broadcast_body = {
-                    'snippet': {
-                        'title': f"🔴 LIVE: {broadcast_title}",
-                        'description': f"Scheduled live stream: {custom_title}\n\nScheduled for: {scheduled_datetime_ist.strftime('%Y-%m-%d %I:%M %p IST')}",
-                        'scheduledStartTime': scheduled_datetime_utc.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
-                    },
-                    'status': {
-                        'privacyStatus': 'unlisted',
-                        'selfDeclaredMadeForKids': False
-                    },
-                    'contentDetails': {
-                        'enableAutoStart': True,
-                        'enableAutoStop': True,
-                        'recordFromStart': True,
-                        'enableDvr': True,
-                        'enableContentEncryption': False,
-                        'enableEmbed': True,
-                        'projection': 'rectangular'
-                    }
-                }
-                
-                broadcast_response = youtube.liveBroadcasts().insert(
-                    part='snippet,status,contentDetails',
-                    body=broadcast_body
-                ).execute()
-                
-                broadcast_id = broadcast_response['id']
-                
-                # Create live stream
-                stream_body = {
-                    'snippet': {
-                        'title': f"Stream for {video_info['original_filename']} at {time_str} IST"
-                    },
-                    'cdn': {
-                        'frameRate': '30fps',
-                        'ingestionType': 'rtmp',
-                        'resolution': '720p'
-                    }
-                }
-                
-                stream_response = youtube.liveStreams().insert(
-                    part='snippet,cdn',
-                    body=stream_body
-                ).execute()
-                
-                stream_id = stream_response['id']
-                stream_name = stream_response['cdn']['ingestionInfo']['streamName']
-                
-                # Bind stream to broadcast
-                youtube.liveBroadcasts().bind(
-                    part='id',
-                    id=broadcast_id,
-                    streamId=stream_id
-                ).execute()
-                
-                # Schedule the local file streaming
-                asyncio.create_task(
-                    schedule_uploaded_video_stream(
-                        broadcast_id=broadcast_id,
-                        stream_key=stream_name,
-                        file_path=video_info['file_path'],
-                        start_time=scheduled_datetime_utc
-                    )
+                live_event = await asyncio.to_thread(
+                    create_live_event,
+                    youtube,
+                    f"🔴 LIVE: {custom_title} - {time_12hr}",
+                    f"Scheduled live stream: {custom_title}\n\nScheduled for: {scheduled_datetime_local.strftime('%Y-%m-%d %I:%M %p %Z')}",
+                    scheduled_datetime_utc,
+                    f"Stream for {video_info['original_filename']} at {time_str} {scheduled_datetime_local.strftime('%Z')}"
                 )
                 
-                # Store in database
-                broadcast_data = {
-                    "id": str(uuid.uuid4()),
-                    "user_id": user.id,
-                    "video_id": file_id,
-                    "video_title": video_info['original_filename'],
-                    "broadcast_id": broadcast_id,
-                    "stream_id": stream_id,
-                    "scheduled_time": scheduled_datetime_utc.isoformat(),
-                    "status": 'created',
-                    "stream_url": stream_name,
-                    "watch_url": f"https://www.youtube.com/watch?v={broadcast_id}",
-                    "created_at": datetime.now(timezone.utc).isoformat(),
-                    "source": "uploaded_file"
-                }
-                
-                result = await db.scheduled_broadcasts.insert_one(broadcast_data)
-                # Remove any MongoDB ObjectId before adding to response
-                clean_broadcast_data = {k: v for k, v in broadcast_data.items() if k != '_id'}
-                scheduled_broadcasts.append(clean_broadcast_data)
+                # Store in database and queue the local file streaming, before the next slot is created
+                broadcast = await record_scheduled_broadcast(
+                    user.id, file_id, video_info['original_filename'], live_event, scheduled_datetime_utc,
+                    encoder_profile, "uploaded_video", job_payload,
+                    source="uploaded_file", duration_seconds=(video_info.get("media") or {}).get("duration"),
+                    batch=batch, **still_fields
+                )
+                scheduled_broadcasts.append(broadcast)
+                await store_created_broadcasts(batch, [broadcast])
                 
+            except QuotaError as quota_error:
+                errors.append(f"Time {time_str}: {quota_error}")
+                errors.extend(f"Time {later['time']}: not attempted, YouTube API quota exhausted" for later in slots[position + 1:])
+                logging.error(f"Stopped scheduling at {time_str}: {quota_error}")
+                break
             except Exception as slot_error:
                 errors.append(f"Time {time_str}: Failed to schedule - {str(slot_error)}")
                 logging.error(f"Error scheduling time {time_str}: {slot_error}")
         
+        await commit_schedule_batch(batch, [])
+        
         response_message = f"Successfully scheduled {len(scheduled_broadcasts)} broadcasts using uploaded video"
         if errors:
             response_message += f". {len(errors)} failed"
@@ -1673,10 +3064,96 @@ async def schedule_uploaded_video(
             "video_file": video_info["original_filename"]
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Failed to schedule uploaded video: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to schedule uploaded video: {str(e)}")
 
+@api_router.post("/schedule/rules")
+async def create_schedule_rule(request: ScheduleRuleRequest, current_user: User = Depends(get_current_user)):
+    """Create a recurring schedule; broadcasts are created as occurrences enter the horizon"""
+    try:
+        rule = request.dict()
+        errors = validate_rule(rule)
+        if rule["source"] not in ("uploaded_file", "youtube_video"):
+            errors.append("source must be uploaded_file or youtube_video")
+        elif rule["source"] == "uploaded_file":
+            video_info = await db.uploaded_videos.find_one({"id": rule["video_id"], "user_id": current_user.id})
+            if not video_info:
+                raise HTTPException(status_code=404, detail="Video not found")
+            image_info = None
+            if rule["image_id"]:
+                image_info = await db.uploaded_videos.find_one({"id": rule["image_id"], "user_id": current_user.id})
+            source_error = still_source_error(video_info, rule["image_id"], image_info)
+            if source_error:
+                errors.append(source_error)
+            rule["video_title"] = rule["video_title"] or video_info.get('custom_title', video_info['original_filename'])
+        elif not rule["video_title"]:
+            errors.append("video_title is required for youtube_video rules")
+        if rule["source"] == "youtube_video" and rule["image_id"]:
+            errors.append("image_id is only supported for uploaded_file rules")
+        if errors:
+            raise HTTPException(status_code=400, detail="; ".join(errors))
+        
+        rule.update({
+            "id": str(uuid.uuid4()),
+            "user_id": current_user.id,
+            # Activated after the first pass below, so the background materializer never races it
+            "active": False,
+            "inactive_reason": None,
+            "materialized_until": None,
+            "last_error": None,
+            "created_at": datetime.now(timezone.utc).isoformat()
+        })
+        await db.schedule_rules.insert_one(rule)
+        
+        created, failed = await rule_materializer.materialize_rule(rule, datetime.now(timezone.utc))
+        await db.schedule_rules.update_one(
+            {"id": rule["id"], "inactive_reason": None},
+            {"$set": {"active": True}}
+        )
+        rule = await db.schedule_rules.find_one({"id": rule["id"]}, {"_id": 0})
+        
+        return {
+            "message": f"Recurring schedule created; {created} broadcasts scheduled in the next {RECURRING_HORIZON_HOURS:g} hours",
+            "rule": rule,
+            "success_count": created,
+            "error_count": failed
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Failed to create schedule rule: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to create schedule rule: {str(e)}")
+
+@api_router.get("/schedule/rules")
+async def list_schedule_rules(current_user: User = Depends(get_current_user)):
+    """List the user's recurring schedules"""
+    try:
+        rules = await db.schedule_rules.find(
+            {"user_id": current_user.id}, {"_id": 0}
+        ).sort("created_at", 1).to_list(None)
+        return {"rules": rules}
+    except Exception as e:
+        logging.error(f"Failed to fetch schedule rules: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch schedule rules")
+
+@api_router.delete("/schedule/rules/{rule_id}")
+async def delete_schedule_rule(rule_id: str, current_user: User = Depends(get_current_user)):
+    """Stop a recurring schedule; broadcasts it already created stay until deleted individually"""
+    try:
+        result = await db.schedule_rules.delete_one({"id": rule_id, "user_id": current_user.id})
+        if result.deleted_count == 0:
+            raise HTTPException(status_code=404, detail="Schedule rule not found")
+        return {"message": "Recurring schedule deleted"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Failed to delete schedule rule: {e}")
+        raise HTTPException(status_code=500, detail="Failed to delete schedule rule")
+
 @api_router.post("/test/download-stream")
 async def test_download_streaming(
     video_id: str,
@@ -1685,118 +3162,55 @@ async def test_download_streaming(
 ):
     """Test streaming by downloading video first, then streaming local file"""
     try:
-        import tempfile
-        import os
-        
         logging.info(f"Testing download-then-stream for video {video_id}")
         
-        # Create temporary directory
-        temp_dir = tempfile.mkdtemp()
-        temp_file = os.path.join(temp_dir, f"{video_id}.mp4")
-        
-        # Download the video using yt-dlp with robust settings
-        ydl_opts = {
-            'format': 'best[ext=mp4][height<=720]/best[height<=720]',
-            'outtmpl': temp_file,
-            'quiet': False,
-            'retries': 2,
-            'fragment_retries': 2,
-            'socket_timeout': 20,
-            'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-        }
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([f'https://www.youtube.com/watch?v={video_id}'])
+        # Download into the source cache (reused if the video was fetched before)
+        source_path = await fetch_source_video(video_id)
         
         # Check if file was downloaded
-        if not os.path.exists(temp_file):
+        if not source_path:
             return {"success": False, "error": "Video download failed"}
         
-        file_size = os.path.getsize(temp_file)
-        logging.info(f"Downloaded video: {temp_file} ({file_size} bytes)")
+        file_size = os.path.getsize(source_path)
+        logging.info(f"Downloaded video: {source_path} ({file_size} bytes)")
         
         # Stream the local file
-        rtmp_url = f"rtmp://a.rtmp.youtube.com/live2/{stream_key}"
-        
-        cmd = [
-            'ffmpeg', '-y',
-            '-re',  # Read at native frame rate
-            '-i', temp_file,
-            '-c:v', 'libx264',
-            '-c:a', 'aac',
-            '-preset', 'veryfast',
-            '-tune', 'zerolatency',
-            '-pix_fmt', 'yuv420p',
-            '-maxrate', '2500k',
-            '-bufsize', '5000k',
-            '-vf', 'scale=1280:720:force_original_aspect_ratio=decrease,pad=1280:720:(ow-iw)/2:(oh-ih)/2',
-            '-r', '30',
-            '-g', '60',
-            '-keyint_min', '30',
-            '-sc_threshold', '0',
-            '-b:v', '2000k',
-            '-b:a', '128k',
-            '-ar', '44100',
-            '-f', 'flv',
-            '-flvflags', 'no_duration_filesize',
-            '-t', '60',  # Stream for 60 seconds
-            rtmp_url
-        ]
-        
-        logging.info(f"Streaming local file: {' '.join(cmd)}")
-        
-        # Start FFmpeg process
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            stdin=subprocess.PIPE,
-            universal_newlines=True,
-            bufsize=1
+        rtmp_url = youtube_rtmp_url(stream_key)
+        
+        profile, analysis = await resolve_encoder_profile(DEFAULT_PROFILE_NAME, source_path)
+        handle = await start_pipeline(
+            f"test_download_{video_id}_{int(time.time())}",
+            StreamSource.file(source_path),
+            [rtmp_url],
+            method="download_stream_test",
+            profile=profile,
+            analysis=analysis,
+            duration_seconds=60,  # Stream for 60 seconds
+            metadata={"cache_path": source_path}
         )
+        storage.acquire(source_path)
         
         # Wait and check if process is running
-        time.sleep(3)
-        
-        if process.poll() is None:
+        if await supervisor.wait_started(handle, 3):
             logging.info("Download-and-stream started successfully")
             
-            # Schedule cleanup after streaming
-            def cleanup():
-                time.sleep(70)  # Wait for stream to finish
-                try:
-                    os.remove(temp_file)
-                    os.rmdir(temp_dir)
-                    logging.info(f"Cleaned up temporary files: {temp_file}")
-                except:
-                    pass
-            
-            threading.Thread(target=cleanup, daemon=True).start()
-            
             return {
                 "success": True,
                 "message": "Download-and-stream started successfully",
                 "rtmp_url": rtmp_url,
-                "process_id": process.pid,
-                "temp_file": temp_file,
+                "process_id": handle.pid,
+                "source_path": source_path,
                 "file_size_mb": round(file_size / 1024 / 1024, 2),
                 "stream_duration": "60 seconds"
             }
         else:
             # Process failed
-            stdout, stderr = process.communicate()
-            
-            # Cleanup
-            try:
-                os.remove(temp_file)
-                os.rmdir(temp_dir)
-            except:
-                pass
+            output = handle.output()
             
             return {
                 "success": False,
                 "error": "FFmpeg process failed",
-                "output": stdout[-500:] if stdout else "No output",
+                "output": output[-500:] if output else "No output",
                 "rtmp_url": rtmp_url
             }
             
@@ -1813,27 +3227,33 @@ async def get_streaming_status(current_user: User = Depends(get_current_user)):
         broadcast_ids = [b["broadcast_id"] for b in user_broadcasts]
         
         active_streams = await db.streaming_processes.find(
-            {"broadcast_id": {"$in": broadcast_ids}}
+            {"broadcast_id": {"$in": broadcast_ids}, "ended_at": {"$exists": False}}
         ).to_list(100)
         
+        # Streams may run in any worker process; each one's heartbeat lists the streams it runs
+        live_streams = set()
+        for worker in await live_workers(db):
+            live_streams.update(worker.get("streams", []))
+        
         # Check which processes are still running
         running_streams = []
         for stream in active_streams:
-            try:
-                # Check if process is still running
-                process = subprocess.Popen(['ps', '-p', str(stream['process_id'])], 
-                                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                output, _ = process.communicate()
-                
-                if str(stream['process_id']) in output.decode():
-                    running_streams.append({
-                        "broadcast_id": stream["broadcast_id"],
-                        "video_id": stream["video_id"],
-                        "started_at": stream["started_at"],
-                        "status": "streaming"
-                    })
-            except:
-                pass
+            handle = supervisor.get(stream["broadcast_id"])
+            if handle and handle.pid == stream["process_id"]:
+                is_running = handle.running
+            else:
+                is_running = stream["broadcast_id"] in live_streams
+            
+            if is_running:
+                running_streams.append({
+                    "broadcast_id": stream["broadcast_id"],
+                    "video_id": stream.get("video_id"),
+                    "started_at": stream["started_at"],
+                    "method": stream.get("method"),
+                    "encoder_profile": stream.get("encoder_profile"),
+                    "worker_id": stream.get("worker_id"),
+                    "status": "streaming"
+                })
         
         return {"active_streams": running_streams}
         
@@ -1845,30 +3265,110 @@ async def get_streaming_status(current_user: User = Depends(get_current_user)):
 async def stop_stream(broadcast_id: str, current_user: User = Depends(get_current_user)):
     """Manually stop a streaming process"""
     try:
+        # Only the broadcast's owner may stop it; another user's broadcast reads as not found
+        broadcast = await db.scheduled_broadcasts.find_one(
+            {"broadcast_id": broadcast_id, "user_id": current_user.id}, {"_id": 1}
+        )
+        if not broadcast:
+            raise HTTPException(status_code=404, detail="Stream process not found")
+        
+        # Records of streams started moments ago may still be in the write-behind buffer
+        await write_buffer.flush()
+        
         # Find the streaming process
         stream_process = await db.streaming_processes.find_one({"broadcast_id": broadcast_id})
         
         if not stream_process:
             raise HTTPException(status_code=404, detail="Stream process not found")
         
-        # Kill the FFmpeg process
-        try:
-            subprocess.run(['kill', str(stream_process['process_id'])], check=True)
-            
-            # Remove from database
-            await db.streaming_processes.delete_one({"broadcast_id": broadcast_id})
-            
+        # A manual stop is final; keep another worker from resuming the job
+        await cancel_jobs(db, broadcast_id)
+        
+        # Stop through the supervisor when this process owns the stream, else ask the owning worker
+        stopped = await supervisor.stop(broadcast_id)
+        if not stopped:
+            owner = await find_stream_owner(db, broadcast_id)
+            if owner:
+                result = await request_stop(db, owner["id"], broadcast_id)
+                if result is None:
+                    raise HTTPException(status_code=504, detail=f"Worker {owner['id']} did not confirm the stop")
+                stopped = result.get("stopped", False)
+        
+        # Remove from database
+        await db.streaming_processes.delete_many({"broadcast_id": broadcast_id})
+        
+        if stopped:
             return {"message": "Stream stopped successfully"}
-        except subprocess.CalledProcessError:
-            return {"message": "Stream process was already stopped"}
+        return {"message": "Stream process was already stopped"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Failed to stop stream: {e}")
         raise HTTPException(status_code=500, detail="Failed to stop stream")
 
+@api_router.post("/events/ticket")
+async def create_events_ticket(current_user: User = Depends(get_current_user)):
+    """Short-lived ticket for GET /events, since EventSource cannot send the Authorization header"""
+    return {
+        "ticket": media_tokens.issue(MEDIA_URL_SECRET, current_user.id, "events", EVENTS_TICKET_TTL_SECONDS),
+        "ttl_seconds": EVENTS_TICKET_TTL_SECONDS
+    }
+
+@api_router.get("/events")
+async def stream_events(request: Request, ticket: str = "", last_event_id: Optional[str] = None):
+    """Server-sent events: broadcast lifecycle changes ("broadcast") and live encoder metrics ("metrics")
+
+    `last_event_id` stands in for the Last-Event-ID header when the client
+    opens a new EventSource (with a new ticket) rather than reconnecting.
+    """
+    user_id = media_tokens.verify(MEDIA_URL_SECRET, ticket, "events")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Missing or expired events ticket")
+    queue = events.subscribe(user_id)
+    
+    async def event_stream():
+        try:
+            yield "retry: 5000\n\n"
+            
+            # Resume after a reconnect without losing what happened in between
+            replayed = set()
+            resume_after = request.headers.get("last-event-id") or last_event_id
+            if resume_after:
+                for event in await events.replay(user_id, resume_after):
+                    replayed.add(event["_id"])
+                    yield f"id: {event['_id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+            
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                if event["_id"] in replayed:
+                    continue
+                yield f"id: {event['_id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+        finally:
+            events.unsubscribe(queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # Include the router in the main app
 app.include_router(api_router)
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+app.add_middleware(RequestMetricsMiddleware, histogram=HTTP_REQUEST_SECONDS)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -1884,6 +3384,213 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def load_media_url_secret():
+    """Use MEDIA_URL_SECRET, else the deployment's generated secret, creating it on first start
+
+    Errors are not caught: a process that cannot sign media URLs must not serve.
+    """
+    global MEDIA_URL_SECRET
+    if MEDIA_URL_SECRET:
+        return
+    try:
+        await db.app_secrets.insert_one({"_id": "media_url_secret", "value": secrets.token_hex(32)})
+    except DuplicateKeyError:
+        pass  # Created by another process or an earlier start
+    record = await db.app_secrets.find_one({"_id": "media_url_secret"})
+    MEDIA_URL_SECRET = record["value"]
+
+@app.on_event("startup")
+async def seed_encoder_profiles():
+    """Insert the built-in encoder profiles without overwriting edited copies"""
+    try:
+        for name, profile in DEFAULT_ENCODER_PROFILES.items():
+            await db.encoder_profiles.update_one(
+                {"name": name},
+                {"$setOnInsert": profile},
+                upsert=True
+            )
+    except Exception as e:
+        logging.error(f"Failed to seed encoder profiles: {e}")
+
+@app.on_event("startup")
+async def start_storage_maintenance():
+    """Reclaim orphaned files once at startup, then keep the source cache within its limits
+
+    Runs in API processes and standalone workers alike; disks are per host, so is the sweep lease.
+    """
+    async def maintain():
+        try:
+            await storage.ensure_indexes()
+        except Exception as e:
+            logging.error(f"Failed to create upload reservation indexes: {e}")
+        try:
+            # With several processes starting together on a host, only one of them sweeps its disk
+            if await acquire_lease(db, f"storage-sweep:{socket.gethostname()}", stream_worker_id(),
+                                   STORAGE_MAINTENANCE_INTERVAL):
+                # Temp dirs from the old per-broadcast download flow
+                legacy_dirs = []
+                async for record in db.streaming_processes.find({"temp_dir": {"$exists": True}}, {"temp_dir": 1}):
+                    legacy_dirs.append(record["temp_dir"])
+                result = await storage.sweep(legacy_dirs)
+                logging.info(f"Storage sweep removed {len(result['removed'])} paths ({result['freed_bytes']} bytes)")
+                pruned = await asyncio.to_thread(slates.prune)
+                if pruned:
+                    logging.info(f"Removed {pruned} unused slates")
+        except Exception as e:
+            logging.error(f"Storage sweep failed: {e}")
+        
+        while True:
+            await asyncio.sleep(STORAGE_MAINTENANCE_INTERVAL)
+            try:
+                storage.enforce_cache_limits()
+            except Exception as e:
+                logging.error(f"Storage maintenance failed: {e}")
+    
+    detach(asyncio.create_task(maintain()))
+
+@app.on_event("startup")
+async def start_broadcast_sync():
+    """Reconcile broadcast lifecycle and stream health with YouTube; one process at a time holds the lease"""
+    async def reconcile():
+        try:
+            await broadcast_reconciler.ensure_indexes()
+        except Exception as e:
+            logging.error(f"Failed to create broadcast sync indexes: {e}")
+        
+        while True:
+            try:
+                if await acquire_lease(db, "broadcast-sync", stream_worker_id(), BROADCAST_SYNC_INTERVAL * 3):
+                    result = await broadcast_reconciler.sync_due()
+                    if result["broadcasts"]:
+                        logging.info(f"Broadcast sync: {result}")
+            except Exception as e:
+                logging.error(f"Broadcast sync failed: {e}")
+            await asyncio.sleep(BROADCAST_SYNC_INTERVAL)
+    
+    detach(asyncio.create_task(reconcile()))
+
+@app.on_event("startup")
+async def start_rule_materializer():
+    """Create broadcasts for recurring schedules as their occurrences enter the horizon"""
+    async def materialize():
+        try:
+            await rule_materializer.ensure_indexes()
+        except Exception as e:
+            logging.error(f"Failed to create schedule rule indexes: {e}")
+        
+        while True:
+            try:
+                if await acquire_lease(db, "rule-materializer", stream_worker_id(), RECURRING_MATERIALIZE_INTERVAL * 2):
+                    result = await rule_materializer.materialize_due()
+                    if result["created"] or result["errors"]:
+                        logging.info(f"Recurring schedules: {result}")
+            except Exception as e:
+                logging.error(f"Recurring schedule materialization failed: {e}")
+            await asyncio.sleep(RECURRING_MATERIALIZE_INTERVAL)
+    
+    detach(asyncio.create_task(materialize()))
+
+@app.on_event("startup")
+async def start_quota_ledger():
+    """Write this process's YouTube API usage to the quota ledger and pick up other processes' totals"""
+    async def flush():
+        try:
+            await youtube_quota.ensure_indexes(db)
+        except Exception as e:
+            logging.error(f"Failed to prepare quota ledger: {e}")
+        while True:
+            try:
+                await youtube_quota.flush(db)
+            except Exception as e:
+                logging.error(f"Quota ledger flush failed: {e}")
+            await asyncio.sleep(QUOTA_FLUSH_INTERVAL)
+    
+    detach(asyncio.create_task(flush()))
+
+@app.on_event("startup")
+async def start_write_buffer():
+    """Flush buffered stream records and metric events every WRITE_BEHIND_INTERVAL_SECONDS"""
+    detach(asyncio.create_task(write_buffer.run()))
+
+@app.on_event("startup")
+async def prepare_schedule_index():
+    try:
+        await db.scheduled_broadcasts.create_index("scheduled_time")
+        await load_schedule_index()
+    except Exception as e:
+        logging.error(f"Failed to load schedule index: {e}")
+
+@app.on_event("startup")
+async def prepare_event_bus():
+    try:
+        await events.ensure_collection()
+    except Exception as e:
+        logging.error(f"Failed to prepare event collection: {e}")
+
+@app.on_event("startup")
+async def start_stream_worker():
+    """Prepare the stream job queue and register this process as a stream worker"""
+    global stream_worker
+    try:
+        await ensure_stream_job_indexes(db)
+        stream_worker = create_stream_worker(claim_jobs=STREAM_WORKER_MODE == "embedded")
+        await stream_worker.start()
+    except Exception as e:
+        logging.error(f"Failed to start stream worker: {e}")
+
+@app.on_event("startup")
+async def preload_dependencies():
+    """Load the lazily imported dependencies in a worker thread once the app is serving"""
+    async def preload():
+        # Startup hooks finish before uvicorn accepts connections; let it bind first
+        await asyncio.sleep(PRELOAD_DELAY_SECONDS)
+        started = time.perf_counter()
+        try:
+            timings = await asyncio.to_thread(preload_lazy_modules)
+            await asyncio.to_thread(youtube_discovery_document)
+        except Exception as e:
+            logging.error(f"Preloading dependencies failed: {e}")
+            return
+        logging.info(f"Preloaded dependencies in {time.perf_counter() - started:.2f}s: {timings}")
+    
+    detach(asyncio.create_task(preload()))
+
+@app.on_event("startup")
+async def prepare_slates():
+    """Render the generic slate of each encoding profile ahead of the first fallback or stall"""
+    async def render():
+        await asyncio.sleep(PRELOAD_DELAY_SECONDS)
+        for name, profile in DEFAULT_ENCODER_PROFILES.items():
+            if profile.get("mode") == "copy":
+                continue
+            try:
+                if not await slates.get(await get_encoder_profile(name)):
+                    logging.error(f"No slate for encoder profile {name}; fallbacks will use a test pattern")
+            except Exception as e:
+                logging.error(f"Preparing slate for encoder profile {name} failed: {e}")
+    
+    detach(asyncio.create_task(render()))
+
+@app.on_event("shutdown")
+async def stop_stream_worker():
+    if stream_worker:
+        await stream_worker.stop()
+
+@app.on_event("shutdown")
+async def flush_write_buffer():
+    try:
+        await write_buffer.flush()
+    except Exception as e:
+        logging.error(f"Final write-behind flush failed: {e}")
+
+@app.on_event("shutdown")
+async def flush_quota_ledger():
+    try:
+        await youtube_quota.flush(db)
+    except Exception as e:
+        logging.error(f"Final quota ledger flush failed: {e}")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
\ No newline at end of file
@@ -0,0 +1,210 @@
+"""Pre-rendered fallback slates, looped in copy mode instead of encoding a test pattern live
+
+A slate is a short H.264/AAC MP4 (a dark frame or the branding image, the
+brand line and an optional per-video title, with silence) rendered once per
+output geometry and cached on disk. Its keyframes fall on the loop boundary
+and it is encoded with the output profile's bitrate ladder, so FFmpeg can
+loop it to YouTube with `-c copy` at practically no CPU cost, whether as the
+fallback when no source could be fetched or as a bridge while a stalled
+source is replaced.
+
+Still-image broadcasts use the same machinery: their picture is rendered
+once as a single GOP of the still-image profile and looped under the audio.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import subprocess
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from encoder_profiles import DEFAULT_ENCODER_PROFILES, DEFAULT_PROFILE_NAME, ladder_rung, output_geometry
+from stream_pipeline import SLATE_COLOR
+
+# Length of one loop; a whole number of GOPs, so every repeat starts on a keyframe
+SLATE_SECONDS = 8
+SLATE_GOP_SECONDS = 2
+RENDER_TIMEOUT_SECONDS = 300
+# Per-video slates not used for this long are deleted by prune(); generic ones are kept for instant fallback
+SLATE_MAX_AGE_SECONDS = 7 * 86400
+PER_VIDEO_PREFIX = "slate-video-"
+
+
+def _drawtext(text_file: str, fontsize: int, y: str) -> str:
+    # Text is read from a file, so titles need no filter-graph escaping
+    return (f"drawtext=textfile={text_file}:expansion=none:fontcolor=white:fontsize={fontsize}:"
+            f"x=(w-text_w)/2:y={y}:box=1:boxcolor=black@0.5:boxborderw={fontsize // 2}")
+
+
+def slate_command(path: str, width: int, height: int, fps: int, rung: Dict[str, Any], text_files: List[str],
+                  image: Optional[str] = None, audio_bitrate: str = "128k", seconds: int = SLATE_SECONDS,
+                  gop_seconds: int = SLATE_GOP_SECONDS) -> List[str]:
+    """FFmpeg arguments rendering a slate to `path`, one centred line per file in `text_files`"""
+    gop = fps * gop_seconds
+    if image:
+        video_input = ['-loop', '1', '-framerate', str(fps), '-i', image]
+        video_filter = [f'scale={width}:{height}:force_original_aspect_ratio=decrease,'
+                        f'pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:color={SLATE_COLOR}']
+    else:
+        video_input = ['-f', 'lavfi', '-i', f'color=c={SLATE_COLOR}:s={width}x{height}:r={fps}']
+        video_filter = []
+    fontsize = max(16, height // 18)
+    # Brand line in the middle, the per-video title (if any) below it
+    for i, text_file in enumerate(text_files):
+        video_filter.append(_drawtext(text_file, fontsize if i == 0 else fontsize * 2 // 3,
+                                      f"(h-text_h)/2+{i * fontsize * 2}"))
+    maxrate_kbps = int(str(rung["maxrate"]).rstrip('k'))
+    return [
+        'ffmpeg', '-y', '-nostdin', '-v', 'error',
+        *video_input,
+        '-f', 'lavfi', '-i', 'anullsrc=r=44100:cl=stereo',
+        '-t', str(seconds),
+        *(['-vf', ','.join(video_filter)] if video_filter else []),
+        '-c:v', 'libx264', '-preset', 'medium', '-tune', 'stillimage', '-pix_fmt', 'yuv420p',
+        '-r', str(fps), '-g', str(gop), '-keyint_min', str(gop), '-sc_threshold', '0',
+        '-b:v', rung["video_bitrate"], '-maxrate', rung["maxrate"], '-bufsize', f'{maxrate_kbps * 2}k',
+        '-c:a', 'aac', '-b:a', audio_bitrate, '-ar', '44100',
+        '-movflags', '+faststart',
+        '-f', 'mp4', path,
+    ]
+
+
+def slate_analysis(width: int, height: int, fps: int, gop_seconds: int = SLATE_GOP_SECONDS) -> Dict[str, Any]:
+    """What analyze_source would report for a rendered slate; makes it eligible for passthrough"""
+    return {
+        "width": width,
+        "height": height,
+        "fps": fps,
+        "video_codec": "h264",
+        "audio_codec": "aac",
+        "format_name": "mov,mp4,m4a,3gp,3g2,mj2",
+        "keyframe_interval": gop_seconds,
+        "motion_score": 0,
+    }
+
+
+class SlateLibrary:
+    """Renders slates on demand and caches them under `directory`, keyed by geometry and content
+
+    `brand` is the main line of every slate; `image` an optional background.
+    """
+
+    def __init__(self, directory: str, brand: str, image: Optional[str] = None):
+        self.directory = directory
+        self.brand = brand
+        self.image = image
+        self.renders: Dict[str, asyncio.Task] = {}
+
+    def plan(self, profile: Optional[Dict[str, Any]] = None, analysis: Optional[Dict[str, Any]] = None,
+             title: Optional[str] = None, image: Optional[str] = None, single_gop: bool = False) -> Dict[str, Any]:
+        """Geometry, bitrate and file path of the slate matching an output profile and source
+
+        An explicit `image` is used as is, without the text lines. `single_gop`
+        makes the clip one GOP of the profile long (still-image broadcasts).
+        """
+        # Copy-mode output is matched in geometry; its bitrate comes from the default ladder
+        encode_profile = profile if profile and profile.get("mode") != "copy" else DEFAULT_ENCODER_PROFILES[DEFAULT_PROFILE_NAME]
+        width, height, fps = output_geometry(profile or encode_profile, analysis)
+        rung = ladder_rung(encode_profile, height)
+        lines = [] if image else [self.brand] + ([title] if title else [])
+        image = image or self.image
+        gop_seconds = max(1, int(encode_profile.get("gop_seconds", SLATE_GOP_SECONDS))) if single_gop else SLATE_GOP_SECONDS
+        seconds = gop_seconds if single_gop else SLATE_SECONDS
+        digest = hashlib.sha1("\n".join([*lines, image or "", rung["video_bitrate"], f"{seconds}/{gop_seconds}"]).encode()).hexdigest()[:12]
+        per_video = bool(title) or image != self.image
+        prefix = PER_VIDEO_PREFIX if per_video else "slate-"
+        return {
+            "path": os.path.join(self.directory, f"{prefix}{width}x{height}p{fps}-{digest}.mp4"),
+            "width": width,
+            "height": height,
+            "fps": fps,
+            "rung": rung,
+            "lines": lines,
+            "image": image,
+            "seconds": seconds,
+            "gop_seconds": gop_seconds,
+            "audio_bitrate": encode_profile.get("audio_bitrate", "128k"),
+            "per_video": per_video,
+        }
+
+    def _render(self, plan: Dict[str, Any]) -> bool:
+        os.makedirs(self.directory, exist_ok=True)
+        # Unique per render: other processes sharing the directory may render the same slate
+        fd, partial = tempfile.mkstemp(dir=self.directory, prefix=os.path.basename(plan["path"]) + ".", suffix=".part")
+        os.close(fd)
+        text_files = [f"{partial}.{i}.txt" for i in range(len(plan["lines"]))]
+        try:
+            for text_file, line in zip(text_files, plan["lines"]):
+                with open(text_file, 'w') as f:
+                    f.write(line)
+            for texts in (text_files, []):
+                command = slate_command(partial, plan["width"], plan["height"], plan["fps"], plan["rung"],
+                                        texts, plan["image"], plan["audio_bitrate"], plan["seconds"], plan["gop_seconds"])
+                try:
+                    result = subprocess.run(command, capture_output=True, text=True, timeout=RENDER_TIMEOUT_SECONDS)
+                except Exception as e:
+                    logging.error(f"Slate render failed for {plan['path']}: {e}")
+                    return False
+                if result.returncode == 0:
+                    os.replace(partial, plan["path"])
+                    return True
+                # drawtext needs a usable font; a slate without text beats none
+                logging.error(f"Slate render failed for {plan['path']}{' with text' if texts else ''}: "
+                              f"{result.stderr.strip()[-300:]}")
+            return False
+        finally:
+            for leftover in [partial, *text_files]:
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+    async def get(self, profile: Optional[Dict[str, Any]] = None, analysis: Optional[Dict[str, Any]] = None,
+                  title: Optional[str] = None, image: Optional[str] = None,
+                  single_gop: bool = False) -> Optional[Dict[str, Any]]:
+        """The slate plan for these settings once its file exists (rendering it first if needed); None if it cannot be rendered"""
+        plan = self.plan(profile, analysis, title, image, single_gop)
+        path = plan["path"]
+        if not os.path.exists(path):
+            # Concurrent callers share one render
+            if path not in self.renders:
+                self.renders[path] = asyncio.create_task(asyncio.to_thread(self._render, plan))
+            try:
+                if not await asyncio.shield(self.renders[path]):
+                    return None
+            finally:
+                if self.renders.get(path) and self.renders[path].done():
+                    self.renders.pop(path, None)
+        # Used slates stay; prune() goes by modification time
+        os.utime(path)
+        return {**plan, "analysis": slate_analysis(plan["width"], plan["height"], plan["fps"], plan["gop_seconds"])}
+
+    async def still(self, profile: Dict[str, Any], image: Optional[str] = None, image_analysis: Optional[Dict[str, Any]] = None,
+                    title: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """One looping GOP of `image` encoded with `profile`; the branded slate with `title` when there is no image"""
+        return await self.get(profile, image_analysis, title, image, single_gop=True)
+
+    def prune(self, max_age: float = SLATE_MAX_AGE_SECONDS) -> int:
+        """Delete per-video slates unused for `max_age` seconds, and abandoned partial renders
+
+        Returns how many files were removed.
+        """
+        if not os.path.isdir(self.directory):
+            return 0
+        removed = 0
+        now = time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if '.part' in name:
+                limit = RENDER_TIMEOUT_SECONDS * 2
+            elif name.startswith(PER_VIDEO_PREFIX):
+                limit = max_age
+            else:
+                continue
+            try:
+                if now - os.path.getmtime(path) > limit:
+                    os.remove(path)
+                    removed += 1
+            except OSError as e:
+                logging.error(f"Could not prune slate {path}: {e}")
+        return removed
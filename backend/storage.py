@@ -0,0 +1,371 @@
+"""Disk accounting for uploads and the downloaded-source cache: quotas, LRU eviction, orphan sweeps"""
+import asyncio
+import fcntl
+import logging
+import os
+import shutil
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+GB = 1024 * 1024 * 1024
+
+# Files younger than this are never swept: an upload writes its file before its record
+SWEEP_GRACE_SECONDS = 3600
+# Reservations of uploads that never finished (e.g. the process died) stop counting after this
+RESERVATION_TTL_SECONDS = 6 * 3600
+
+
+class QuotaExceeded(Exception):
+    """Raised when an upload would exceed a per-user or overall storage limit"""
+
+
+class StorageManager:
+    def __init__(self, db, upload_dir: str, cache_dir: str, user_quota_bytes: int = 0,
+                 total_quota_bytes: int = 0, cache_max_bytes: int = 0, min_free_bytes: int = 0):
+        self.db = db
+        self.upload_dir = upload_dir
+        self.cache_dir = cache_dir
+        self.user_quota_bytes = user_quota_bytes      # 0 = unlimited
+        self.total_quota_bytes = total_quota_bytes    # 0 = unlimited
+        self.cache_max_bytes = cache_max_bytes        # 0 = bounded only by free space
+        self.min_free_bytes = min_free_bytes
+        # path -> [count, fd]; the fd holds a shared flock so other processes see the pin too
+        self.in_use: Dict[str, List[int]] = {}
+        self.downloads: Dict[str, asyncio.Task] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    async def ensure_indexes(self):
+        await self.db.upload_reservations.create_index("created_at", expireAfterSeconds=RESERVATION_TTL_SECONDS)
+
+    # Usage accounting
+
+    async def _sum_bytes(self, collection, match: Dict[str, Any]) -> int:
+        result = await collection.aggregate([
+            {"$match": match},
+            {"$group": {"_id": None, "bytes": {"$sum": "$file_size"}}}
+        ]).to_list(1)
+        return int(result[0]["bytes"]) if result else 0
+
+    async def _sum_uploads(self, match: Dict[str, Any]) -> int:
+        return await self._sum_bytes(self.db.uploaded_videos, match)
+
+    async def reserved_bytes(self, user_id: Optional[str] = None) -> int:
+        """Bytes held by uploads still being written, for one user or all of them"""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=RESERVATION_TTL_SECONDS)
+        match: Dict[str, Any] = {"created_at": {"$gt": cutoff}}
+        if user_id:
+            match["user_id"] = user_id
+        return await self._sum_bytes(self.db.upload_reservations, match)
+
+    async def user_usage(self, user_id: str) -> int:
+        return await self._sum_uploads({"user_id": user_id})
+
+    async def total_usage(self) -> int:
+        return await self._sum_uploads({})
+
+    def disk_free(self) -> int:
+        os.makedirs(self.upload_dir, exist_ok=True)
+        return shutil.disk_usage(self.upload_dir).free
+
+    def cache_entries(self) -> List[Dict[str, Any]]:
+        """Completed cache files, least recently used first"""
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if '.part' in name or name.endswith('.lock') or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            entries.append({"path": path, "size": stat.st_size, "last_used": stat.st_mtime})
+        entries.sort(key=lambda e: e["last_used"])
+        return entries
+
+    def cache_usage(self) -> int:
+        return sum(e["size"] for e in self.cache_entries())
+
+    async def usage_report(self, user_id: Optional[str] = None) -> Dict[str, Any]:
+        report = {
+            "total_upload_bytes": await self.total_usage(),
+            "total_quota_bytes": self.total_quota_bytes or None,
+            "cache_bytes": self.cache_usage(),
+            "cache_max_bytes": self.cache_max_bytes or None,
+            "disk_free_bytes": self.disk_free(),
+            "min_free_bytes": self.min_free_bytes,
+        }
+        if user_id:
+            report["user_upload_bytes"] = await self.user_usage(user_id)
+            report["user_quota_bytes"] = self.user_quota_bytes or None
+        return report
+
+    # Quotas
+
+    async def _headroom(self, user_id: str) -> int:
+        """Bytes left under the tightest limit after stored uploads and pending reservations; may be negative"""
+        reserved = await self.reserved_bytes()
+        limits = []
+        if self.user_quota_bytes:
+            limits.append(self.user_quota_bytes - await self.user_usage(user_id) - await self.reserved_bytes(user_id))
+        if self.total_quota_bytes:
+            limits.append(self.total_quota_bytes - await self.total_usage() - reserved)
+
+        disk_room = self.disk_free() - self.min_free_bytes
+        reclaimable = sum(e["size"] for e in self.cache_entries() if not self.is_pinned(e["path"]))
+        # Partly written uploads are counted on disk and in full as reserved, erring on the safe side
+        limits.append(disk_room + reclaimable - reserved)
+        return min(limits)
+
+    async def upload_allowance(self, user_id: str) -> int:
+        """Bytes this user may still upload right now, counting evictable cache entries as free disk"""
+        return max(0, await self._headroom(user_id))
+
+    async def reserve_upload(self, user_id: str, incoming_bytes: int) -> str:
+        """Hold `incoming_bytes` of storage for an upload being written; returns the id for release_upload
+
+        The reservation is recorded before the limits are checked, so
+        concurrent uploads in any process count each other and cannot all
+        pass on the same free space. Raises QuotaExceeded when it does not
+        fit; frees cache space when disk is short.
+        """
+        reservation_id = os.urandom(8).hex()
+        await self.db.upload_reservations.insert_one({
+            "id": reservation_id,
+            "user_id": user_id,
+            "file_size": incoming_bytes,
+            "created_at": datetime.now(timezone.utc),
+        })
+        try:
+            headroom = await self._headroom(user_id)
+            if headroom < 0:
+                raise QuotaExceeded(
+                    f"Upload of {incoming_bytes / GB:.2f} GB exceeds available storage "
+                    f"({max(0, headroom + incoming_bytes) / GB:.2f} GB remaining)"
+                )
+            # Every pending upload, this one included, still has to land on disk
+            shortfall = await self.reserved_bytes() - (self.disk_free() - self.min_free_bytes)
+        except Exception:
+            await self.release_upload(reservation_id)
+            raise
+        if shortfall > 0:
+            self.evict(shortfall)
+        return reservation_id
+
+    async def release_upload(self, reservation_id: str):
+        """Drop a reservation once the upload is recorded in uploaded_videos, or has failed"""
+        await self.db.upload_reservations.delete_one({"id": reservation_id})
+
+    @staticmethod
+    def copy_upload(source, destination, limit: int, chunk_size: int = 1024 * 1024) -> int:
+        """Copy an upload like shutil.copyfileobj, raising QuotaExceeded past its `limit` reserved bytes"""
+        copied = 0
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return copied
+            copied += len(chunk)
+            if copied > limit:
+                raise QuotaExceeded(f"Upload is larger than the {limit / GB:.2f} GB reserved for it")
+            destination.write(chunk)
+
+    # Source cache
+
+    def source_path(self, key: str, ext: str = 'mp4') -> str:
+        return os.path.join(self.cache_dir, f"{key}.{ext}")
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Path of a cached source, marking it recently used"""
+        path = self.source_path(key)
+        if os.path.exists(path):
+            os.utime(path)
+            self.cache_hits += 1
+            return path
+        self.cache_misses += 1
+        return None
+
+    def acquire(self, path: str):
+        """Pin a cache file against eviction by any process on this host"""
+        if path in self.in_use:
+            self.in_use[path][0] += 1
+            return
+        try:
+            fd = os.open(path, os.O_RDONLY)
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            os.utime(path)
+        except OSError as e:
+            logging.error(f"Failed to pin {path}: {e}")
+            return
+        self.in_use[path] = [1, fd]
+
+    def release(self, path: str):
+        entry = self.in_use.get(path)
+        if not entry:
+            return
+        entry[0] -= 1
+        if entry[0] <= 0:
+            del self.in_use[path]
+            os.close(entry[1])
+
+    def is_pinned(self, path: str) -> bool:
+        if path in self.in_use:
+            return True
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return False
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return False
+        except OSError:
+            return True
+        finally:
+            os.close(fd)
+
+    async def fetch(self, key: str, downloader: Callable[[str], Awaitable[bool]]) -> Optional[str]:
+        """Return the cached source for `key`, downloading it once even with concurrent callers
+
+        `downloader(part_path)` writes the file; it is only published under the
+        final name once complete, so readers never see a partial download.
+        """
+        cached = self.lookup(key)
+        if cached:
+            return cached
+
+        task = self.downloads.get(key)
+        if not task:
+            task = asyncio.create_task(self._download(key, downloader))
+            self.downloads[key] = task
+            task.add_done_callback(lambda _: self.downloads.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _download(self, key: str, downloader: Callable[[str], Awaitable[bool]]) -> Optional[str]:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        final_path = self.source_path(key)
+        part_path = os.path.join(self.cache_dir, f"{key}.part.mp4")
+        lock_fd = os.open(os.path.join(self.cache_dir, f"{key}.lock"), os.O_CREAT | os.O_RDWR)
+        try:
+            # Other worker processes on this host may be fetching the same source
+            await asyncio.to_thread(fcntl.flock, lock_fd, fcntl.LOCK_EX)
+            cached = self.lookup(key)
+            if cached:
+                return cached
+            if self.cache_max_bytes:
+                self.evict(self.cache_usage() - self.cache_max_bytes)
+            if not await downloader(part_path) or not os.path.exists(part_path):
+                return None
+            os.replace(part_path, final_path)
+            return final_path
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            os.close(lock_fd)
+
+    def tee_path(self, key: str) -> str:
+        """A fresh partial path for a stream to copy the source it reads into (see adopt)"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        return os.path.join(self.cache_dir, f"{key}.part.tee-{os.urandom(4).hex()}.mp4")
+
+    async def adopt(self, key: str, part_path: str) -> Optional[str]:
+        """Publish a complete copy written to `part_path` as the cached source for `key`
+
+        Returns the cached path; an existing entry wins and the copy is discarded.
+        """
+        lock_fd = os.open(os.path.join(self.cache_dir, f"{key}.lock"), os.O_CREAT | os.O_RDWR)
+        try:
+            await asyncio.to_thread(fcntl.flock, lock_fd, fcntl.LOCK_EX)
+            cached = self.lookup(key)
+            if cached:
+                return cached
+            if self.cache_max_bytes:
+                self.evict(self.cache_usage() + os.path.getsize(part_path) - self.cache_max_bytes)
+            final_path = self.source_path(key)
+            os.replace(part_path, final_path)
+            return final_path
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            os.close(lock_fd)
+
+    def evict(self, bytes_needed: int) -> int:
+        """Delete least recently used cache entries not in use until `bytes_needed` is freed"""
+        freed = 0
+        if bytes_needed <= 0:
+            return freed
+        for entry in self.cache_entries():
+            if freed >= bytes_needed:
+                break
+            if self.is_pinned(entry["path"]):
+                continue
+            try:
+                os.remove(entry["path"])
+                freed += entry["size"]
+                logging.info(f"Evicted cached source {entry['path']} ({entry['size']} bytes)")
+            except OSError as e:
+                logging.error(f"Failed to evict {entry['path']}: {e}")
+        return freed
+
+    def enforce_cache_limits(self) -> int:
+        """Trim the cache to its size cap and to keep the free-space floor"""
+        over_cap = self.cache_usage() - self.cache_max_bytes if self.cache_max_bytes else 0
+        under_floor = self.min_free_bytes - self.disk_free()
+        return self.evict(max(over_cap, under_floor))
+
+    # Orphan sweep
+
+    async def sweep(self, extra_paths: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Remove upload files and preview dirs without an uploaded_videos record, stale partial
+        downloads, and leftover temp dirs listed in `extra_paths`"""
+        now = time.time()
+        removed: List[str] = []
+        freed = 0
+
+        def stale(path: str) -> bool:
+            return now - os.path.getmtime(path) > SWEEP_GRACE_SECONDS
+
+        def remove(path: str):
+            nonlocal freed
+            try:
+                if os.path.isdir(path):
+                    size = sum(os.path.getsize(os.path.join(root, f))
+                               for root, _, files in os.walk(path) for f in files)
+                    shutil.rmtree(path)
+                else:
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                freed += size
+                removed.append(path)
+            except OSError as e:
+                logging.error(f"Sweep could not remove {path}: {e}")
+
+        known_ids = set()
+        known_paths = set()
+        async for video in self.db.uploaded_videos.find({}, {"id": 1, "file_path": 1}):
+            known_ids.add(video["id"])
+            known_paths.add(os.path.realpath(video.get("file_path", "")))
+
+        if os.path.isdir(self.upload_dir):
+            for name in os.listdir(self.upload_dir):
+                path = os.path.join(self.upload_dir, name)
+                if os.path.isfile(path) and os.path.realpath(path) not in known_paths and stale(path):
+                    remove(path)
+
+        previews_root = os.path.join(self.upload_dir, "previews")
+        if os.path.isdir(previews_root):
+            for name in os.listdir(previews_root):
+                path = os.path.join(previews_root, name)
+                if name not in known_ids and stale(path):
+                    remove(path)
+
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, name)
+                if '.part' in name and stale(path):
+                    remove(path)
+
+        for path in extra_paths or []:
+            if path and os.path.exists(path) and not self.is_pinned(path):
+                remove(path)
+
+        freed += self.enforce_cache_limits()
+        return {"removed": removed, "freed_bytes": freed}
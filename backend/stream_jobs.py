@@ -0,0 +1,362 @@
+"""MongoDB-backed stream job queue and the worker that claims and runs jobs
+
+A job is one scheduled broadcast. Workers (embedded in an API process or
+standalone, on any number of nodes) claim due jobs with an atomic
+find-and-update that sets a lease, keep the lease alive with heartbeats while
+the job runs, and give it up on shutdown. A job whose lease expires because
+its worker died is claimed again by another worker.
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+# scheduled -> claimed -> running -> completed | failed | cancelled
+ACTIVE_STATUSES = ["claimed", "running"]
+OPEN_STATUSES = ["scheduled"] + ACTIVE_STATUSES
+
+DEFAULT_LEASE_SECONDS = 30
+# Jobs are claimed this early so runners can resolve sources before airtime
+DEFAULT_LOOKAHEAD_SECONDS = 60
+DEFAULT_MAX_ATTEMPTS = 3
+# Worker records without a heartbeat for this long are dropped by a TTL index
+WORKER_RECORD_TTL_SECONDS = 300
+COMMAND_TTL_SECONDS = 3600
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def default_worker_id() -> str:
+    return os.environ.get('STREAM_WORKER_ID') or f"{socket.gethostname()}-{os.getpid()}"
+
+
+def default_capacity() -> int:
+    """Concurrent streams per worker: STREAM_WORKER_CAPACITY, else half the cores"""
+    if os.environ.get('STREAM_WORKER_CAPACITY'):
+        return max(1, int(os.environ['STREAM_WORKER_CAPACITY']))
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+def _aware(value: Optional[datetime]) -> Optional[datetime]:
+    # Motor returns naive UTC datetimes unless the client is tz_aware
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+async def ensure_indexes(db):
+    await db.stream_jobs.create_index("id", unique=True)
+    await db.stream_jobs.create_index("key")
+    await db.stream_jobs.create_index([("status", 1), ("start_time", 1)])
+    await db.stream_jobs.create_index([("status", 1), ("lease_expires_at", 1)])
+    await db.stream_workers.create_index("id", unique=True)
+    await db.stream_workers.create_index("heartbeat_at", expireAfterSeconds=WORKER_RECORD_TTL_SECONDS)
+    await db.stream_commands.create_index([("worker_id", 1), ("status", 1)])
+    await db.stream_commands.create_index("created_at", expireAfterSeconds=COMMAND_TTL_SECONDS)
+
+
+async def enqueue_job(db, key: str, kind: str, start_time: datetime, payload: Dict[str, Any],
+                      user_id: Optional[str] = None, batch=None) -> Dict[str, Any]:
+    """Queue a stream job; `key` identifies the broadcast it streams to
+
+    With a `batch` (bulk_writes.WriteBatch) the job is only written when the batch is flushed.
+    """
+    job = {
+        "id": str(uuid.uuid4()),
+        "key": key,
+        "kind": kind,
+        "payload": payload,
+        "user_id": user_id,
+        "start_time": start_time,
+        "status": "scheduled",
+        "worker_id": None,
+        "lease_expires_at": None,
+        "attempts": 0,
+        "created_at": utcnow(),
+    }
+    if batch is not None:
+        batch.insert("stream_jobs", job)
+    else:
+        await db.stream_jobs.insert_one(job)
+    return job
+
+
+async def cancel_jobs(db, key: str) -> int:
+    """Cancel open jobs for a broadcast; the owning worker stops the stream on its next heartbeat"""
+    result = await db.stream_jobs.update_many(
+        {"key": key, "status": {"$in": OPEN_STATUSES}},
+        {"$set": {"status": "cancelled", "finished_at": utcnow()}}
+    )
+    return result.modified_count
+
+
+async def live_workers(db, stale_after: float = DEFAULT_LEASE_SECONDS) -> List[Dict[str, Any]]:
+    cutoff = utcnow() - timedelta(seconds=stale_after)
+    return await db.stream_workers.find({"heartbeat_at": {"$gte": cutoff}}, {"_id": 0}).to_list(None)
+
+
+async def find_stream_owner(db, key: str, stale_after: float = DEFAULT_LEASE_SECONDS) -> Optional[Dict[str, Any]]:
+    """The live worker currently running a stream for `key`, if any"""
+    cutoff = utcnow() - timedelta(seconds=stale_after)
+    return await db.stream_workers.find_one({"streams": key, "heartbeat_at": {"$gte": cutoff}}, {"_id": 0})
+
+
+async def request_stop(db, worker_id: str, key: str, timeout: float = 10,
+                       poll_interval: float = 0.25) -> Optional[Dict[str, Any]]:
+    """Ask `worker_id` to stop its stream for `key` and wait for the result (None on timeout)"""
+    command = {
+        "id": str(uuid.uuid4()),
+        "worker_id": worker_id,
+        "action": "stop",
+        "key": key,
+        "status": "pending",
+        "created_at": utcnow(),
+    }
+    await db.stream_commands.insert_one(command)
+
+    deadline = asyncio.get_running_loop().time() + timeout
+    while asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(poll_interval)
+        done = await db.stream_commands.find_one({"id": command["id"], "status": "done"}, {"_id": 0})
+        if done:
+            return done
+    return None
+
+
+async def acquire_lease(db, name: str, holder: str, seconds: float) -> bool:
+    """Named mutual-exclusion lease across processes; True if `holder` now has it"""
+    now = utcnow()
+    try:
+        await db.leases.find_one_and_update(
+            {"_id": name, "$or": [{"expires_at": {"$lt": now}}, {"holder": holder}]},
+            {"$set": {"holder": holder, "expires_at": now + timedelta(seconds=seconds)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+class StreamWorker:
+    """Claims due jobs up to `capacity` and runs them with the runner registered for their kind
+
+    A runner is a coroutine taking the job document and returning once the
+    stream is over; `stop_stream(key)` is called when a running job is
+    cancelled or its lease is lost to another worker, or when another process
+    sends a stop command. `list_streams()` reports the keys of every stream this
+    process runs (including ones not started from a job) in the heartbeat, which
+    is how other processes find the owner of a stream.
+    """
+
+    def __init__(self, db, runners: Dict[str, Callable[[Dict[str, Any]], Awaitable[Any]]],
+                 stop_stream: Optional[Callable[[str], Awaitable[Any]]] = None,
+                 list_streams: Optional[Callable[[], List[str]]] = None,
+                 worker_id: Optional[str] = None, capacity: Optional[int] = None,
+                 lease_seconds: float = DEFAULT_LEASE_SECONDS, poll_interval: float = 2.0,
+                 lookahead_seconds: float = DEFAULT_LOOKAHEAD_SECONDS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.db = db
+        self.runners = runners
+        self.stop_stream = stop_stream
+        self.list_streams = list_streams
+        self.worker_id = worker_id or default_worker_id()
+        self.capacity = capacity or default_capacity()
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.lookahead_seconds = lookahead_seconds
+        self.max_attempts = max_attempts
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.claimed = 0
+        self._loops: List[asyncio.Task] = []
+
+    @property
+    def active(self) -> int:
+        return len(self.tasks)
+
+    async def start(self):
+        await self.heartbeat()
+        self._loops = [
+            asyncio.create_task(self._claim_loop()),
+            asyncio.create_task(self._heartbeat_loop()),
+            asyncio.create_task(self._command_loop()),
+        ]
+        logging.info(f"Stream worker {self.worker_id} started (capacity {self.capacity})")
+
+    async def stop(self):
+        """Stop local streams and hand their jobs back so another worker resumes them"""
+        for loop in self._loops:
+            loop.cancel()
+        for job_id, task in list(self.tasks.items()):
+            task.cancel()
+            if self.stop_stream:
+                await self.stop_stream(self.jobs[job_id]["key"])
+        if self.jobs:
+            await self.db.stream_jobs.update_many(
+                {"id": {"$in": list(self.jobs)}, "worker_id": self.worker_id, "status": {"$in": ACTIVE_STATUSES}},
+                {"$set": {"status": "scheduled", "worker_id": None, "lease_expires_at": None},
+                 "$inc": {"attempts": -1}}
+            )
+        await self.db.stream_workers.delete_one({"id": self.worker_id})
+        logging.info(f"Stream worker {self.worker_id} stopped, released {len(self.jobs)} jobs")
+
+    # Claiming
+
+    async def claim(self) -> Optional[Dict[str, Any]]:
+        """Atomically take the earliest due job, or one whose worker stopped heartbeating"""
+        now = utcnow()
+        job = await self.db.stream_jobs.find_one_and_update(
+            {"kind": {"$in": list(self.runners)}, "$or": [
+                {"status": "scheduled", "start_time": {"$lte": now + timedelta(seconds=self.lookahead_seconds)}},
+                {"status": {"$in": ACTIVE_STATUSES}, "lease_expires_at": {"$lt": now},
+                 "attempts": {"$lt": self.max_attempts}},
+            ]},
+            {"$set": {
+                "status": "claimed",
+                "worker_id": self.worker_id,
+                "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                "claimed_at": now,
+            }, "$inc": {"attempts": 1}},
+            sort=[("start_time", 1)],
+            return_document=ReturnDocument.AFTER,
+            projection={"_id": 0}
+        )
+        if job:
+            job["start_time"] = _aware(job["start_time"])
+            if job["attempts"] > 1:
+                logging.warning(f"Worker {self.worker_id} took over job {job['id']} for {job['key']} "
+                                f"(attempt {job['attempts']})")
+        return job
+
+    async def _claim_loop(self):
+        while True:
+            try:
+                job = await self.claim() if self.runners and self.active < self.capacity else None
+            except Exception as e:
+                logging.error(f"Worker {self.worker_id} failed to claim jobs: {e}")
+                job = None
+
+            if not job:
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            self.claimed += 1
+            self.jobs[job["id"]] = job
+            self.tasks[job["id"]] = asyncio.create_task(self._run(job))
+            # Busier workers back off longer, so due jobs spread across the pool
+            await asyncio.sleep(self.poll_interval * self.active / self.capacity)
+
+    async def _run(self, job: Dict[str, Any]):
+        try:
+            await self.db.stream_jobs.update_one(
+                {"id": job["id"], "worker_id": self.worker_id},
+                {"$set": {"status": "running", "started_at": utcnow()}}
+            )
+            await self.runners[job["kind"]](job)
+            await self._finish(job, "completed")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Stream job {job['id']} for {job['key']} failed: {e}")
+            await self._finish(job, "failed", str(e))
+        finally:
+            self.tasks.pop(job["id"], None)
+            self.jobs.pop(job["id"], None)
+
+    async def _finish(self, job: Dict[str, Any], status: str, error: Optional[str] = None):
+        await self.db.stream_jobs.update_one(
+            {"id": job["id"], "worker_id": self.worker_id, "status": {"$in": ACTIVE_STATUSES}},
+            {"$set": {"status": status, "finished_at": utcnow(), "lease_expires_at": None, "last_error": error}}
+        )
+
+    # Heartbeats
+
+    async def heartbeat(self):
+        """Publish load and live streams, renew leases on owned jobs, drop jobs owned elsewhere"""
+        now = utcnow()
+        await self.db.stream_workers.update_one(
+            {"id": self.worker_id},
+            {"$set": {
+                "hostname": socket.gethostname(),
+                "pid": os.getpid(),
+                "capacity": self.capacity,
+                "claims_jobs": bool(self.runners),
+                "active": self.active,
+                "jobs": [job["key"] for job in self.jobs.values()],
+                "streams": self.list_streams() if self.list_streams else [],
+                "claimed_total": self.claimed,
+                "heartbeat_at": now,
+            }, "$setOnInsert": {"started_at": now}},
+            upsert=True
+        )
+
+        if self.jobs:
+            job_ids = list(self.jobs)
+            await self.db.stream_jobs.update_many(
+                {"id": {"$in": job_ids}, "worker_id": self.worker_id, "status": {"$in": ACTIVE_STATUSES}},
+                {"$set": {"lease_expires_at": now + timedelta(seconds=self.lease_seconds)}}
+            )
+            owned = {job["id"] async for job in self.db.stream_jobs.find(
+                {"id": {"$in": job_ids}, "worker_id": self.worker_id, "status": {"$in": ACTIVE_STATUSES}},
+                {"id": 1}
+            )}
+            for job_id in set(job_ids) - owned:
+                await self._abandon(job_id)
+
+        # Jobs that kept losing their worker are not retried forever
+        await self.db.stream_jobs.update_many(
+            {"status": {"$in": ACTIVE_STATUSES}, "lease_expires_at": {"$lt": now},
+             "attempts": {"$gte": self.max_attempts}},
+            {"$set": {"status": "failed", "finished_at": now, "last_error": "Lease expired on every attempt"}}
+        )
+
+    async def _abandon(self, job_id: str):
+        """Stop a job that was cancelled or taken over elsewhere"""
+        job = self.jobs.pop(job_id, None)
+        task = self.tasks.pop(job_id, None)
+        if not job:
+            return
+        logging.warning(f"Worker {self.worker_id} no longer owns job {job_id} for {job['key']}; stopping it")
+        if task:
+            task.cancel()
+        if self.stop_stream:
+            await self.stop_stream(job["key"])
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.heartbeat()
+            except Exception as e:
+                logging.error(f"Worker {self.worker_id} heartbeat failed: {e}")
+
+    # Commands from other processes
+
+    async def _command_loop(self):
+        while True:
+            try:
+                command = await self.db.stream_commands.find_one_and_update(
+                    {"worker_id": self.worker_id, "status": "pending"},
+                    {"$set": {"status": "running"}},
+                    return_document=ReturnDocument.AFTER
+                )
+                if not command:
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+                stopped = bool(await self.stop_stream(command["key"])) if self.stop_stream else False
+                await self.db.stream_commands.update_one(
+                    {"id": command["id"]},
+                    {"$set": {"status": "done", "stopped": stopped, "finished_at": utcnow()}}
+                )
+                await self.heartbeat()
+            except Exception as e:
+                logging.error(f"Worker {self.worker_id} failed to process commands: {e}")
+                await asyncio.sleep(self.poll_interval)
@@ -0,0 +1,542 @@
+"""Single FFmpeg stream pipeline: source + encoder profile + sinks -> supervised process"""
+import asyncio
+import logging
+import os
+import struct
+import subprocess
+import tempfile
+import time
+from collections import deque
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from encoder_profiles import DEFAULT_ENCODER_PROFILES, DEFAULT_PROFILE_NAME, encoder_args, output_geometry, still_image_args
+
+# Overridable to point streams at a local RTMP sink (benchmarks)
+YOUTUBE_RTMP_BASE = os.environ.get('YOUTUBE_RTMP_BASE', "rtmp://a.rtmp.youtube.com/live2")
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+BROWSER_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+
+def youtube_rtmp_url(stream_key: str) -> str:
+    return f"{YOUTUBE_RTMP_BASE}/{stream_key}"
+
+
+def is_hls_url(url: str) -> bool:
+    return url.endswith('.m3u8') or 'manifest' in url
+
+
+@dataclass
+class StreamSource:
+    """Input side of a pipeline
+
+    kind is one of:
+      file     - local media file
+      url      - remote HTTP(S)/HLS URL
+      lavfi    - libavfilter graph (location is the video graph, audio_graph the audio one)
+      playlist - concat demuxer list built from `items`
+      still    - pre-encoded picture clip (location) looped under an audio file (audio_graph)
+    """
+    kind: str
+    location: str = ""
+    audio_graph: Optional[str] = None
+    items: List[str] = field(default_factory=list)
+    loop: bool = False
+    realtime: bool = True
+    seek: float = 0  # seconds into a file source to start from
+
+    @classmethod
+    def file(cls, path: str, loop: bool = False, seek: float = 0) -> "StreamSource":
+        return cls(kind="file", location=path, loop=loop, seek=seek)
+
+    @classmethod
+    def url(cls, url: str, loop: bool = False) -> "StreamSource":
+        return cls(kind="url", location=url, loop=loop)
+
+    @classmethod
+    def lavfi(cls, video_graph: str, audio_graph: Optional[str] = None) -> "StreamSource":
+        # Filter sources already generate frames at their own rate
+        return cls(kind="lavfi", location=video_graph, audio_graph=audio_graph, realtime=False)
+
+    @classmethod
+    def playlist(cls, paths: List[str], loop: bool = False) -> "StreamSource":
+        return cls(kind="playlist", items=list(paths), loop=loop)
+
+    @classmethod
+    def still(cls, clip_path: str, audio_path: str, seek: float = 0) -> "StreamSource":
+        # `seek` applies to the audio; the clip is one GOP, so any loop start is a keyframe
+        return cls(kind="still", location=clip_path, audio_graph=audio_path, seek=seek)
+
+    @property
+    def probe_target(self) -> Optional[str]:
+        """Path or URL suitable for ffprobe source analysis"""
+        if self.kind in ("file", "url"):
+            return self.location
+        if self.kind == "still":
+            return self.audio_graph
+        if self.kind == "playlist" and self.items:
+            return self.items[0]
+        return None
+
+    def input_args(self) -> List[str]:
+        args: List[str] = []
+        if self.kind == "lavfi":
+            args += ['-f', 'lavfi', '-i', self.location]
+            if self.audio_graph:
+                args += ['-f', 'lavfi', '-i', self.audio_graph]
+            return args
+        if self.kind == "still":
+            args += ['-stream_loop', '-1', '-re', '-i', self.location, '-re']
+            if self.seek:
+                args += ['-ss', f'{self.seek:.3f}']
+            return args + ['-i', self.audio_graph]
+
+        if self.loop:
+            args += ['-stream_loop', '-1']
+        if self.realtime:
+            args += ['-re']  # Read at native frame rate
+
+        if self.kind == "url":
+            if is_hls_url(self.location):
+                args += [
+                    '-protocol_whitelist', 'file,http,https,tcp,tls,crypto',
+                    '-user_agent', BROWSER_USER_AGENT,
+                    '-headers', f'User-Agent: {BROWSER_USER_AGENT}',
+                ]
+            args += ['-i', self.location]
+        elif self.kind == "playlist":
+            args += ['-f', 'concat', '-safe', '0', '-i', self._write_concat_list()]
+        else:
+            if self.seek:
+                args += ['-ss', f'{self.seek:.3f}']
+            args += ['-i', self.location]
+        return args
+
+    def _write_concat_list(self) -> str:
+        if not self.location:
+            fd, self.location = tempfile.mkstemp(prefix='playlist_', suffix='.txt')
+            with os.fdopen(fd, 'w') as f:
+                for item in self.items:
+                    escaped = item.replace("'", "'\\''")
+                    f.write(f"file '{escaped}'\n")
+        return self.location
+
+    def stream_maps(self) -> List[str]:
+        if self.kind == "still" or (self.kind == "lavfi" and self.audio_graph):
+            return ['-map', '0:v:0', '-map', '1:a:0']
+        return ['-map', '0:v:0', '-map', '0:a:0?']
+
+
+@dataclass
+class Preroll:
+    """Slate streamed before the source, so the encoder is connected and warm when the content airs
+
+    `image` is a still shown for the whole pre-roll; without one the slate is a
+    plain dark frame. Both come with silence.
+    """
+    seconds: float
+    image: Optional[str] = None
+
+
+SLATE_COLOR = "0x101010"
+AUDIO_FORMAT = "aformat=sample_fmts=fltp:sample_rates=44100:channel_layouts=stereo"
+
+
+def _fit(width: int, height: int) -> str:
+    return f'scale={width}:{height}:force_original_aspect_ratio=decrease,pad={width}:{height}:(ow-iw)/2:(oh-ih)/2'
+
+
+def preroll_graph(preroll: Preroll, source: StreamSource, profile: Dict[str, Any],
+                  analysis: Optional[Dict[str, Any]], video_filter: Optional[str]) -> Tuple[List[str], List[str]]:
+    """(input args, filter/map args) that play the slate and then the source as one real-time timeline
+
+    The source is opened at launch but only read once the slate ends; the
+    realtime filters pace the joined output instead of -re on the input.
+    """
+    width, height, fps = output_geometry(profile, analysis)
+    seconds = f"{preroll.seconds:.3f}"
+    if preroll.image:
+        inputs = ['-loop', '1', '-framerate', str(fps), '-t', seconds, '-i', preroll.image]
+    else:
+        inputs = ['-f', 'lavfi', '-t', seconds, '-i', f'color=c={SLATE_COLOR}:s={width}x{height}:r={fps}']
+    inputs += ['-f', 'lavfi', '-t', seconds, '-i', 'anullsrc=r=44100:cl=stereo']
+    inputs += replace(source, realtime=False).input_args()
+
+    video_ref = '2:v:0'
+    if source.kind == "lavfi" and source.audio_graph:
+        audio_ref = '3:a:0'
+    elif analysis is not None and not analysis.get("audio_codec"):
+        # Silent sources get silence for as long as they last, so the segment can end
+        duration = analysis.get("duration")
+        silence_length = ['-t', f"{duration:.3f}"] if duration and not source.loop else []
+        inputs += ['-f', 'lavfi', *silence_length, '-i', 'anullsrc=r=44100:cl=stereo']
+        audio_ref = '3:a:0'
+    else:
+        audio_ref = '2:a:0'
+
+    graph = ';'.join([
+        f'[0:v]{_fit(width, height)},fps={fps},setsar=1,format=yuv420p[slate_v]',
+        f'[1:a]{AUDIO_FORMAT}[slate_a]',
+        f'[{video_ref}]{video_filter or _fit(width, height)},fps={fps},setsar=1,format=yuv420p[content_v]',
+        f'[{audio_ref}]aresample=44100,{AUDIO_FORMAT}[content_a]',
+        '[slate_v][slate_a][content_v][content_a]concat=n=2:v=1:a=1[joined_v][joined_a]',
+        '[joined_v]realtime[v]',
+        '[joined_a]arealtime[a]',
+    ])
+    return inputs, ['-filter_complex', graph, '-map', '[v]', '-map', '[a]']
+
+
+PROGRESS_INTERVAL_SECONDS = 5
+PROGRESS_KEYS = {
+    'frame', 'fps', 'bitrate', 'total_size', 'out_time_us', 'out_time_ms', 'out_time',
+    'dup_frames', 'drop_frames', 'speed', 'progress',
+}
+
+
+def _parse_number(value: str, suffix: str = '') -> Optional[float]:
+    try:
+        return float(value[:-len(suffix)] if suffix and value.endswith(suffix) else value)
+    except ValueError:
+        return None  # "N/A" until FFmpeg has enough data
+
+
+def parse_progress(values: Dict[str, str]) -> Dict[str, Any]:
+    """Encoder metrics from one FFmpeg -progress block"""
+    out_time_us = _parse_number(values.get('out_time_us', ''))
+    return {
+        "frame": int(_parse_number(values.get('frame', '')) or 0),
+        "fps": _parse_number(values.get('fps', '')),
+        "bitrate_kbps": _parse_number(values.get('bitrate', ''), 'kbits/s'),
+        "speed": _parse_number(values.get('speed', '').strip(), 'x'),
+        "out_time_seconds": round(out_time_us / 1e6, 1) if out_time_us else None,
+        "dup_frames": int(_parse_number(values.get('dup_frames', '')) or 0),
+        "drop_frames": int(_parse_number(values.get('drop_frames', '')) or 0),
+    }
+
+
+def build_command(source: StreamSource, profile: Optional[Dict[str, Any]], sinks: List[str],
+                  analysis: Optional[Dict[str, Any]] = None, video_filter: Optional[str] = None,
+                  duration_seconds: Optional[int] = None, preroll: Optional[Preroll] = None,
+                  copy_to: Optional[str] = None) -> List[str]:
+    """Build the FFmpeg argument list for a source, encoder profile and one or more sinks
+
+    A `preroll` is ignored for copy-mode output, which cannot splice a slate in,
+    and for still sources, whose picture is copied and whose `analysis`
+    describes the audio. `copy_to` additionally writes the source's first
+    video and audio streams, unchanged, to that MP4 path as they are read.
+    """
+    if not sinks:
+        raise ValueError("At least one sink is required")
+
+    profile = profile or DEFAULT_ENCODER_PROFILES[DEFAULT_PROFILE_NAME]
+    if source.kind == "still":
+        output_args = still_image_args(profile, analysis)
+        preroll = None
+    else:
+        output_args = encoder_args(profile, analysis, video_filter)
+    # -nostats: progress lines are \r-terminated and would never reach the line reader;
+    # -progress writes newline-terminated key=value blocks instead
+    cmd = ['ffmpeg', '-y', '-nostdin', '-nostats',
+           '-progress', 'pipe:1', '-stats_period', str(PROGRESS_INTERVAL_SECONDS)]
+
+    if preroll and preroll.seconds > 0 and output_args[1] != 'copy':
+        # A copy profile that got here fell back to the default encode in encoder_args
+        encode_profile = DEFAULT_ENCODER_PROFILES[DEFAULT_PROFILE_NAME] if profile.get("mode") == "copy" else profile
+        inputs, maps = preroll_graph(preroll, source, encode_profile, analysis, video_filter)
+        cmd += inputs
+        # The filter graph already scales the source
+        vf = output_args.index('-vf')
+        output_args = output_args[:vf] + output_args[vf + 2:]
+        if duration_seconds:
+            duration_seconds = f"{duration_seconds + preroll.seconds:.3f}"
+    else:
+        cmd += source.input_args()
+        # Two inputs need explicit maps even for a single sink
+        maps = source.stream_maps() if source.kind == "still" else []
+    # Second output: the source read once, both streamed and kept
+    copy_output = []
+    if copy_to:
+        source_input = 2 if maps[:1] == ['-filter_complex'] else 0
+        copy_output = ['-map', f'{source_input}:v:0', '-map', f'{source_input}:a:0?', '-c', 'copy', '-f', 'mp4', copy_to]
+
+    if len(sinks) == 1:
+        cmd += maps + output_args
+        if duration_seconds:
+            cmd += ['-t', str(duration_seconds)]
+        cmd.append(sinks[0])
+        return cmd + copy_output
+
+    # Fan out one encode to several destinations with the tee muxer; a failing
+    # sink is dropped rather than taking the others down with it
+    cmd += output_args[:-4]  # drop -f flv -flvflags no_duration_filesize
+    if duration_seconds:
+        cmd += ['-t', str(duration_seconds)]
+    cmd += maps or source.stream_maps()
+    cmd += ['-f', 'tee', '|'.join(f'[f=flv:onfail=ignore:flvflags=no_duration_filesize]{sink}' for sink in sinks)]
+    return cmd + copy_output
+
+
+def mp4_is_faststart(path: str) -> bool:
+    """True when the moov atom precedes mdat, so the file can be read progressively"""
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    return False
+                size, box_type = struct.unpack('>I4s', header)
+                if box_type == b'moov':
+                    return True
+                if box_type == b'mdat':
+                    return False
+                if size == 1:
+                    size = struct.unpack('>Q', f.read(8))[0]
+                    f.seek(size - 16, os.SEEK_CUR)
+                elif size == 0:
+                    return False
+                else:
+                    f.seek(size - 8, os.SEEK_CUR)
+    except (OSError, struct.error):
+        return False
+
+
+def remux_faststart(source: str, destination: str, timeout: int = 1800) -> bool:
+    """Copy audio/video into a faststart MP4 without re-encoding; `destination` is removed on failure"""
+    succeeded = False
+    try:
+        result = subprocess.run(
+            ['ffmpeg', '-y', '-nostdin', '-v', 'error', '-i', source,
+             '-map', '0:v:0', '-map', '0:a:0?', '-c', 'copy',
+             '-movflags', '+faststart', destination],
+            capture_output=True, text=True, timeout=timeout
+        )
+        if result.returncode != 0:
+            logging.error(f"Remux of {source} failed: {result.stderr.strip()[-500:]}")
+            return False
+        succeeded = True
+        return True
+    except subprocess.TimeoutExpired:
+        logging.error(f"Remux of {source} timed out after {timeout}s")
+        return False
+    finally:
+        if not succeeded and os.path.exists(destination):
+            os.remove(destination)
+
+
+def remove_files(paths: List[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.error(f"Failed to remove {path}: {e}")
+
+
+@dataclass
+class StreamHandle:
+    """A running pipeline registered with the supervisor"""
+    key: str
+    process: asyncio.subprocess.Process
+    command: List[str]
+    method: str
+    started_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    output_tail: deque = field(default_factory=lambda: deque(maxlen=50))
+    metrics: Dict[str, Any] = field(default_factory=dict)  # latest -progress block
+    stopped: bool = False  # set when stopped on purpose rather than exiting on its own
+    progress_at: float = field(default_factory=time.monotonic)  # when output last advanced
+    tasks: Set[asyncio.Task] = field(default_factory=set)  # watcher and delayed stop; the loop keeps only weak refs
+    temp_files: List[str] = field(default_factory=list)  # removed once the process has exited
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    @property
+    def running(self) -> bool:
+        return self.process.returncode is None
+
+    def output(self) -> str:
+        return '\n'.join(self.output_tail)
+
+    def stalled_for(self) -> float:
+        """Seconds since the output position last advanced (since launch, before the first frame)"""
+        return time.monotonic() - self.progress_at
+
+    def resource_usage(self) -> Optional[Tuple[float, int]]:
+        """(CPU seconds, resident bytes) of the FFmpeg process from /proc; None when unavailable"""
+        try:
+            with open(f'/proc/{self.pid}/stat') as f:
+                # Fields after the parenthesised command name, which may itself contain spaces
+                fields = f.read().rpartition(')')[2].split()
+            with open(f'/proc/{self.pid}/statm') as f:
+                resident_pages = int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            return None
+        return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS, resident_pages * PAGE_SIZE
+
+
+class StreamSupervisor:
+    """Tracks every FFmpeg process this API process has spawned"""
+
+    def __init__(self):
+        self.streams: Dict[str, StreamHandle] = {}
+        self.exit_callbacks: List[Callable[[StreamHandle], Any]] = []
+        self.progress_callbacks: List[Callable[[StreamHandle], Any]] = []
+
+    def on_exit(self, callback: Callable[[StreamHandle], Any]):
+        self.exit_callbacks.append(callback)
+        return callback
+
+    def on_progress(self, callback: Callable[[StreamHandle], Any]):
+        """Called with the handle every PROGRESS_INTERVAL_SECONDS once `handle.metrics` is updated"""
+        self.progress_callbacks.append(callback)
+        return callback
+
+    async def _run_callbacks(self, callbacks: List[Callable[[StreamHandle], Any]], handle: StreamHandle):
+        for callback in callbacks:
+            try:
+                result = callback(handle)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logging.error(f"Stream callback {callback.__name__} failed for {handle.key}: {e}")
+
+    def _track(self, handle: StreamHandle, coroutine) -> asyncio.Task:
+        task = asyncio.create_task(coroutine)
+        handle.tasks.add(task)
+        task.add_done_callback(handle.tasks.discard)
+        return task
+
+    async def spawn(self, key: str, command: List[str], method: str,
+                    metadata: Optional[Dict[str, Any]] = None,
+                    temp_files: Optional[List[str]] = None) -> StreamHandle:
+        """Start FFmpeg asynchronously and register it under `key`
+
+        `temp_files` (e.g. a concat list) are deleted once FFmpeg exits.
+        """
+        logging.info(f"Starting FFmpeg ({method}) for {key}")
+        logging.debug(f"FFmpeg command for {key}: {' '.join(command)}")
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+        handle = StreamHandle(key=key, process=process, command=command, method=method,
+                              metadata=metadata or {}, temp_files=list(temp_files or []))
+        previous = self.streams.get(key)
+        if previous and previous.running:
+            logging.warning(f"Replacing running stream {key} (pid {previous.pid})")
+        self.streams[key] = handle
+        self._track(handle, self._watch(handle))
+        return handle
+
+    async def _watch(self, handle: StreamHandle):
+        progress: Dict[str, str] = {}
+        try:
+            async for raw in handle.process.stdout:
+                line = raw.decode(errors='replace').rstrip()
+                key, sep, value = line.partition('=')
+                if sep and key in PROGRESS_KEYS:
+                    progress[key] = value
+                    if key == 'progress':
+                        previous = handle.metrics.get("out_time_seconds") or 0
+                        handle.metrics = parse_progress(progress)
+                        progress = {}
+                        if (handle.metrics.get("out_time_seconds") or 0) > previous:
+                            handle.progress_at = time.monotonic()
+                        await self._run_callbacks(self.progress_callbacks, handle)
+                elif line:
+                    # Kept in the tail for failure reports rather than logged line by line
+                    handle.output_tail.append(line)
+                    logging.debug(f"FFmpeg[{handle.key}]: {line}")
+        except Exception as e:
+            logging.error(f"Lost FFmpeg output for {handle.key}: {e}")
+        returncode = await handle.process.wait()
+        logging.info(f"FFmpeg for {handle.key} exited with code {returncode}")
+        await self._run_callbacks(self.exit_callbacks, handle)
+        remove_files(handle.temp_files)
+        # Whoever runs the stream holds the handle; a replacement may already be registered
+        if self.streams.get(handle.key) is handle:
+            del self.streams[handle.key]
+
+    async def wait_started(self, handle: StreamHandle, seconds: float) -> bool:
+        """Give FFmpeg a moment to fail on bad input/sink; True if it is still running"""
+        try:
+            await asyncio.wait_for(asyncio.shield(handle.process.wait()), timeout=seconds)
+        except asyncio.TimeoutError:
+            return True
+        # Let the watcher drain the remaining output into the tail
+        await asyncio.sleep(0.1)
+        return False
+
+    async def wait_exit_or_stall(self, handle: StreamHandle, stall_seconds: float) -> bool:
+        """Wait for FFmpeg to exit; True instead once its output has not advanced for `stall_seconds`"""
+        while handle.running:
+            try:
+                await asyncio.wait_for(asyncio.shield(handle.process.wait()), timeout=PROGRESS_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                if handle.stalled_for() > stall_seconds:
+                    return True
+        return False
+
+    def get(self, key: str) -> Optional[StreamHandle]:
+        return self.streams.get(key)
+
+    async def stop(self, key: str, timeout: float = 10, deliberate: bool = True) -> bool:
+        """Terminate a registered stream; False if it was not running here
+
+        Without `deliberate` the handle is not marked stopped, so the code
+        running the stream treats the exit like a failure (e.g. a stall).
+        """
+        handle = self.streams.get(key)
+        if not handle or not handle.running:
+            return False
+        handle.stopped = handle.stopped or deliberate
+        handle.process.terminate()
+        try:
+            await asyncio.wait_for(handle.process.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            handle.process.kill()
+            await handle.process.wait()
+        return True
+
+    def stop_later(self, key: str, seconds: float):
+        """Stop a stream after a delay (used by the short-lived test endpoints)"""
+        handle = self.streams.get(key)
+        if not handle:
+            return
+
+        async def _stop():
+            await asyncio.sleep(seconds)
+            if self.streams.get(key) is handle:
+                await self.stop(key)
+        self._track(handle, _stop())
+
+    def active(self) -> List[StreamHandle]:
+        return [h for h in self.streams.values() if h.running]
+
+
+supervisor = StreamSupervisor()
+
+
+async def start_pipeline(key: str, source: StreamSource, sinks: List[str], method: str,
+                         profile: Optional[Dict[str, Any]] = None, analysis: Optional[Dict[str, Any]] = None,
+                         video_filter: Optional[str] = None, duration_seconds: Optional[int] = None,
+                         metadata: Optional[Dict[str, Any]] = None, preroll: Optional[Preroll] = None,
+                         copy_to: Optional[str] = None) -> StreamHandle:
+    """Build, spawn and register a pipeline in one call"""
+    if source.kind == "playlist":
+        # Each process gets its own concat list, deleted when that process exits
+        source = replace(source, location="")
+    command = build_command(source, profile, sinks, analysis, video_filter, duration_seconds, preroll, copy_to)
+    temp_files = [source.location] if source.kind == "playlist" else []
+    try:
+        return await supervisor.spawn(key, command, method, metadata, temp_files)
+    except Exception:
+        remove_files(temp_files)
+        raise
@@ -0,0 +1,50 @@
+"""Standalone stream worker: claims scheduled stream jobs from MongoDB and runs FFmpeg on this node
+
+Run any number of these (on one or more machines sharing MongoDB and the
+uploads volume) next to API processes started with STREAM_WORKER_MODE=off:
+
+    python worker.py
+
+STREAM_WORKER_CAPACITY caps concurrent streams per worker (default: half the cores).
+METRICS_PORT, when set, serves the Prometheus metrics of this worker on that port.
+"""
+import asyncio
+import logging
+import os
+import signal
+
+import metrics
+import server
+
+
+async def main():
+    await server.ensure_stream_job_indexes(server.db)
+    # Streams publish events; the capped collection must exist before the first one is written
+    await server.prepare_event_bus()
+    worker = server.create_stream_worker()
+    server.stream_worker = worker
+    await worker.start()
+    await server.start_write_buffer()
+    await server.start_quota_ledger()
+    # This node's disk: orphan sweep, source cache cap and free-space floor
+    await server.start_storage_maintenance()
+    await server.preload_dependencies()
+    await server.prepare_slates()
+    if os.environ.get('METRICS_PORT'):
+        await metrics.serve(int(os.environ['METRICS_PORT']))
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    logging.info("Shutting down stream worker")
+    await worker.stop()
+    await server.flush_write_buffer()
+    await server.flush_quota_ledger()
+    server.client.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
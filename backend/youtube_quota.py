@@ -0,0 +1,302 @@
+"""YouTube Data API quota: unit costs, a MongoDB ledger, a token bucket and retries
+
+Every API call goes through `QuotaBudget.call`. Before the request, the call
+is checked against the project's daily quota as recorded in the ledger,
+and a token bucket smooths bursts by making callers wait (or fail once the
+wait would be too long). After the request its cost is recorded per
+(project, Pacific day, user, method); the pending counts are written to
+MongoDB by `flush` every few seconds rather than per call. 5xx and
+rate-limit errors are retried with jittered exponential backoff, except
+that inserts are only retried when rate limited: a 5xx may come back after
+the resource was created, and a retry would create a duplicate.
+quotaExceeded marks the project exhausted until the daily reset, so later
+calls fail immediately instead of being sent.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+from zoneinfo import ZoneInfo
+
+from googleapiclient.errors import HttpError
+from pymongo import UpdateOne
+
+# Units per call from the YouTube Data API quota calculator; unlisted methods cost 1
+METHOD_COSTS = {
+    "youtube.liveBroadcasts.insert": 50,
+    "youtube.liveBroadcasts.update": 50,
+    "youtube.liveBroadcasts.bind": 50,
+    "youtube.liveBroadcasts.transition": 50,
+    "youtube.liveBroadcasts.delete": 50,
+    "youtube.liveStreams.insert": 50,
+    "youtube.liveStreams.update": 50,
+    "youtube.liveStreams.delete": 50,
+    "youtube.search.list": 100,
+    "youtube.videos.insert": 1600,
+}
+DEFAULT_COST = 1
+DEFAULT_DAILY_QUOTA = 10000
+# Quota days start at midnight Pacific time
+QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+
+QUOTA_REASONS = {"quotaExceeded", "dailyLimitExceeded"}
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+# Not safe to resend after a 5xx (see is_retryable)
+NON_IDEMPOTENT_METHODS = {
+    "youtube.liveBroadcasts.insert",
+    "youtube.liveStreams.insert",
+    "youtube.videos.insert",
+}
+DEFAULT_MAX_RETRIES = 4
+BACKOFF_BASE_SECONDS = 1
+BACKOFF_MAX_SECONDS = 32
+
+T = TypeVar("T")
+
+
+class QuotaError(Exception):
+    """Work refused locally because of the API quota; `retry_at` is when it may succeed"""
+
+    def __init__(self, message: str, retry_at: datetime):
+        super().__init__(message)
+        self.retry_at = retry_at
+
+
+class QuotaExhausted(QuotaError):
+    """The project's daily quota is used up (locally estimated or reported by Google)"""
+
+
+class QuotaThrottled(QuotaError):
+    """The token bucket would have made the call wait longer than allowed"""
+
+
+def method_cost(method: str) -> int:
+    return METHOD_COSTS.get(method, DEFAULT_COST)
+
+
+def quota_day(now: Optional[datetime] = None) -> str:
+    return (now or datetime.now(timezone.utc)).astimezone(QUOTA_TIMEZONE).date().isoformat()
+
+
+def next_reset(now: Optional[datetime] = None) -> datetime:
+    local = (now or datetime.now(timezone.utc)).astimezone(QUOTA_TIMEZONE)
+    midnight = datetime.combine(local.date() + timedelta(days=1), datetime.min.time(), tzinfo=QUOTA_TIMEZONE)
+    return midnight.astimezone(timezone.utc)
+
+
+def error_reason(error: HttpError) -> Optional[str]:
+    """The `reason` of a Google API error response (e.g. quotaExceeded), if it has one"""
+    try:
+        details = json.loads(error.content.decode()).get("error", {})
+    except (ValueError, AttributeError, UnicodeDecodeError):
+        return None
+    errors = details.get("errors") or []
+    return errors[0].get("reason") if errors else details.get("status")
+
+
+def is_retryable(status: int, reason: Optional[str], idempotent: bool = True) -> bool:
+    """Rate-limited requests were refused before any work; a 5xx one may have taken effect"""
+    if status == 429 or reason in RATE_LIMIT_REASONS:
+        return True
+    return idempotent and status >= 500
+
+
+def backoff_delay(retry: int) -> float:
+    """Exponential backoff with equal jitter: half the step plus a random share of the other half"""
+    step = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** retry)
+    return step / 2 + random.uniform(0, step / 2)
+
+
+class TokenBucket:
+    """Quota units per second with a burst allowance; callers reserve units and wait out any debt"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, amount: float, max_wait: float) -> Optional[float]:
+        """Seconds to wait before using `amount` units, or None (nothing reserved) if over max_wait"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = max(0.0, (amount - self.tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            # Tokens may go negative: later callers queue behind this reservation
+            self.tokens -= amount
+            return wait
+
+
+class QuotaBudget:
+    """Daily quota, rate limiting, retries and ledger accounting for one Google Cloud project
+
+    Thread-safe: googleapiclient requests execute in worker threads, so
+    `call` blocks its thread while it waits for tokens or backs off.
+    """
+
+    def __init__(self, project: str, daily_quota: int = DEFAULT_DAILY_QUOTA, rate: float = 25,
+                 burst: float = 500, max_wait: float = 30, max_retries: int = DEFAULT_MAX_RETRIES):
+        self.project = project
+        self.daily_quota = daily_quota
+        self.bucket = TokenBucket(rate, burst)
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.lock = threading.Lock()
+        self.day = quota_day()
+        # Project total for `day` across all processes as of the last flush
+        self.ledger_units = 0
+        # (day, user_id, method) -> [units, calls, errors] not yet written to the ledger
+        self.pending: Dict[Tuple[str, str, str], List[int]] = {}
+        self.exhausted_until: Optional[datetime] = None
+
+    def used(self) -> int:
+        with self.lock:
+            return self.ledger_units + sum(units for (day, _, _), (units, _, _) in self.pending.items() if day == self.day)
+
+    def remaining(self) -> int:
+        return max(0, self.daily_quota - self.used())
+
+    def _roll_day(self, now: datetime):
+        day = quota_day(now)
+        if day != self.day:
+            with self.lock:
+                self.day = day
+                self.ledger_units = 0
+
+    def admit(self, method: str, cost: int):
+        """Block until the call may be sent; raises QuotaError if it should not be sent at all"""
+        now = datetime.now(timezone.utc)
+        self._roll_day(now)
+        if self.exhausted_until and now < self.exhausted_until:
+            raise QuotaExhausted(
+                f"YouTube API quota is exhausted until {self.exhausted_until.isoformat()} (daily reset)",
+                self.exhausted_until
+            )
+        if self.used() + cost > self.daily_quota:
+            raise QuotaExhausted(
+                f"{method} needs {cost} units but only {self.remaining()} of the daily {self.daily_quota} remain",
+                next_reset(now)
+            )
+        wait = self.bucket.reserve(cost, self.max_wait)
+        if wait is None:
+            raise QuotaThrottled(
+                f"YouTube API rate budget is saturated; {method} would wait over {self.max_wait:.0f}s",
+                now + timedelta(seconds=self.max_wait)
+            )
+        if wait:
+            time.sleep(wait)
+
+    def record(self, method: str, user_id: Optional[str], cost: int, failed: bool = False):
+        # Google charges failed requests too
+        with self.lock:
+            entry = self.pending.setdefault((self.day, user_id or "", method), [0, 0, 0])
+            entry[0] += cost
+            entry[1] += 1
+            entry[2] += int(failed)
+
+    def mark_exhausted(self, now: Optional[datetime] = None):
+        with self.lock:
+            self.exhausted_until = next_reset(now)
+        logging.error(f"YouTube API quota for project {self.project} exhausted until {self.exhausted_until}")
+
+    def call(self, method: str, user_id: Optional[str], attempt: Callable[[], T]) -> T:
+        """Run one API request with admission, accounting and retries"""
+        cost = method_cost(method)
+        for retry in range(self.max_retries + 1):
+            self.admit(method, cost)
+            try:
+                result = attempt()
+            except HttpError as e:
+                self.record(method, user_id, cost, failed=True)
+                reason = error_reason(e)
+                if reason in QUOTA_REASONS:
+                    self.mark_exhausted()
+                    raise QuotaExhausted(
+                        f"YouTube API quota exceeded ({reason}); calls are paused until {self.exhausted_until.isoformat()}",
+                        self.exhausted_until
+                    ) from e
+                if retry < self.max_retries and is_retryable(e.resp.status, reason,
+                                                             idempotent=method not in NON_IDEMPOTENT_METHODS):
+                    delay = backoff_delay(retry)
+                    logging.warning(f"{method} failed with {e.resp.status} {reason}, retrying in {delay:.1f}s")
+                    time.sleep(delay)
+                    continue
+                raise
+            self.record(method, user_id, cost)
+            return result
+
+    async def ensure_indexes(self, db):
+        await db.api_quota.create_index([("project", 1), ("day", 1), ("user_id", 1), ("method", 1)], unique=True)
+
+    async def flush(self, db):
+        """Write pending usage to the ledger and refresh the project's shared totals"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if pending:
+            now = datetime.now(timezone.utc)
+            try:
+                await db.api_quota.bulk_write([
+                    UpdateOne(
+                        {"project": self.project, "day": day, "user_id": user_id, "method": method},
+                        {"$inc": {"units": units, "calls": calls, "errors": errors}, "$set": {"updated_at": now}},
+                        upsert=True
+                    )
+                    for (day, user_id, method), (units, calls, errors) in pending.items()
+                ], ordered=False)
+            except Exception:
+                # Put the counts back so the next flush retries them
+                with self.lock:
+                    for key, counts in pending.items():
+                        entry = self.pending.setdefault(key, [0, 0, 0])
+                        for i, value in enumerate(counts):
+                            entry[i] += value
+                raise
+
+        day = quota_day()
+        totals = await db.api_quota.aggregate([
+            {"$match": {"project": self.project, "day": day}},
+            {"$group": {"_id": None, "units": {"$sum": "$units"}}}
+        ]).to_list(1)
+        state = await db.api_quota_state.find_one({"_id": self.project})
+        with self.lock:
+            if day == self.day:
+                self.ledger_units = totals[0]["units"] if totals else 0
+            # Another process may have hit quotaExceeded; share it in both directions
+            shared = state.get("exhausted_until") if state else None
+            if shared and shared.tzinfo is None:
+                shared = shared.replace(tzinfo=timezone.utc)
+            local = self.exhausted_until
+        if local and (not shared or local > shared):
+            await db.api_quota_state.update_one({"_id": self.project}, {"$set": {"exhausted_until": local}}, upsert=True)
+        elif shared and (not local or shared > local):
+            with self.lock:
+                self.exhausted_until = shared
+
+    async def usage(self, db, user_id: Optional[str] = None, day: Optional[str] = None) -> Dict[str, Any]:
+        """Ledger totals for a day: project-wide, per method and for one user"""
+        day = day or quota_day()
+        rows = await db.api_quota.find({"project": self.project, "day": day}, {"_id": 0}).to_list(None)
+        methods: Dict[str, Dict[str, int]] = {}
+        for row in rows:
+            totals = methods.setdefault(row["method"], {"units": 0, "calls": 0, "errors": 0})
+            for field in ("units", "calls", "errors"):
+                totals[field] += row.get(field, 0)
+        used = sum(row.get("units", 0) for row in rows)
+        return {
+            "project": self.project,
+            "day": day,
+            "daily_quota": self.daily_quota,
+            "used": used,
+            "remaining": max(0, self.daily_quota - used),
+            "user_units": sum(row.get("units", 0) for row in rows if user_id and row["user_id"] == user_id),
+            "methods": methods,
+            "exhausted_until": self.exhausted_until.isoformat() if self.exhausted_until else None,
+            "resets_at": next_reset().isoformat(),
+        }
@@ -17,6 +17,11 @@ import { AlertCircle, Calendar as CalendarIcon, Clock, Play, Trash2, Youtube, Vi
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Times are entered in the browser's timezone; requests name it so the backend resolves them the same way
+const USER_TIMEZONE = Intl.DateTimeFormat().resolvedOptions().timeZone || 'UTC';
+const TIMEZONE_LABEL = new Intl.DateTimeFormat('en-US', { timeZone: USER_TIMEZONE, timeZoneName: 'short' })
+  .formatToParts(new Date()).find((part) => part.type === 'timeZoneName')?.value || USER_TIMEZONE;
+
 // Auth component
 const AuthPage = ({ onAuth }) => {
   const [loading, setLoading] = useState(false);
@@ -120,18 +125,16 @@ const ScheduleForm = ({ selectedVideo, onSchedule, loading }) => {
   const validateScheduleTimes = () => {
     const errors = [];
     
-    // Get current time in IST - use proper IST calculation
     const now = new Date();
-    const nowIST = new Date(now.toLocaleString("en-US", {timeZone: "Asia/Kolkata"}));
     
     const times = showCustomTimes ? customTimes : ['05:55', '06:55', '07:55', '16:55', '17:55'];
     
-    // Check if selected date is in the past (IST date)
-    const todayIST = new Date(nowIST.getFullYear(), nowIST.getMonth(), nowIST.getDate());
+    // Check if selected date is in the past (local date)
+    const today = new Date(now.getFullYear(), now.getMonth(), now.getDate());
     const selectedDateOnly = new Date(selectedDate.getFullYear(), selectedDate.getMonth(), selectedDate.getDate());
     
-    if (selectedDateOnly < todayIST) {
-      errors.push('Selected date cannot be in the past (IST timezone)');
+    if (selectedDateOnly < today) {
+      errors.push(`Selected date cannot be in the past (${TIMEZONE_LABEL})`);
       return errors;
     }
 
@@ -143,21 +146,21 @@ const ScheduleForm = ({ selectedVideo, onSchedule, loading }) => {
       scheduleDateTime.setHours(hour, minute, 0, 0);
       
       // If scheduling for today and time is in the past, assume next day
-      const isToday = selectedDateOnly.getTime() === todayIST.getTime();
-      if (isToday && scheduleDateTime <= nowIST) {
+      const isToday = selectedDateOnly.getTime() === today.getTime();
+      if (isToday && scheduleDateTime <= now) {
         scheduleDateTime = new Date(scheduleDateTime.getTime() + 24 * 60 * 60 * 1000); // Add one day
       }
       
       // Calculate time difference
-      const timeDiff = scheduleDateTime - nowIST;
+      const timeDiff = scheduleDateTime - now;
       const minutesFromNow = timeDiff / (1000 * 60);
 
       if (minutesFromNow < 3) {
-        errors.push(`Time ${timeStr} IST: Must be at least 3 minutes in the future (${Math.round(minutesFromNow)} mins from now)`);
+        errors.push(`Time ${timeStr} ${TIMEZONE_LABEL}: Must be at least 3 minutes in the future (${Math.round(minutesFromNow)} mins from now)`);
       }
 
       if (timeDiff > 180 * 24 * 60 * 60 * 1000) { // 180 days in milliseconds
-        errors.push(`Time ${timeStr} IST: Cannot schedule more than 6 months in advance`);
+        errors.push(`Time ${timeStr} ${TIMEZONE_LABEL}: Cannot schedule more than 6 months in advance`);
       }
     });
 
@@ -203,7 +206,7 @@ const ScheduleForm = ({ selectedVideo, onSchedule, loading }) => {
       video_title: selectedVideo.title,
       selected_date: selectedDate.toISOString(),
       custom_times: showCustomTimes ? customTimes : null,
-      timezone: "Asia/Kolkata"
+      timezone: USER_TIMEZONE
     };
 
     onSchedule(scheduleData);
@@ -241,10 +244,10 @@ const ScheduleForm = ({ selectedVideo, onSchedule, loading }) => {
         />
         <div className="space-y-1">
           <p className="text-sm text-gray-600">
-            ⏰ Broadcasts can be scheduled 3 minutes to 6 months from now (IST timezone)
+            ⏰ Broadcasts can be scheduled 3 minutes to 6 months from now ({USER_TIMEZONE} time)
           </p>
           <p className="text-xs text-blue-600">
-            🌍 Current IST time: {new Date().toLocaleString('en-IN', { timeZone: 'Asia/Kolkata' })}
+            🌍 Current {TIMEZONE_LABEL} time: {new Date().toLocaleString()}
           </p>
           <p className="text-xs text-green-600">
             🔄 Auto-start and auto-stop are enabled for all scheduled broadcasts
@@ -284,10 +287,10 @@ const ScheduleForm = ({ selectedVideo, onSchedule, loading }) => {
 
         {!showCustomTimes && (
           <div className="bg-gray-50 p-4 rounded-lg">
-            <p className="text-sm text-gray-600 mb-2">Default broadcast times (IST):</p>
+            <p className="text-sm text-gray-600 mb-2">Default broadcast times ({TIMEZONE_LABEL}):</p>
             <div className="flex flex-wrap gap-2">
               {['05:55', '06:55', '07:55', '16:55', '17:55'].map((time, index) => (
-                <Badge key={index} className="bg-red-100 text-red-800">{time} IST</Badge>
+                <Badge key={index} className="bg-red-100 text-red-800">{time} {TIMEZONE_LABEL}</Badge>
               ))}
             </div>
           </div>
@@ -352,14 +355,22 @@ const ScheduleForm = ({ selectedVideo, onSchedule, loading }) => {
 };
 
 // Broadcasts list component
-const BroadcastsList = ({ broadcasts, onDelete, loading }) => {
+const BroadcastsList = ({ broadcasts, metrics = {}, onDelete, loading }) => {
   const getBadgeVariant = (status) => {
     switch (status) {
       case 'created': return 'default';
       case 'streaming': return 'destructive';
+      case 'live': return 'destructive';
+      case 'restarted': return 'destructive';
+      case 'prefetching': return 'secondary';
       case 'completed': return 'secondary';
       case 'failed': return 'destructive';
       case 'scheduled': return 'default';
+      case 'ready': return 'default';
+      case 'testing': return 'secondary';
+      case 'complete': return 'secondary';
+      case 'revoked': return 'destructive';
+      case 'deleted': return 'destructive';
       default: return 'default';
     }
   };
@@ -388,7 +399,6 @@ const BroadcastsList = ({ broadcasts, onDelete, loading }) => {
       day: 'numeric',
       hour: '2-digit',
       minute: '2-digit',
-      timeZone: 'Asia/Kolkata',
       timeZoneName: 'short'
     });
   };
@@ -423,10 +433,48 @@ const BroadcastsList = ({ broadcasts, onDelete, loading }) => {
                       <CalendarIcon className="w-4 h-4" />
                       {formatDateTime(broadcast.scheduled_time)}
                     </div>
-                    <Badge variant={getBadgeVariant(broadcast.status)}>
-                      {upcoming ? 'Upcoming' : (broadcast.status === 'created' ? 'Completed' : broadcast.status)}
-                    </Badge>
+                    {broadcast.stream_status && broadcast.stream_status !== 'scheduled' ? (
+                      <Badge variant={getBadgeVariant(broadcast.stream_status)}>
+                        {broadcast.stream_status}
+                      </Badge>
+                    ) : (
+                      <Badge variant={getBadgeVariant(broadcast.status)}>
+                        {upcoming ? 'Upcoming' : (broadcast.status === 'created' ? 'Completed' : broadcast.status)}
+                      </Badge>
+                    )}
+                    {broadcast.lifecycle_status && (
+                      <Badge variant={getBadgeVariant(broadcast.lifecycle_status)} data-testid={`youtube-status-${broadcast.id}`}>
+                        YouTube: {broadcast.lifecycle_status}
+                      </Badge>
+                    )}
                   </div>
+                  {broadcast.stream_health?.status && broadcast.lifecycle_status !== 'complete' && (
+                    <div className="mt-1 text-xs text-gray-500" data-testid={`stream-health-${broadcast.id}`}>
+                      Ingest: {broadcast.stream_health.stream_status} · health {broadcast.stream_health.status}
+                      {broadcast.stream_health.issues?.length > 0 && ` · ${broadcast.stream_health.issues.join(', ')}`}
+                    </div>
+                  )}
+                  {broadcast.on_air_offset_seconds != null && (
+                    <div className="mt-1 text-xs text-gray-500" data-testid={`on-air-offset-${broadcast.id}`}>
+                      On air {broadcast.on_air_offset_seconds >= 0 ? '+' : ''}{broadcast.on_air_offset_seconds.toFixed(1)}s vs scheduled
+                    </div>
+                  )}
+                  {broadcast.transition_latency?.live != null && (
+                    <div className="mt-1 text-xs text-gray-500" data-testid={`transition-latency-${broadcast.id}`}>
+                      Went live {broadcast.transition_latency.live.toFixed(1)}s after transition
+                    </div>
+                  )}
+                  {broadcast.transition_error && (
+                    <div className="mt-1 text-xs text-red-600" data-testid={`transition-error-${broadcast.id}`}>
+                      Go-live failed: {broadcast.transition_error}
+                    </div>
+                  )}
+                  {broadcast.stream_status === 'live' && metrics[broadcast.broadcast_id] && (
+                    <div className="mt-1 text-xs text-gray-500" data-testid={`stream-metrics-${broadcast.id}`}>
+                      {metrics[broadcast.broadcast_id].fps ?? '–'} fps · {metrics[broadcast.broadcast_id].bitrate_kbps ?? '–'} kbps · {metrics[broadcast.broadcast_id].speed ?? '–'}x
+                      {metrics[broadcast.broadcast_id].drop_frames > 0 && ` · ${metrics[broadcast.broadcast_id].drop_frames} dropped`}
+                    </div>
+                  )}
                   <div className="mt-2 flex gap-2">
                     <Button
                       variant="outline"
@@ -470,12 +518,81 @@ const Dashboard = ({ user, onLogout }) => {
   const [loading, setLoading] = useState(false);
   const [fetchingVideos, setFetchingVideos] = useState(true);
   const [fetchingBroadcasts, setFetchingBroadcasts] = useState(true);
+  const [streamMetrics, setStreamMetrics] = useState({});
 
   useEffect(() => {
     fetchVideos();
     fetchBroadcasts();
   }, []);
 
+  // Live updates pushed by the backend instead of polling
+  useEffect(() => {
+    let source = null;
+    let retryTimer = null;
+    let lastEventId = null;
+    let closed = false;
+
+    // The URL carries a short-lived ticket, never the session token; a new one is fetched per connection
+    const connect = async () => {
+      try {
+        const response = await axios.post(`${API}/events/ticket`, {}, {
+          headers: { Authorization: `Bearer ${user.access_token}` }
+        });
+        if (closed) return;
+        const params = new URLSearchParams({ ticket: response.data.ticket });
+        if (lastEventId) params.set('last_event_id', lastEventId);
+        source = new EventSource(`${API}/events?${params}`);
+      } catch (error) {
+        if (!closed) retryTimer = setTimeout(connect, 5000);
+        return;
+      }
+
+      source.addEventListener('broadcast', (event) => {
+        lastEventId = event.lastEventId;
+        const update = JSON.parse(event.data);
+        if (update.deleted) {
+          setBroadcasts((current) => current.filter((b) => b.id !== update.id));
+          return;
+        }
+        setBroadcasts((current) => mergeBroadcasts(current, [update]));
+      });
+
+      source.addEventListener('metrics', (event) => {
+        lastEventId = event.lastEventId;
+        const metrics = JSON.parse(event.data);
+        setStreamMetrics((current) => ({ ...current, [metrics.broadcast_id]: metrics }));
+      });
+
+      // EventSource retries network errors itself; once its ticket has expired it gives up
+      source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED && !closed) {
+          retryTimer = setTimeout(connect, 1000);
+        }
+      };
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      if (source) source.close();
+    };
+  }, [user.access_token]);
+
+  // Upsert by id; partial status updates keep the fields already loaded
+  const mergeBroadcasts = (current, updates) => {
+    const merged = [...current];
+    updates.forEach((update) => {
+      const index = merged.findIndex((b) => b.id === update.id);
+      if (index >= 0) {
+        merged[index] = { ...merged[index], ...update };
+      } else if (update.scheduled_time) {
+        merged.push(update);
+      }
+    });
+    return merged;
+  };
+
   const fetchVideos = async () => {
     try {
       const response = await axios.get(`${API}/youtube/videos`, {
@@ -515,7 +632,7 @@ const Dashboard = ({ user, onLogout }) => {
       
       if (success_count > 0) {
         toast.success(`Successfully scheduled ${success_count} broadcast${success_count > 1 ? 's' : ''}`);
-        fetchBroadcasts(); // Refresh broadcasts list
+        setBroadcasts((current) => mergeBroadcasts(current, response.data.broadcasts || []));
         setSelectedVideo(null); // Clear selection
       }
       
@@ -549,7 +666,7 @@ const Dashboard = ({ user, onLogout }) => {
       });
       
       toast.success('Broadcast deleted successfully');
-      fetchBroadcasts(); // Refresh broadcasts list
+      setBroadcasts((current) => current.filter((b) => b.id !== broadcastId));
     } catch (error) {
       console.error('Failed to delete broadcast:', error);
       toast.error('Failed to delete broadcast');
@@ -655,6 +772,7 @@ const Dashboard = ({ user, onLogout }) => {
                 ) : (
                   <BroadcastsList
                     broadcasts={broadcasts}
+                    metrics={streamMetrics}
                     onDelete={handleDeleteBroadcast}
                     loading={loading}
                   />
@@ -683,19 +801,64 @@ const Dashboard = ({ user, onLogout }) => {
 };
 
 // Uploaded video scheduler component
-const UploadedVideoScheduler = ({ video, user }) => {
+const UploadedVideoScheduler = ({ video, user, images = [] }) => {
   const [selectedDate, setSelectedDate] = useState(new Date());
+  const [imageId, setImageId] = useState('');
   const [customTimes, setCustomTimes] = useState(['05:55', '06:55', '07:55', '16:55', '17:55']);
   const [showCustomTimes, setShowCustomTimes] = useState(false);
+  const [repeatDaily, setRepeatDaily] = useState(false);
   const [loading, setLoading] = useState(false);
 
+  const handleScheduleRule = async () => {
+    const ruleData = {
+      source: 'uploaded_file',
+      video_id: video.id,
+      freq: 'daily',
+      times: showCustomTimes ? customTimes : ['05:55', '06:55', '07:55', '16:55', '17:55'],
+      timezone: USER_TIMEZONE,
+      start_date: selectedDate.toLocaleDateString('en-CA'),
+      image_id: imageId || null
+    };
+
+    const response = await axios.post(`${API}/schedule/rules`, ruleData, {
+      headers: { Authorization: `Bearer ${user.access_token}` }
+    });
+    toast.success(response.data.message);
+  };
+
   const handleSchedule = async () => {
     setLoading(true);
     try {
+      if (repeatDaily) {
+        await handleScheduleRule();
+        return;
+      }
+
+      const times = showCustomTimes ? customTimes : ['05:55', '06:55', '07:55', '16:55', '17:55'];
+      const selectedDay = selectedDate.toLocaleDateString('en-CA');
+
+      // One request validates every time of the form before anything is created
+      const preview = await axios.post(`${API}/schedule/preview`, {
+        start_date: selectedDay,
+        times,
+        timezone: USER_TIMEZONE,
+        source: 'uploaded_file',
+        video_id: video.id
+      }, {
+        headers: { Authorization: `Bearer ${user.access_token}` }
+      });
+      const invalid = preview.data.slots.filter((slot) => !slot.valid);
+      if (invalid.length > 0) {
+        toast.error(`Time ${invalid[0].time} ${TIMEZONE_LABEL}: ${invalid[0].message}${invalid.length > 1 ? ` (+${invalid.length - 1} more)` : ''}`);
+        return;
+      }
+
       const scheduleData = {
         file_id: video.id,
-        selected_date: selectedDate.toISOString(),
-        custom_times: showCustomTimes ? customTimes : null
+        selected_date: selectedDay,
+        custom_times: showCustomTimes ? customTimes : null,
+        timezone: USER_TIMEZONE,
+        image_id: imageId || null
       };
 
       const response = await axios.post(`${API}/schedule/uploaded-video`, scheduleData, {
@@ -739,7 +902,7 @@ const UploadedVideoScheduler = ({ video, user }) => {
 
       <div className="space-y-4">
         <div className="flex items-center justify-between">
-          <Label className="text-base font-medium">Broadcast Times (IST)</Label>
+          <Label className="text-base font-medium">Broadcast Times ({TIMEZONE_LABEL})</Label>
           <Button
             variant="outline" 
             size="sm"
@@ -751,10 +914,10 @@ const UploadedVideoScheduler = ({ video, user }) => {
 
         {!showCustomTimes && (
           <div className="bg-gray-50 p-4 rounded-lg">
-            <p className="text-sm text-gray-600 mb-2">Default broadcast times (IST):</p>
+            <p className="text-sm text-gray-600 mb-2">Default broadcast times ({TIMEZONE_LABEL}):</p>
             <div className="flex flex-wrap gap-2">
               {['05:55', '06:55', '07:55', '16:55', '17:55'].map((time, index) => (
-                <Badge key={index} className="bg-red-100 text-red-800">{time} IST</Badge>
+                <Badge key={index} className="bg-red-100 text-red-800">{time} {TIMEZONE_LABEL}</Badge>
               ))}
             </div>
           </div>
@@ -797,6 +960,43 @@ const UploadedVideoScheduler = ({ video, user }) => {
         )}
       </div>
 
+      {images.length > 0 && (
+        <div className="space-y-2">
+          <Label className="text-base font-medium">Still Image</Label>
+          <select
+            value={imageId}
+            onChange={(e) => setImageId(e.target.value)}
+            className="w-full rounded-md border px-3 py-2 text-sm"
+            data-testid="still-image-select"
+          >
+            <option value="">{video.media_kind === 'audio' ? 'Channel slate' : 'None (stream the video)'}</option>
+            {images.map((image) => (
+              <option key={image.id} value={image.id}>{image.custom_title || image.original_filename}</option>
+            ))}
+          </select>
+          <p className="text-sm text-gray-600">
+            Shows the image over this file's audio; the picture is encoded once, so the stream uses very little CPU
+          </p>
+        </div>
+      )}
+
+      <div className="flex items-center justify-between bg-gray-50 p-4 rounded-lg">
+        <div>
+          <Label className="text-base font-medium">Repeat Daily</Label>
+          <p className="text-sm text-gray-600">
+            Broadcasts are created automatically 48 hours ahead, starting on the selected date
+          </p>
+        </div>
+        <Button
+          variant={repeatDaily ? 'default' : 'outline'}
+          size="sm"
+          onClick={() => setRepeatDaily(!repeatDaily)}
+          data-testid="repeat-daily-toggle"
+        >
+          {repeatDaily ? 'On' : 'Off'}
+        </Button>
+      </div>
+
       <Button 
         onClick={handleSchedule}
         disabled={loading}
@@ -810,7 +1010,7 @@ const UploadedVideoScheduler = ({ video, user }) => {
         ) : (
           <div className="flex items-center gap-2">
             <CalendarIcon className="w-4 h-4" />
-            Schedule Live Broadcasts
+            {repeatDaily ? 'Schedule Every Day' : 'Schedule Live Broadcasts'}
           </div>
         )}
       </Button>
@@ -1069,17 +1269,17 @@ const VideoUploadPanel = ({ user }) => {
             <div className="mt-4">
               <label htmlFor="video-upload" className="cursor-pointer">
                 <span className="mt-2 block text-sm font-medium text-gray-900">
-                  Upload your video files
+                  Upload your video, audio or image files
                 </span>
                 <span className="mt-1 block text-sm text-gray-600">
-                  MP4, AVI, MOV, MKV, WMV up to 2GB • 97GB total storage available
+                  MP4, AVI, MOV, MKV, WMV, MP3, M4A, AAC, WAV, FLAC, OGG, JPG, PNG up to 2GB • 97GB total storage available
                 </span>
               </label>
               <input
                 id="video-upload"
                 type="file"
                 className="hidden"
-                accept=".mp4,.avi,.mov,.mkv,.wmv"
+                accept=".mp4,.avi,.mov,.mkv,.wmv,.mp3,.m4a,.aac,.wav,.flac,.ogg,.jpg,.jpeg,.png"
                 onChange={handleFileUpload}
                 disabled={uploading}
               />
@@ -1145,6 +1345,14 @@ const VideoUploadPanel = ({ user }) => {
             {uploadedVideos.map((video) => (
               <Card key={video.id} className="p-4">
                 <div className="flex items-center justify-between">
+                  {video.preview_urls && (
+                    <img
+                      src={`${BACKEND_URL}${video.preview_urls.poster}`}
+                      alt={video.custom_title || video.original_filename}
+                      loading="lazy"
+                      className="w-32 h-20 object-cover rounded-lg flex-shrink-0 mr-4"
+                    />
+                  )}
                   <div className="flex-1 min-w-0">
                     <EditableTitle 
                       video={video} 
@@ -1157,19 +1365,25 @@ const VideoUploadPanel = ({ user }) => {
                     </p>
                   </div>
                   <div className="flex gap-2 ml-4">
-                    <Dialog>
-                      <DialogTrigger asChild>
-                        <Button variant="outline" size="sm">
-                          Schedule
-                        </Button>
-                      </DialogTrigger>
-                      <DialogContent className="max-w-md">
-                        <DialogHeader>
-                          <DialogTitle>Schedule: {video.custom_title || video.original_filename}</DialogTitle>
-                        </DialogHeader>
-                        <UploadedVideoScheduler video={video} user={user} />
-                      </DialogContent>
-                    </Dialog>
+                    {video.media_kind !== 'image' && (
+                      <Dialog>
+                        <DialogTrigger asChild>
+                          <Button variant="outline" size="sm">
+                            Schedule
+                          </Button>
+                        </DialogTrigger>
+                        <DialogContent className="max-w-md">
+                          <DialogHeader>
+                            <DialogTitle>Schedule: {video.custom_title || video.original_filename}</DialogTitle>
+                          </DialogHeader>
+                          <UploadedVideoScheduler
+                            video={video}
+                            user={user}
+                            images={uploadedVideos.filter((upload) => upload.media_kind === 'image' && upload.probe_status !== 'invalid')}
+                          />
+                        </DialogContent>
+                      </Dialog>
+                    )}
                     <Button
                       variant="outline"
                       size="sm"
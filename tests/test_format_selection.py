@@ -0,0 +1,32 @@
+from format_selection import score_format, select_stream_format
+
+
+def fmt(**kwargs):
+    base = {'url': 'https://rr1.googlevideo.com/videoplayback?expire=1', 'protocol': 'https',
+            'vcodec': 'avc1.64001F', 'acodec': 'mp4a.40.2', 'ext': 'mp4', 'height': 720, 'tbr': 1500}
+    base.update(kwargs)
+    return base
+
+
+def test_formats_are_scored_even_when_yt_dlp_resolved_a_url():
+    info = {
+        'url': 'https://resolved.example/by-yt-dlp',
+        'formats': [fmt(url='https://a/webm', ext='webm', vcodec='vp9'), fmt(url='https://a/mp4')],
+    }
+    assert select_stream_format(info) == ('https://a/mp4', 'mp4_direct_720p')
+
+
+def test_top_level_url_is_the_fallback_without_formats():
+    assert select_stream_format({'url': 'https://a/only'}) == ('https://a/only', 'direct_url')
+
+
+def test_muxed_beats_higher_bitrate_video_only():
+    info = {'formats': [fmt(url='https://a/video', acodec='none', tbr=5000), fmt(url='https://a/muxed', height=360)]}
+    assert select_stream_format(info)[0] == 'https://a/muxed'
+
+
+def test_hls_and_oversized_formats_are_rejected():
+    assert score_format(fmt(protocol='m3u8_native')) is None
+    assert score_format(fmt(height=1080)) is None
+    url, error = select_stream_format({'formats': [fmt(protocol='m3u8_native')]})
+    assert url is None and 'm3u8_native' in error
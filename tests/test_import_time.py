@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+
+from benchmarks.import_time_bench import BACKEND_DIR, DEFERRED_MODULES, parse_importtime
+
+# Same default as benchmarks/import_time_bench.py; the fastest of RUNS is compared so one slow run does not fail it
+BUDGET_MS = float(os.environ.get('IMPORT_TIME_BUDGET_MS', '1500'))
+RUNS = 3
+# The package itself, not only its flow module, must stay unimported
+WATCHED_MODULES = DEFERRED_MODULES + ["google_auth_oauthlib"]
+
+
+def import_server():
+    """(server import ms, deferred modules present in sys.modules) from a fresh interpreter"""
+    check = (f"import server, sys; "
+             f"print(','.join(m for m in {WATCHED_MODULES!r} if m in sys.modules))")
+    env = {**os.environ, "MONGO_URL": "mongodb://127.0.0.1:1", "DB_NAME": "import_time_test"}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", check],
+                            cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+    total_us = next(cumulative for name, _, cumulative, _ in parse_importtime(result.stderr) if name == "server")
+    return total_us / 1000, [m for m in result.stdout.strip().split(',') if m]
+
+
+def test_server_import_is_within_budget():
+    fastest_ms = min(import_server()[0] for _ in range(RUNS))
+    assert fastest_ms <= BUDGET_MS, f"import server took {fastest_ms:.0f} ms (budget {BUDGET_MS:.0f} ms)"
+
+
+def test_heavy_dependencies_stay_deferred():
+    _, loaded = import_server()
+    assert loaded == [], f"imported eagerly by server: {loaded}"
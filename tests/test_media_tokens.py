@@ -0,0 +1,33 @@
+import media_tokens
+
+SECRET = "test-secret"
+
+
+def test_ticket_round_trip():
+    ticket = media_tokens.issue(SECRET, "user-1", "upload:f1:poster", 3600, now=1000)
+    assert media_tokens.verify(SECRET, ticket, "upload:f1:poster", now=1000) == "user-1"
+
+
+def test_ticket_is_stable_within_a_window():
+    first = media_tokens.issue(SECRET, "user-1", "upload:f1:poster", 3600, now=3600)
+    second = media_tokens.issue(SECRET, "user-1", "upload:f1:poster", 3600, now=7199)
+    assert first == second
+
+
+def test_ticket_rejected_for_other_scope_secret_or_user():
+    ticket = media_tokens.issue(SECRET, "user-1", "upload:f1:poster", 3600, now=1000)
+    assert media_tokens.verify(SECRET, ticket, "upload:f2:poster", now=1000) is None
+    assert media_tokens.verify("other", ticket, "upload:f1:poster", now=1000) is None
+    forged = "user-2" + ticket[len("user-1"):]
+    assert media_tokens.verify(SECRET, forged, "upload:f1:poster", now=1000) is None
+
+
+def test_ticket_expires():
+    ticket = media_tokens.issue(SECRET, "user-1", "events", 60, now=0)
+    assert media_tokens.verify(SECRET, ticket, "events", now=119) == "user-1"
+    assert media_tokens.verify(SECRET, ticket, "events", now=121) is None
+
+
+def test_malformed_ticket():
+    for ticket in ("", "garbage", "a.b.c", None):
+        assert media_tokens.verify(SECRET, ticket, "events", now=0) is None
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, timezone
+
+from schedule_index import IntervalIndex, ScheduleIndex, broadcast_window
+
+T0 = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def at(minutes: float) -> datetime:
+    return T0 + timedelta(minutes=minutes)
+
+
+def index_of(*windows) -> IntervalIndex:
+    index = IntervalIndex()
+    for start, end, item_id in windows:
+        index.add(at(start), at(end), item_id)
+    return index
+
+
+def test_overlapping_treats_windows_as_half_open():
+    index = index_of((0, 60, "a"), (60, 120, "b"))
+    assert index.overlapping(at(60), at(61)) == ["b"]
+    assert index.overlapping(at(-30), at(0)) == []
+    assert index.overlapping(at(59), at(60)) == ["a"]
+    assert sorted(index.overlapping(at(30), at(90))) == ["a", "b"]
+
+
+def test_overlapping_finds_long_window_started_well_before():
+    index = index_of((0, 600, "long"), (500, 510, "short"))
+    assert sorted(index.overlapping(at(505), at(506))) == ["long", "short"]
+
+
+def test_peak_counts_concurrent_windows():
+    index = index_of((0, 60, "a"), (30, 90, "b"), (60, 120, "c"))
+    assert index.peak(at(0), at(30)) == 1
+    assert index.peak(at(0), at(31)) == 2
+    # "a" ends exactly as "c" starts, so at most two run together
+    assert index.peak(at(0), at(120)) == 2
+    assert index.peak(at(120), at(180)) == 0
+
+
+def test_remove_updates_counts_and_longest_window():
+    index = index_of((0, 600, "long"), (0, 10, "x"), (0, 10, "y"))
+    assert index.remove("long")
+    assert index.longest == timedelta(minutes=10)
+    assert index.remove("y") and not index.remove("y")
+    assert len(index) == 1
+    assert index.overlapping(at(5), at(6)) == ["x"]
+    assert index.peak(at(0), at(600)) == 1
+
+
+def broadcast(broadcast_id, minutes, video_id="v1", user_id="u1", duration=3600, **extra):
+    return {"id": broadcast_id, "user_id": user_id, "video_id": video_id,
+            "scheduled_time": at(minutes).isoformat(), "duration_seconds": duration, **extra}
+
+
+def test_broadcast_window_defaults_duration_and_timezone():
+    start, end = broadcast_window({"scheduled_time": "2026-01-01T12:00:00"})
+    assert start == T0 and end == T0 + timedelta(hours=1)
+
+
+def test_check_reports_source_conflict_then_capacity():
+    index = ScheduleIndex()
+    index.rebuild([broadcast("a", 0), broadcast("b", 0, video_id="v2"),
+                   broadcast("done", 0, video_id="v3", stream_status="completed")], version=1)
+    assert "already scheduled" in index.check("u1", "v1", at(30), at(90), capacity=5)
+    assert index.check("u2", "v1", at(30), at(90), capacity=5) is None
+    assert "encoder slots" in index.check("u1", "v4", at(30), at(90), capacity=2)
+    # Back to back with the existing windows fits
+    assert index.check("u1", "v1", at(60), at(120), capacity=2) is None
+    index.remove("a")
+    assert index.check("u1", "v1", at(30), at(90), capacity=2) is None
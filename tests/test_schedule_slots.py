@@ -0,0 +1,60 @@
+from datetime import date, datetime, time, timezone
+
+import pytest
+
+from schedule_slots import UnknownTimezone, compute_slots, local_airtime, zone
+
+NEW_YORK = zone("America/New_York")
+
+
+def test_local_airtime_outside_dst_changes():
+    airtime, dst = local_airtime(date(2026, 1, 15), time(9, 30), zone("Asia/Kolkata"))
+    assert airtime == datetime(2026, 1, 15, 4, 0, tzinfo=timezone.utc)
+    assert dst is None
+
+
+def test_time_skipped_by_spring_forward_airs_an_hour_later():
+    airtime, dst = local_airtime(date(2026, 3, 8), time(2, 30), NEW_YORK)
+    assert dst == "skipped"
+    assert airtime == datetime(2026, 3, 8, 7, 30, tzinfo=timezone.utc)
+    assert airtime.astimezone(NEW_YORK).time() == time(3, 30)
+
+
+def test_time_repeated_by_fall_back_airs_at_first_instance():
+    airtime, dst = local_airtime(date(2026, 11, 1), time(1, 30), NEW_YORK)
+    assert dst == "repeated"
+    # 01:30 EDT (UTC-4), not 01:30 EST
+    assert airtime == datetime(2026, 11, 1, 5, 30, tzinfo=timezone.utc)
+
+
+def test_compute_slots_spans_dates_in_order_and_flags_bad_times():
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    slots = compute_slots(date(2026, 1, 10), date(2026, 1, 11), ["08:00", "25:99"], "UTC", now)
+    assert [(s["date"], s["time"]) for s in slots] == [
+        ("2026-01-10", "08:00"), ("2026-01-10", "25:99"), ("2026-01-11", "08:00"), ("2026-01-11", "25:99")]
+    assert [s["index"] for s in slots] == [0, 1, 2, 3]
+    assert slots[0]["airtime"] == datetime(2026, 1, 10, 8, tzinfo=timezone.utc)
+    assert slots[1]["airtime"] is None and "HH:MM" in slots[1]["error"]
+
+
+def test_roll_past_moves_times_already_past_to_the_next_day():
+    # 10:00 in Kolkata
+    now = datetime(2026, 1, 10, 4, 30, tzinfo=timezone.utc)
+    slots = compute_slots(date(2026, 1, 10), date(2026, 1, 10), ["09:00", "11:00"], "Asia/Kolkata", now,
+                          roll_past=True)
+    assert slots[0]["rolled_over"] and slots[0]["local_time"].startswith("2026-01-11T09:00")
+    assert not slots[1]["rolled_over"] and slots[1]["local_time"].startswith("2026-01-10T11:00")
+    # Without roll_past the past time keeps its date; lead_error rejects it later
+    assert compute_slots(date(2026, 1, 10), date(2026, 1, 10), ["09:00"], "Asia/Kolkata", now)[0]["rolled_over"] is False
+
+
+def test_compute_slots_marks_dst_slots():
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    slots = compute_slots(date(2026, 3, 8), date(2026, 3, 8), ["02:30"], "America/New_York", now)
+    assert slots[0]["dst"] == "skipped"
+    assert slots[0]["local_time"] == "2026-03-08T03:30:00-04:00"
+
+
+def test_unknown_timezone():
+    with pytest.raises(UnknownTimezone):
+        zone("Mars/Olympus_Mons")
@@ -0,0 +1,44 @@
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+import youtube_quota
+from youtube_quota import QuotaBudget
+
+
+def failing(status: int, reason: str = "backendError", successes_after: int = None):
+    """An API attempt that raises HttpError `status` until `successes_after` calls were made"""
+    calls = []
+
+    def attempt():
+        calls.append(1)
+        if successes_after is not None and len(calls) > successes_after:
+            return "ok"
+        content = ('{"error": {"errors": [{"reason": "%s"}]}}' % reason).encode()
+        raise HttpError(httplib2.Response({"status": status}), content)
+    return attempt, calls
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(youtube_quota.time, "sleep", lambda seconds: None)
+
+
+def test_reads_are_retried_on_server_errors():
+    attempt, calls = failing(503, successes_after=2)
+    assert QuotaBudget("p").call("youtube.liveBroadcasts.list", "u", attempt) == "ok"
+    assert len(calls) == 3
+
+
+@pytest.mark.parametrize("method", ["youtube.liveBroadcasts.insert", "youtube.liveStreams.insert"])
+def test_inserts_are_not_resent_after_a_server_error(method):
+    attempt, calls = failing(503, successes_after=1)
+    with pytest.raises(HttpError):
+        QuotaBudget("p").call(method, "u", attempt)
+    assert len(calls) == 1
+
+
+def test_rate_limited_inserts_are_retried():
+    attempt, calls = failing(403, reason="rateLimitExceeded", successes_after=1)
+    assert QuotaBudget("p").call("youtube.liveBroadcasts.insert", "u", attempt) == "ok"
+    assert len(calls) == 2